@@ -0,0 +1,39 @@
+"""The real players of the poker nights and their PokerStars aliases"""
+
+# PokerStars aliases (dict value) of each player (dict key). The order of the
+# players is the order of the rows in the spreadsheet, see google_sheets.save_session()
+name_index = {
+    "Benchi": ["BenchiWang", "MaFak2019", "Mafak2020"],
+    "Dirk": ["JeBoyDirk"],
+    "Ilja": ["Jackall23", "FragileMemory"],
+    "Jan": ["color_singleton"],
+    "Joshua": ["MrOB1reader", "Klemtonius"],
+    "Manon": ["Manon541", "Manon947", "MnnM150", "manon327"],
+    "Michel": ["Duke Croix", "FantasticDouble", "PokerStarMan123", "PokerStarsMan12"],
+    "Yair": ["yairpinto"],
+    "Steven": ["JachtSlot"],
+    "Jasper": ["HighCardJasper"],
+    "Docky": ["dhduncan", "dddocky"],
+    "Ruben": ["Rubeneero"],
+    "Yavor": ["RichRick1337", "poorrick1338"],
+    "Rogier": ["rogierk449"],
+    "Clayton": ["appositive"],
+}
+
+
+def alias_lookup(name_index=name_index):
+    """Returns the player of each alias
+
+    Parameters
+    ----------
+    name_index : dict, optional
+        PokerStars aliases (dict value) of each player (dict key), by default the
+        one above
+
+    Returns
+    -------
+    dict
+        Player (dict value) for each alias (dict key)
+    """
+
+    return {alias: name for name, aliases in name_index.items() for alias in aliases}
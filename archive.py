@@ -0,0 +1,246 @@
+"""Batch parsing of all hand history files in the archive
+
+The same hand can be in the files of several alias folders, each account at the
+table recorded it. Only the first copy of each hand (by PokerStars hand id, files
+oldest night first) is counted, see dedup.py.
+
+Run as a script to parse every HH*.txt file below a folder (by default
+poker_session/hand_history) in parallel and print a summary:
+
+    python archive.py [path] [--workers N] [--no-cache] [--keep-duplicates]
+"""
+
+import argparse
+import os
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+from dedup import find_duplicates
+from session_cache import load_session, path_cache_default
+
+path_hand_default = Path(__file__).resolve().parent / "poker_session" / "hand_history"
+
+
+def find_hand_histories(path=path_hand_default):
+    """Finds all hand history files below a folder, oldest night first
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Folder to search, e.g. a single alias folder, by default poker_session/hand_history
+
+    Returns
+    -------
+    list of Path
+        The hand history files, sorted by file name (which starts with the date) and folder
+    """
+
+    return sorted(Path(path).rglob("HH*.txt"), key=lambda p: (p.name, str(p.parent)))
+
+
+def session_date(filename):
+    """Returns the date in the name of a hand history file (HH20200618 ...)
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+
+    Returns
+    -------
+    str
+        Date as YYYY-MM-DD, empty if the name does not start with a date
+    """
+
+    digits = Path(filename).name[2:10]
+    if not digits.isdigit():
+        return ""
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:]}"
+
+
+class Archive:
+    """Sessions parsed from many hand history files, merged into one dataset
+
+    Parameters
+    ----------
+    sessions : dict
+        Session (dict value) for each hand history file (dict key), oldest night first
+    n_bytes : int, optional
+        Size of all parsed files together, by default 0
+    elapsed : float, optional
+        Time it took to parse all files in seconds, by default 0.0
+    """
+
+    def __init__(self, sessions, n_bytes=0, elapsed=0.0):
+        self.sessions = sessions
+        self.n_bytes = n_bytes
+        self.elapsed = elapsed
+
+    @property
+    def hand_count(self):
+        """int : number of hands played over all sessions"""
+
+        return sum(session.hand_count for session in self.sessions.values())
+
+    @property
+    def names(self):
+        """list of str : player names over all sessions in order of appearance"""
+
+        names = {}
+        for session in self.sessions.values():
+            names.update(dict.fromkeys(session.players))
+        return list(names)
+
+    def totals(self, column):
+        """Returns the sum of a player column for each player over all sessions
+
+        Parameters
+        ----------
+        column : str
+            Name of the PlayerStats column, e.g. "busts"
+
+        Returns
+        -------
+        dict
+            Sum (dict value) for each player name (dict key)
+        """
+
+        totals = dict.fromkeys(self.names, 0)
+        for session in self.sessions.values():
+            for name, player in session.players.items():
+                totals[name] += player.total(column)
+        return totals
+
+    def throughput(self):
+        """Returns how fast the archive was parsed
+
+        Returns
+        -------
+        hands_per_second : float
+        mb_per_second : float
+        """
+
+        elapsed = max(self.elapsed, 1e-9)
+        return self.hand_count / elapsed, self.n_bytes / 1e6 / elapsed
+
+
+def _load_sessions(filenames, workers, chip_count_start, cache_dir, skips=None):
+    """Loads the sessions of files with load_session(), in worker processes unless
+    workers is 1, see parse_archive()"""
+
+    cache_dirs = [cache_dir] * len(filenames)
+    chip_counts = [chip_count_start] * len(filenames)
+    skips = skips or [None] * len(filenames)
+    if workers == 1 or len(filenames) < 2:
+        return list(map(load_session, filenames, cache_dirs, chip_counts, skips))
+    # Imported here as it is slow to import and only needed with several workers
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Chunks keep the per-file overhead of sending work to the workers small
+        chunksize = max(1, len(filenames) // (4 * (workers or os.cpu_count() or 1)))
+        return list(
+            executor.map(
+                load_session,
+                filenames,
+                cache_dirs,
+                chip_counts,
+                skips,
+                chunksize=chunksize,
+            )
+        )
+
+
+def parse_archive(
+    path=path_hand_default,
+    workers=None,
+    chip_count_start=10000,
+    cache_dir=path_cache_default,
+    dedup=True,
+):
+    """Parses all hand history files below a folder in parallel worker processes.
+    Files that did not change since they were last parsed are read from the cache.
+    Hands already recorded in an earlier file are left out, see dedup.py.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Folder to search, by default poker_session/hand_history
+    workers : int, optional
+        Number of worker processes, by default one per core. With 1 everything is
+        parsed in this process
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    cache_dir : str or Path, optional
+        Folder of the session cache, by default poker_session/cache. None disables
+        the cache
+    dedup : bool, optional
+        Leave out the hands already recorded in an earlier file, by default True
+
+    Returns
+    -------
+    Archive
+        All parsed sessions
+    """
+
+    filenames = find_hand_histories(path)
+    n_bytes = sum(os.path.getsize(filename) for filename in filenames)
+    before = perf_counter()
+    sessions = dict(
+        zip(
+            filenames,
+            _load_sessions(filenames, workers, chip_count_start, cache_dir),
+        )
+    )
+    if dedup:
+        duplicates = find_duplicates(
+            (filename, np.frombuffer(session.hand_ids, dtype=np.int64)[1:])
+            for filename, session in sessions.items()
+        )
+        # Parsed again without the hands recorded before, usually only a few files
+        sessions.update(
+            zip(
+                duplicates,
+                _load_sessions(
+                    list(duplicates),
+                    workers,
+                    chip_count_start,
+                    cache_dir,
+                    list(duplicates.values()),
+                ),
+            )
+        )
+    elapsed = perf_counter() - before
+
+    return Archive(sessions, n_bytes=n_bytes, elapsed=elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=path_hand_default)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true", help="always parse anew")
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="count hands recorded in several files once per file",
+    )
+    args = parser.parse_args()
+
+    archive = parse_archive(
+        args.path,
+        workers=args.workers,
+        cache_dir=None if args.no_cache else path_cache_default,
+        dedup=not args.keep_duplicates,
+    )
+    hands_per_second, mb_per_second = archive.throughput()
+    print(
+        f"Parsed {len(archive.sessions)} files with {archive.hand_count} hands "
+        + f"({archive.n_bytes / 1e6:.1f} MB) in {archive.elapsed:.2f} s: "
+        + f"{hands_per_second:.0f} hands/s, {mb_per_second:.1f} MB/s"
+    )
+    rebuys = archive.totals("rebuys")
+    for name, busts in archive.totals("busts").items():
+        print(f"{name} :   {busts} busts   /   {rebuys[name]} rebuys")
@@ -0,0 +1,661 @@
+"""Benchmarks of parsing, plotting, uploading and serving hand histories
+
+Covers the hand history parser, the live plot, the spreadsheet upload, the
+post-session pipeline and the dashboard server.
+
+Run as a script to benchmark everything on synthetic hand histories (see
+synthetic.py) of every combination of the given numbers of hands and players and
+to write the results to a JSON file:
+
+    python benchmark.py [--hands N [N ...]] [--players N [N ...]] [--repeat N]
+                        [--ticks N] [--output FILE] [--compare FILE]
+
+With --compare the results are checked against an earlier results file and the
+script exits with an error if parsing or rendering got slower. With
+POKER_INSTRUMENT=1 (see instrument.py) the results include the time of each stage.
+"""
+
+import argparse
+import contextlib
+import csv
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import instrument
+from archive import find_hand_histories
+from dashboard import Dashboard, serve
+from google_sheets import save_session, upload_session
+from hand_history import HandHistoryFollower, PlayerStats, SessionParser, parse_file
+from live_plot import LivePlot
+from post_session import run_pipeline, send_email
+from report import make_figure
+from session_stats import SessionStats
+from synthetic import write_hand_history
+from tests.fakes import CountingSpreadsheet, FlakySMTP
+
+path_results_default = "benchmark.json"
+
+
+class LegacySessionParser(SessionParser):
+    """The parser before tokenize(): splits every line into words and runs the whole
+    elif chain on it. Only kept as baseline for the benchmark."""
+
+    def feed(self, rawlines):
+        session = self.session
+        players = session.players
+        for line in rawlines:
+            words = line.split()
+            if len(words) > 4 and words[0] not in ["***", "Board", "Table"]:
+                if words[-1] == "ET":
+                    session.hand_count += 1
+                    session.family_pots.append(1)
+                elif words[-1] == "chips)":
+                    chips = int(words[-3][1:])
+                    if words[2] in players:
+                        players[words[2]].seat(chips, session.hand_count)
+                    else:
+                        players[words[2]] = PlayerStats(
+                            words[2],
+                            chips,
+                            session.hand_count,
+                            chip_count_start=session.chip_count_start,
+                        )
+                elif words[-1] == "all-in":
+                    players[words[0].replace(":", "")].allins[-1] = 1
+                elif words[0] == "Uncalled":
+                    players[words[5]].allins[-1] = 0
+                elif "won" in words:
+                    player = players[words[2]]
+                    player.showdown_wins[-1] = 1
+                    if player.allins[-1]:
+                        player.allins_won[-1] = 1
+                elif "lost" in words or "mucked" in words:
+                    player = players[words[2]]
+                    player.losses[-1] = 1
+                    if player.allins[-1]:
+                        player.busts[-1] = 1
+                elif words[-2] == "collected":
+                    player = players[words[2]]
+                    player.wins_no_showdown[-1] = 1
+                    if player.allins[-1]:
+                        player.allins_won[-1] = 1
+                elif words[1] == "pot":
+                    if int(words[-1]) == 0:
+                        session.rake.append(0.01e-20)
+                    else:
+                        session.rake.append(float(words[-1]))
+                    session.potsize.append(float(words[2]))
+                elif "before" in words:
+                    players[words[2]].preflop_folds[-1] = 1
+                    session.family_pots[-1] = 0
+
+
+def parse_file_legacy(filename):
+    """Parses a hand history file the way data_get() did before tokenize(): reads
+    all lines, makes a stripped copy of them and splits every line into words
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+
+    Returns
+    -------
+    Session
+    """
+
+    with open(filename, encoding="utf-8-sig") as raw_file:
+        raw_content = raw_file.readlines()
+        content = [x.strip() for x in raw_content]
+        parser = LegacySessionParser()
+        parser.feed(content)
+    return parser.session
+
+
+def time_parse(parse, paths):
+    """Returns the time to parse all files once
+
+    Parameters
+    ----------
+    parse : function
+        Parses a single file, e.g. hand_history.parse_file
+    paths : list of str or Path
+        Hand history files
+
+    Returns
+    -------
+    float
+        Time in seconds
+    """
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        before = perf_counter()
+        for path in paths:
+            parse(path)
+        return perf_counter() - before
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def benchmark_parser(paths=None, repeat=5):
+    """Times the current parser against the legacy one on the given hand histories
+
+    Parameters
+    ----------
+    paths : list of str or Path, optional
+        Hand history files, by default all bundled ones
+    repeat : int, optional
+        Number of runs per parser, by default 5
+
+    Returns
+    -------
+    dict
+        Number of lines, best times in seconds and the speed-up
+    """
+
+    if paths is None:
+        paths = find_hand_histories()
+    n_lines = 0
+    for path in paths:
+        with open(path, encoding="utf-8-sig") as raw_file:
+            n_lines += sum(1 for _ in raw_file)
+
+    # Runs alternate between both parsers so both see the same machine load
+    legacy, current = float("inf"), float("inf")
+    for _ in range(repeat):
+        legacy = min(legacy, time_parse(parse_file_legacy, paths))
+        current = min(current, time_parse(parse_file, paths))
+    return {
+        "lines": n_lines,
+        "legacy_s": legacy,
+        "current_s": current,
+        "speedup": legacy / current,
+    }
+
+
+def benchmark_parse(path, repeat=3):
+    """Measures throughput and peak memory of parsing a hand history file
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file
+    repeat : int, optional
+        Number of timed runs, by default 3
+
+    Returns
+    -------
+    dict
+        Hands, bytes, best time in seconds, hands and MB per second and the peak
+        memory allocated while parsing in MB, as a whole file and by a
+        HandHistoryFollower catching up on the whole file at its first poll
+    """
+
+    seconds = min(time_parse(parse_file, [path]) for _ in range(repeat))
+    # Tracing slows parsing down, so memory is measured in a run of its own
+    tracemalloc.start()
+    try:
+        n_hands = parse_file(path).hand_count
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        HandHistoryFollower(path).poll()
+        follow_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    n_bytes = os.path.getsize(path)
+    return {
+        "hands": n_hands,
+        "bytes": n_bytes,
+        "seconds": seconds,
+        "hands_per_s": n_hands / seconds,
+        "mb_per_s": n_bytes / 1e6 / seconds,
+        "peak_mb": peak / 1e6,
+        "follow_peak_mb": follow_peak / 1e6,
+    }
+
+
+def hand_chunks(path, hands_per_tick=1):
+    """Splits a hand history file into chunks of a few hands each, to replay it as
+    if PokerStars were writing it
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file to replay
+    hands_per_tick : int, optional
+        Number of hands per chunk, by default 1
+
+    Returns
+    -------
+    list of bytes
+    """
+
+    data = Path(path).read_bytes()
+    marker = b"PokerStars Home Game Hand #"
+    starts = []
+    start = data.find(marker)
+    while start >= 0:
+        starts.append(start)
+        start = data.find(marker, start + 1)
+    starts[0] = 0  # the first chunk keeps the BOM
+    starts.append(len(data))
+    return [
+        data[starts[i] : starts[min(i + hands_per_tick, len(starts) - 1)]]
+        for i in range(0, len(starts) - 1, hands_per_tick)
+    ]
+
+
+def benchmark_render(path, ticks=100, hands_per_tick=1):
+    """Measures the latency of the live plot: the hand history is written to a new
+    file a few hands per tick, and every tick polls the file and updates the plot
+    like the timer of the live plot does
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file to replay
+    ticks : int, optional
+        Maximum number of ticks, by default 100
+    hands_per_tick : int, optional
+        Number of hands appended before each tick, by default 1
+
+    Returns
+    -------
+    dict
+        Number of ticks, how many of them redrew the whole figure instead of
+        blitting and the mean, median and maximum latency per tick in ms
+    """
+
+    chunks = hand_chunks(path, hands_per_tick)[:ticks]
+    fig, axes = make_figure()
+    live_plot = LivePlot(fig, *axes)
+    redraws = []
+    fig.canvas.mpl_connect("draw_event", redraws.append)
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        live_path = Path(tmp_dir) / "HHlive.txt"
+        live_path.touch()
+        follower = HandHistoryFollower(live_path, actions=True)
+        for chunk in chunks:
+            with open(live_path, "ab") as live_file:
+                live_file.write(chunk)
+            before = perf_counter()
+            live_plot.update(follower.poll())
+            latencies.append((perf_counter() - before) * 1e3)
+    return {
+        "ticks": len(latencies),
+        "hands_per_tick": hands_per_tick,
+        "redraws": len(redraws),
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+    }
+
+
+def benchmark_sheets(path):
+    """Counts the API calls save_session() makes to upload a session, against an
+    in-memory spreadsheet and with every question answered with "y"
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file of the session
+
+    Returns
+    -------
+    dict
+        Number of calls for each method, the total and the time in seconds
+    """
+
+    session = parse_file(path)
+    name_index = {f"Player {i}": [name] for i, name in enumerate(session.names)}
+    spreadsheet = CountingSpreadsheet(list(name_index))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path_email = Path(tmp_dir) / "email-list.csv"
+        with open(path_email, "w", newline="") as email_file:
+            writer = csv.writer(email_file)
+            writer.writerow(["email list"])
+            for i, name in enumerate(name_index):
+                writer.writerows([[name], [f"player{i}@example.org"]])
+        before = perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_session(
+                spreadsheet,
+                SessionStats(session),
+                "benchmark",
+                name_index,
+                path_email,
+                ask=lambda prompt: "y",
+            )
+        seconds = perf_counter() - before
+    return {
+        "calls": dict(spreadsheet.calls),
+        "total_calls": sum(spreadsheet.calls.values()),
+        "seconds": seconds,
+    }
+
+
+def benchmark_post_session(path, latency=0.2):
+    """Measures the post-session pipeline: saving the figure as PNG and SVG, the
+    spreadsheet upload and the email, against an in-memory spreadsheet and email
+    server that take latency seconds per call. The email server drops the first
+    connection, so the email is retried once.
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file of the session
+    latency : float, optional
+        Seconds every call to the spreadsheet or the email server takes, by
+        default 0.2
+
+    Returns
+    -------
+    dict
+        Seconds the pipeline took, the sum of the seconds of its tasks (what running
+        them one after the other would take at least) and the attempts of each task
+    """
+
+    session = parse_file(path, actions=True)
+    stats = SessionStats(session)
+    fig, axes = make_figure()
+    LivePlot(fig, *axes).update(session, stats)
+    name_index = {f"Player {i}": [name] for i, name in enumerate(session.names)}
+    results = {name: (1, 10000) for name in name_index}
+    spreadsheet = CountingSpreadsheet(list(name_index), latency=latency)
+    smtp = FlakySMTP(latency=latency)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path_png = Path(tmp_dir) / "benchmark.png"
+        path_svg = Path(tmp_dir) / "benchmark.svg"
+        tasks = {
+            "png": (lambda: fig.savefig(path_png, format="png", dpi=50), ()),
+            "svg": (lambda: fig.savefig(path_svg, format="svg"), ("png",)),
+            "sheets": (
+                lambda: upload_session(spreadsheet, results, "benchmark"),
+                (),
+            ),
+            "email": (
+                lambda: send_email(
+                    "sender@example.org",
+                    ["player@example.org"],
+                    "benchmark",
+                    "benchmark",
+                    "password",
+                    path_image=path_png,
+                    smtp=smtp,
+                ),
+                ("sheets", "png"),
+            ),
+        }
+        before = perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            task_results = run_pipeline(
+                tasks, backoff=latency, main_thread=("png", "svg")
+            )
+        seconds = perf_counter() - before
+    failed = [name for name, result in task_results.items() if not result.ok]
+    if failed:
+        raise RuntimeError(f"post-session tasks failed: {failed}")
+    # Each task's own time is its end minus the end of the tasks it waited for
+    own = {
+        name: result.seconds
+        - max((task_results[need].seconds for need in tasks[name][1]), default=0.0)
+        for name, result in task_results.items()
+    }
+    return {
+        "seconds": seconds,
+        "sequential_seconds": sum(own.values()),
+        "attempts": {name: result.attempts for name, result in task_results.items()},
+    }
+
+
+def run_benchmarks(hands=(1000, 10000, 100000), players=(2, 6, 9), repeat=3, ticks=100):
+    """Runs all benchmarks on synthetic hand histories
+
+    Parameters
+    ----------
+    hands : sequence of int, optional
+        Numbers of hands of the synthetic files, by default (1000, 10000, 100000)
+    players : sequence of int, optional
+        Numbers of players of the synthetic files, by default (2, 6, 9)
+    repeat : int, optional
+        Number of timed runs per measurement, by default 3
+    ticks : int, optional
+        Number of ticks of the live plot benchmark, by default 100
+
+    Returns
+    -------
+    dict
+        Results of all benchmarks, see write_results()
+    """
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parse": [],
+        "render": [],
+        "sheets": [],
+        "post_session": [],
+        "dashboard": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_players in players:
+            for n_hands in hands:
+                path = Path(tmp_dir) / f"HH{n_hands}x{n_players}.txt"
+                write_hand_history(path, n_hands=n_hands, n_players=n_players)
+                case = {"n_hands": n_hands, "n_players": n_players}
+                results["parse"].append({**case, **benchmark_parse(path, repeat)})
+                print(f"parse {results['parse'][-1]}")
+                path.unlink()
+            # Rendering and upload do not depend on the length of the file
+            path = Path(tmp_dir) / f"HHrender{n_players}.txt"
+            write_hand_history(path, n_hands=ticks, n_players=n_players)
+            case = {"n_players": n_players}
+            results["render"].append({**case, **benchmark_render(path, ticks=ticks)})
+            print(f"render {results['render'][-1]}")
+            results["sheets"].append({**case, **benchmark_sheets(path)})
+            print(f"sheets {results['sheets'][-1]}")
+            results["post_session"].append({**case, **benchmark_post_session(path)})
+            print(f"post_session {results['post_session'][-1]}")
+            results["dashboard"].append(
+                {**case, **benchmark_dashboard(path, ticks=ticks)}
+            )
+            print(f"dashboard {results['dashboard'][-1]}")
+
+    if find_hand_histories():
+        results["legacy"] = benchmark_parser(repeat=repeat)
+    if instrument.enabled:
+        results["stages"] = instrument.summary()
+    return results
+
+
+def benchmark_dashboard(path, viewers=20, ticks=50, hands_per_tick=1):
+    """Measures the dashboard server on localhost: the hand history is written to a
+    new file a few hands per tick, every tick polls it once and all viewers
+    receive the update as server-sent events
+
+    Parameters
+    ----------
+    path : str or Path
+        Hand history file to replay
+    viewers : int, optional
+        Number of browsers connected to the stream of updates, by default 20
+    ticks : int, optional
+        Maximum number of ticks, by default 50
+    hands_per_tick : int, optional
+        Number of hands appended before each tick, by default 1
+
+    Returns
+    -------
+    dict
+        Number of ticks, polls that parsed new lines, updates received by all
+        viewers, the mean size of an update and of the whole session in bytes and
+        the mean and maximum latency from the poll to a viewer in ms
+    """
+
+    import http.client
+
+    chunks = hand_chunks(path, hands_per_tick)[:ticks]
+    published = {}  # time each update was published
+    received = []
+    sizes = []
+
+    def watch(port, ready):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.request("GET", "/events")
+        response = connection.getresponse()
+        ready.release()
+        version = None
+        for line in response:
+            if line.startswith(b"id: "):
+                version = int(line[4:])
+            elif line.startswith(b"data: "):
+                received.append(perf_counter() - published.get(version, perf_counter()))
+                sizes.append(len(line))
+                if version == len(chunks):
+                    break
+        connection.close()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        live_path = Path(tmp_dir) / "HHlive.txt"
+        live_path.touch()
+        dashboard = Dashboard(live_path)
+        server = serve(dashboard, port=0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        ready = threading.Semaphore(0)
+        threads = [
+            threading.Thread(target=watch, args=(server.server_address[1], ready))
+            for _ in range(viewers)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            ready.acquire()
+        for chunk in chunks:
+            with open(live_path, "ab") as live_file:
+                live_file.write(chunk)
+            before = perf_counter()
+            dashboard.poll()
+            published[dashboard.version] = before
+            time.sleep(0.01)
+        for thread in threads:
+            thread.join(timeout=30)
+        snapshot = dashboard.snapshot()[1]
+        dashboard.stop()
+        server.shutdown()
+        server.server_close()
+    # The first message of each viewer is the empty session it connected to
+    updates = received[viewers:] if len(received) > viewers else received
+    return {
+        "ticks": len(chunks),
+        "viewers": viewers,
+        "polls": dashboard.polls,
+        "updates_received": len(received) - viewers,
+        "update_bytes": statistics.mean(sizes[viewers:] or [0]),
+        "snapshot_bytes": len(snapshot),
+        "mean_ms": statistics.mean(updates) * 1e3,
+        "max_ms": max(updates) * 1e3,
+    }
+
+
+def write_results(results, path=path_results_default):
+    """Writes benchmark results to a JSON file
+
+    Parameters
+    ----------
+    results : dict
+        see run_benchmarks()
+    path : str or Path, optional
+        JSON file, by default benchmark.json
+    """
+
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def compare_results(old, new, tolerance=0.2):
+    """Finds the benchmarks that got slower
+
+    Parameters
+    ----------
+    old, new : dict
+        Results of run_benchmarks(), e.g. read from earlier results files
+    tolerance : float, optional
+        Slow-down that still counts as noise, by default 0.2 (20 %)
+
+    Returns
+    -------
+    list of str
+        One message for each regression
+    """
+
+    regressions = []
+    checks = [
+        ("parse", "hands_per_s", -1),
+        ("parse", "peak_mb", 1),
+        ("render", "p50_ms", 1),
+    ]
+    for section, metric, sign in checks:
+        old_cases = {
+            (case.get("n_hands"), case["n_players"]): case
+            for case in old.get(section, [])
+        }
+        for case in new.get(section, []):
+            key = (case.get("n_hands"), case["n_players"])
+            if key not in old_cases:
+                continue
+            before, after = old_cases[key][metric], case[metric]
+            # sign says whether larger (1) or smaller (-1) values are worse
+            if sign * (after - before) > tolerance * before:
+                regressions.append(
+                    f"{section} {metric} {key[0] or ''} hands {key[1]} players: "
+                    + f"{before:.4g} -> {after:.4g}"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hands", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 6, 9])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--output", default=path_results_default)
+    parser.add_argument("--compare", help="earlier results file to check against")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        hands=args.hands, players=args.players, repeat=args.repeat, ticks=args.ticks
+    )
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+    if "legacy" in results:
+        legacy = results["legacy"]
+        print(
+            f"{legacy['lines']} lines of the bundled hand histories: "
+            + f"speed-up x{legacy['speedup']:.2f} over the legacy parser"
+        )
+    if args.compare:
+        with open(args.compare) as old_file:
+            regressions = compare_results(json.load(old_file), results)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
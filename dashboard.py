@@ -0,0 +1,671 @@
+"""Local web dashboard of a live session, pushed to the browsers as it grows
+
+One thread follows the hand history (see hand_history.HandHistoryFollower) and
+parses each new hand once, however many browsers are watching. After every poll
+that brought new lines it publishes an update built from the new hands only: the
+chip count, all-in EV chip count, pot size and rake of the new hands (the last
+hand is sent again, it may have been half-written before) and the aggregates that
+changed (wins, losses, all-ins, rebuys, family pots, rake). Browsers receive the
+updates as server-sent events and merge them into their copy of the session. A
+browser that connects, or reconnects after missing more updates than are kept,
+first gets the whole session as one update that starts at hand 0, built once per
+new hand from the server's own merged copy.
+
+Only the standard library is needed, so it runs on localhost without anything
+else installed:
+
+    python dashboard.py [path] [--host HOST] [--port PORT] [--interval SECONDS]
+
+path is a hand history file or a folder, of which the most recently modified
+hand history is followed. The dashboard is at http://HOST:PORT/, the session as
+JSON at /session.json and the stream of updates at /events.
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from archive import find_hand_histories, path_hand_default
+from equity import ev_chips, expected_winnings
+from hand_history import HandHistoryFollower
+from instrument import laps
+from table_monitor import table_name
+
+host_default = "127.0.0.1"
+port_default = 8050
+interval_default = 1.0
+
+# Per player aggregates: name in the dashboard and SessionStats.totals column
+total_columns = {
+    "showdown_wins": "showdown_wins",
+    "wins_no_showdown": "wins_no_showdown",
+    "losses": "losses",
+    "preflop_folds": "preflop_folds",
+    "allins_won": "allins_won",
+    "allins_lost": "busts",
+    "rebuys": "rebuys",
+}
+
+
+def session_state(session, stats):
+    """Returns everything the dashboard shows of a session
+
+    Parameters
+    ----------
+    session : Session
+        see hand_history.data_extract()
+    stats : SessionStats
+        Statistics of session
+
+    Returns
+    -------
+    dict
+        "series": hand numbers, chip counts and all-in EV chip counts of each player,
+        "pots": hand numbers, pot sizes and rake, "aggregates": hand count, family
+        pots, rake and pot totals and the totals of each player
+    """
+
+    ev, in_allin = ev_chips(session, stats)
+    series, players = {}, {}
+    for row, name in enumerate(stats.names):
+        seated = stats.seated[row]
+        series[name] = {
+            "hands": stats.hands[seated],
+            "chips": stats.chips[row, seated],
+            "ev": ev[row, seated],
+        }
+        players[name] = {
+            column: int(stats.totals[total][row])
+            for column, total in total_columns.items()
+        }
+        players[name].update(
+            hands=int(stats.seated_count[row]) - 1,
+            chips=int(stats.final_chips[row]),
+            buyins=int(stats.buyins[row]),
+            allin_ev=round(float(ev[row, seated][-1])),
+            in_allin=bool(in_allin[row]),
+        )
+    return {
+        "series": series,
+        "pots": {
+            "hands": stats.pot_hands,
+            "potsize": stats.potsize,
+            "rake": stats.rake,
+        },
+        "aggregates": {
+            "hand_count": stats.hand_count,
+            "family_pots": stats.family_pot_count,
+            "rake": round(float(stats.rake.sum()), 2),
+            "pot_total": round(float(stats.potsize.sum()), 2),
+            "players": players,
+        },
+    }
+
+
+def empty_state():
+    """Returns the state of a session without hands, see session_state()"""
+
+    return {
+        "series": {},
+        "pots": {"hands": [], "potsize": [], "rake": []},
+        "aggregates": {"players": {}},
+    }
+
+
+class SessionUpdates:
+    """Builds the updates of a growing session from the hands parsed since the last
+    update, without going over the whole session again
+
+    An update holds "from_hand": the first hand number sent again (the last hand of
+    the update before may have been half-written), the series of the players seated
+    since (of new players from the start), the pots from that hand on and the
+    aggregates that changed (players only if one of their totals changed). Merged in
+    order by merge_update(), the updates add up to session_state(). They are JSON
+    serializable.
+
+    Attributes
+    ----------
+    hand_count : int or None
+        Hand count of the last update, None before the first one
+    """
+
+    def __init__(self):
+        self.hand_count = None
+        self.players = {}  # totals last sent of each player
+        self.aggregates = {}  # aggregates last sent
+        self.allins = 0  # number of session.allin_hands added to the EV so far
+        self.ev_hands = {}  # hands at which the all-in EV of each player changes
+        self.ev_offsets = {}  # all-in EV minus chip count of each player from there
+
+    def ev_offset(self, name, hand):
+        """Returns the all-in EV minus the chip count of a player at a hand"""
+
+        i = bisect_right(self.ev_hands.get(name, ()), hand)
+        return self.ev_offsets[name][i - 1] if i else 0.0
+
+    def update(self, session):
+        """Returns the update from the last one to the session
+
+        Parameters
+        ----------
+        session : Session
+            The session of the last update with the new hands added, see
+            hand_history.HandHistoryFollower
+
+        Returns
+        -------
+        dict
+        """
+
+        from_hand = self.hand_count or 0
+        self.hand_count = session.hand_count
+
+        # The all-ins whose results are in the chip counts now, see equity.ev_chips()
+        allins = session.allin_hands
+        while self.allins < len(allins) and allins[self.allins].hand < self.hand_count:
+            record = allins[self.allins]
+            ev = expected_winnings(record)
+            for name, expected, won in zip(record.names, ev, record.won):
+                offsets = self.ev_offsets.setdefault(name, [])
+                offsets.append((offsets[-1] if offsets else 0.0) + expected - won)
+                self.ev_hands.setdefault(name, []).append(record.hand + 1)
+            self.allins += 1
+
+        series, players = {}, {}
+        for player in session.players.values():
+            name = player.name
+            new = name not in self.players
+            if not new and player.hands[-1] < from_hand:
+                continue  # not seated since the last update
+            start = 0 if new else bisect_left(player.hands, from_hand)
+            hands, chips = player.hands[start:].tolist(), player.chips[start:].tolist()
+            series[name] = {
+                "hands": hands,
+                "chips": chips,
+                "ev": [
+                    count + self.ev_offset(name, hand)
+                    for hand, count in zip(hands, chips)
+                ],
+            }
+            totals = {
+                column: player.total(total) for column, total in total_columns.items()
+            }
+            totals.update(
+                hands=len(player.hands) - 1,
+                chips=player.chips[-1],
+                buyins=totals["rebuys"] + 1,
+                allin_ev=round(
+                    player.chips[-1] + self.ev_offset(name, player.hands[-1])
+                ),
+                in_allin=name in self.ev_hands,
+            )
+            if self.players.get(name) != totals:
+                players[name] = self.players[name] = totals
+
+        potsize, rake = session.potsize, session.rake
+        pots = {
+            "hands": list(range(from_hand, len(potsize))),
+            "potsize": potsize[from_hand:].tolist(),
+            "rake": rake[from_hand:].tolist(),
+        }
+        aggregates = {
+            "hand_count": self.hand_count,
+            "family_pots": int(np.frombuffer(session.family_pots, dtype="b").sum()),
+            "rake": round(float(np.frombuffer(rake, dtype="d").sum()), 2),
+            "pot_total": round(float(np.frombuffer(potsize, dtype="d").sum()), 2),
+        }
+        aggregates = {
+            key: value
+            for key, value in aggregates.items()
+            if self.aggregates.get(key) != value
+        }
+        self.aggregates.update(aggregates)
+        aggregates["players"] = players
+        return {
+            "from_hand": from_hand,
+            "series": series,
+            "pots": pots,
+            "aggregates": aggregates,
+        }
+
+
+def merge_update(state, update):
+    """Merges an update into a session state the way the browsers do
+
+    Parameters
+    ----------
+    state : dict
+        see empty_state(), changed in place
+    update : dict
+        see SessionUpdates
+    """
+
+    def merge(columns, values):
+        # Drops what is sent again and appends the new values
+        keep = bisect_left(columns["hands"], update["from_hand"])
+        for key, column in columns.items():
+            del column[keep:]
+            column.extend(values[key])
+
+    if update["from_hand"] == 0:
+        state.update(empty_state())
+    for name, columns in update["series"].items():
+        merge(
+            state["series"].setdefault(name, {"hands": [], "chips": [], "ev": []}),
+            columns,
+        )
+    merge(state["pots"], update["pots"])
+    players = state["aggregates"]["players"]
+    players.update(update["aggregates"]["players"])
+    state["aggregates"].update(update["aggregates"], players=players)
+
+
+class Dashboard:
+    """Follows a hand history and keeps the updates the browsers are sent
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    interval : float, optional
+        Seconds between two polls of the file, by default 1.0
+    history : int, optional
+        Number of updates kept for browsers that reconnect, by default 1000
+
+    Attributes
+    ----------
+    version : int
+        Number of the latest update, 0 before the first hand
+    updates : collections.deque
+        (number, JSON) of the latest updates, oldest first, see SessionUpdates
+    state : dict
+        The updates merged, what the browsers have, see merge_update()
+    polls : int
+        Number of polls that parsed new lines
+    """
+
+    def __init__(
+        self,
+        filename,
+        chip_count_start=10000,
+        interval=interval_default,
+        history=1000,
+    ):
+        self.filename = filename
+        self.follower = HandHistoryFollower(
+            filename, chip_count_start=chip_count_start, actions=True
+        )
+        self.interval = interval
+        self.version = 0
+        self.updates = deque(maxlen=history)
+        self.polls = 0
+        self.state = empty_state()
+        self._session_updates = SessionUpdates()
+        self._snapshot = (0, None)  # (version, JSON) of the whole session
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """Parses whatever was appended to the file and publishes what changed
+
+        Returns
+        -------
+        bool
+            Whether there was an update
+        """
+
+        lap = laps("dashboard")
+        offset, parser = self.follower.offset, self.follower.parser
+        session = self.follower.poll()
+        if self.follower.offset == offset and self.follower.parser is parser:
+            return False
+        lap("poll")
+        if self.follower.parser is not parser:
+            self._session_updates = (
+                SessionUpdates()
+            )  # the file was replaced, start over
+        update = self._session_updates.update(session)
+        message = json.dumps(update, separators=(",", ":"))
+        lap("state")
+        with self._condition:
+            merge_update(self.state, update)
+            self.polls += 1
+            self.version += 1
+            self.updates.append((self.version, message))
+            self._condition.notify_all()
+        return True
+
+    def snapshot(self):
+        """Returns the whole session as one update starting at hand 0
+
+        Returns
+        -------
+        version : int
+            Number of the update it is up to date with
+        update : str
+            JSON, see SessionUpdates
+        """
+
+        with self._condition:
+            if self._snapshot[0] != self.version or self._snapshot[1] is None:
+                update = dict(from_hand=0, **self.state)
+                self._snapshot = (
+                    self.version,
+                    json.dumps(update, separators=(",", ":")),
+                )
+            return self._snapshot
+
+    def updates_after(self, version, timeout=15.0):
+        """Waits for the updates after a version
+
+        Parameters
+        ----------
+        version : int or None
+            The last update a browser has, None for a browser that has nothing yet
+        timeout : float, optional
+            Seconds to wait for a new update, by default 15.0
+
+        Returns
+        -------
+        list of tuple
+            (number, JSON) of each update to send, the whole session as one update
+            if the browser has nothing or missed updates no longer kept. Empty if
+            nothing changed within timeout.
+        """
+
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.version != version or self._stop.is_set(), timeout
+            )
+            if version is not None and version == self.version:
+                return []
+            oldest = self.updates[0][0] if self.updates else self.version + 1
+            if version is not None and oldest <= version + 1 <= self.version:
+                return [update for update in self.updates if update[0] > version]
+        return [self.snapshot()]
+
+    def run(self):
+        """Polls the file until stop() is called"""
+
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except OSError as err:
+                print(f"Could not read {self.filename}: {err!r}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Polls the file in a background thread"""
+
+        self._thread = threading.Thread(target=self.run, name="dashboard", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops polling and wakes up every waiting browser"""
+
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Serves the page, the session as JSON and the stream of updates, the
+    Dashboard is the dashboard attribute of the server"""
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the console
+
+    def _send(self, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        dashboard = self.server.dashboard
+        if path == "/":
+            self._send(
+                render_page(table_name(dashboard.filename) or "Poker"),
+                "text/html; charset=utf-8",
+            )
+        elif path == "/session.json":
+            self._send(dashboard.snapshot()[1], "application/json")
+        elif path == "/events":
+            self._stream(dashboard)
+        else:
+            self.send_error(404)
+
+    def _stream(self, dashboard):
+        """Sends updates as server-sent events until the browser goes away"""
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last_id = self.headers.get("Last-Event-ID")
+        version = int(last_id) if last_id and last_id.isdigit() else None
+        try:
+            self.wfile.write(b"retry: 2000\n\n")
+            self.wfile.flush()
+            while not dashboard._stop.is_set():
+                updates = dashboard.updates_after(version)
+                if not updates:
+                    self.wfile.write(b": keep-alive\n\n")  # finds closed connections
+                for version, update in updates:
+                    self.wfile.write(f"id: {version}\ndata: {update}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(dashboard, host=host_default, port=port_default):
+    """Creates the HTTP server of a dashboard, serve_forever() starts serving
+
+    Parameters
+    ----------
+    dashboard : Dashboard
+        Dashboard to serve
+    host : str, optional
+        Address to listen on, by default 127.0.0.1 (this computer only). "0.0.0.0"
+        lets the other players on the network watch.
+    port : int, optional
+        Port to listen on, by default 8050. 0 picks a free one.
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+    """
+
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    server.daemon_threads = True
+    server.dashboard = dashboard
+    return server
+
+
+def render_page(title):
+    """Returns the page of the dashboard
+
+    Parameters
+    ----------
+    title : str
+        Shown as title, e.g. the table name. It comes from a file name, so it is
+        escaped for the HTML and handed to the script as JSON data, never as markup
+        or code.
+
+    Returns
+    -------
+    str
+    """
+
+    # "<" is escaped in the JSON too, so a "</script>" cannot end the script early
+    values = {
+        "title": html.escape(title),
+        "title_json": json.dumps(title).replace("<", "\\u003c"),
+    }
+    # One pass, so a title containing a placeholder is not replaced again
+    return re.sub(r"\{(title|title_json)\}", lambda match: values[match[1]], page)
+
+
+page = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body { font-family: sans-serif; margin: 1em 2em; background: #eaeaf2; }
+canvas { width: 100%; height: 55vh; background: white; }
+table { border-collapse: collapse; margin-top: 1em; }
+th, td { padding: 0.2em 0.8em; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+tr:nth-child(even) { background: #f4f4f8; }
+</style>
+</head>
+<body>
+<h2 id="title">{title}</h2>
+<canvas id="chips"></canvas>
+<table id="totals"></table>
+<script>
+const tableName = {title_json};
+const colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b",
+                "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+const columns = [["hands", "Hands"], ["chips", "Chips"], ["allin_ev", "All-in EV"],
+  ["buyins", "Buy-ins"], ["showdown_wins", "Wins w/ SD"],
+  ["wins_no_showdown", "Wins w/o SD"], ["losses", "Losses"],
+  ["preflop_folds", "Preflop folds"], ["allins_won", "All-ins won"],
+  ["allins_lost", "All-ins lost"], ["rebuys", "Re-buys"]];
+let session = {series: {}, pots: {hands: [], potsize: [], rake: []},
+               aggregates: {players: {}}};
+
+function merge(columns, update, from) {
+  // Drops what is sent again and appends the new values
+  let keep = columns.hands.findIndex(hand => hand >= from);
+  if (keep < 0) keep = columns.hands.length;
+  for (const key in update) columns[key] = columns[key].slice(0, keep).concat(update[key]);
+}
+
+function apply(update) {
+  if (update.from_hand === 0) {
+    session.series = {};
+    session.pots = {hands: [], potsize: [], rake: []};
+    session.aggregates = {players: {}};
+  }
+  for (const name in update.series || {}) {
+    session.series[name] = session.series[name] || {hands: [], chips: [], ev: []};
+    merge(session.series[name], update.series[name], update.from_hand);
+  }
+  if (update.pots) merge(session.pots, update.pots, update.from_hand);
+  const players = Object.assign(session.aggregates.players,
+                                (update.aggregates || {}).players);
+  Object.assign(session.aggregates, update.aggregates || {}, {players: players});
+}
+
+function draw() {
+  const canvas = document.getElementById("chips");
+  const width = canvas.width = canvas.clientWidth * devicePixelRatio;
+  const height = canvas.height = canvas.clientHeight * devicePixelRatio;
+  const ctx = canvas.getContext("2d");
+  const names = Object.keys(session.series);
+  const hands = Math.max(1, session.aggregates.hand_count || 0);
+  let top = 1;
+  for (const name of names) for (const chips of session.series[name].chips)
+    top = Math.max(top, chips);
+  const x = hand => 40 + hand / hands * (width - 80);
+  const y = chips => height - 20 - chips / (top * 1.05) * (height - 40);
+  const pots = session.pots;
+  ctx.fillStyle = "rgba(0, 0, 0, 0.15)";
+  for (let i = 0; i < pots.hands.length; i++) {
+    const h = height - 20 - y(pots.potsize[i]);
+    ctx.fillRect(x(pots.hands[i]), height - 20 - h, Math.max(1, x(1) - x(0)), h);
+  }
+  names.forEach((name, i) => {
+    const series = session.series[name];
+    const lines = [[series.chips, [], 2.5 * devicePixelRatio]];
+    if ((session.aggregates.players[name] || {}).in_allin)
+      lines.push([series.ev, [4, 4], 1.5 * devicePixelRatio]);
+    for (const [values, dash, lineWidth] of lines) {
+      ctx.strokeStyle = colors[i % colors.length];
+      ctx.setLineDash(dash);
+      ctx.lineWidth = lineWidth;
+      ctx.beginPath();
+      values.forEach((chips, j) => {
+        if (j) ctx.lineTo(x(series.hands[j]), y(chips));
+        else ctx.moveTo(x(series.hands[j]), y(chips));
+      });
+      ctx.stroke();
+    }
+  });
+  const aggregates = session.aggregates;
+  document.getElementById("title").textContent =
+    `${tableName}: hand # ${aggregates.hand_count || 0}, ${aggregates.family_pots || 0} ` +
+    `family pots, ${aggregates.rake || 0} rake`;
+  // Built from nodes, player names are text and never markup
+  const cell = (tag, text) => {
+    const node = document.createElement(tag);
+    node.textContent = text;
+    return node;
+  };
+  const header = document.createElement("tr");
+  header.append(cell("th", "Player"), ...columns.map(c => cell("th", c[1])));
+  const rows = names.map((name, i) => {
+    const totals = aggregates.players[name] || {};
+    const row = document.createElement("tr");
+    const player = cell("td", name);
+    player.style.color = colors[i % colors.length];
+    row.append(player, ...columns.map(c => cell("td", totals[c[0]] ?? "")));
+    return row;
+  });
+  document.getElementById("totals").replaceChildren(header, ...rows);
+}
+
+const events = new EventSource("events");
+events.onmessage = event => { apply(JSON.parse(event.data)); draw(); };
+window.onresize = draw;
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=path_hand_default)
+    parser.add_argument("--host", default=host_default)
+    parser.add_argument("--port", type=int, default=port_default)
+    parser.add_argument("--interval", type=float, default=interval_default)
+    parser.add_argument("--chip-count-start", type=int, default=10000)
+    args = parser.parse_args()
+
+    filename = args.path
+    if os.path.isdir(filename):
+        filename = max(find_hand_histories(filename), key=os.path.getmtime)
+    dashboard = Dashboard(
+        filename, chip_count_start=args.chip_count_start, interval=args.interval
+    )
+    server = serve(dashboard, host=args.host, port=args.port)
+    dashboard.start()
+    print(f"Following {filename}")
+    print(f"Dashboard at http://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.stop()
+        server.server_close()
@@ -0,0 +1,166 @@
+"""Hands recorded by several accounts, found by their PokerStars hand id
+
+Every account at a table writes its own hand history, so the same home game can
+end up in several alias folders, wholly or in part. The hand id in the header
+("Hand #215486308040") is unique across PokerStars, so a hand that was already
+seen in an earlier file is a duplicate. Aggregations over the archive keep the
+first copy of each hand (see archive.parse_archive()); the store keeps one row
+per hand and merges the hole cards each account was dealt into it (see
+store.py).
+
+HandIdSet keeps the ids seen so far as one sorted array of 64 bit integers,
+8 bytes per hand (a set of Python ints takes about ten times as much), and tests
+the ids of a whole file at once. Files are handled one after the other, only the
+ids of the current file and the set are in memory.
+
+Run as a script to list the files with hands already recorded in another one:
+
+    python dedup.py [path]
+"""
+
+import argparse
+import mmap
+import re
+
+import numpy as np
+
+_hand_header = re.compile(
+    rb"^(?:\xef\xbb\xbf)?PokerStars [^\n]*?Hand #(\d+):", re.MULTILINE
+)
+
+
+class HandIdSet:
+    """Compact set of hand ids
+
+    New ids are collected in a buffer and merged into the sorted array the next
+    time the set is queried, in one pass however many batches were added.
+
+    Parameters
+    ----------
+    ids : array-like of ints, optional
+        Initial ids, by default none
+    """
+
+    def __init__(self, ids=()):
+        self.ids = np.unique(np.asarray(ids, dtype=np.int64))
+        self._pending = []
+
+    def _merge(self):
+        if self._pending:
+            self.ids = np.union1d(self.ids, np.concatenate(self._pending))
+            self._pending = []
+
+    def add(self, ids):
+        """Adds ids
+
+        Parameters
+        ----------
+        ids : array-like of ints
+        """
+
+        self._pending.append(np.asarray(ids, dtype=np.int64))
+
+    def contains(self, ids):
+        """Tests ids for membership
+
+        Parameters
+        ----------
+        ids : array-like of ints
+
+        Returns
+        -------
+        numpy.ndarray of bool
+            Whether each id is in the set
+        """
+
+        self._merge()
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = np.zeros(len(ids), dtype=bool)
+        inside = positions < len(self.ids)
+        found[inside] = self.ids[positions[inside]] == ids[inside]
+        return found
+
+    def __contains__(self, hand_id):
+        return bool(self.contains([hand_id])[0])
+
+    def __len__(self):
+        self._merge()
+        return len(self.ids)
+
+
+def scan_hand_ids(filename):
+    """Returns the hand ids of a hand history file, read from the hand headers of
+    the memory-mapped file without decoding it
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+
+    Returns
+    -------
+    numpy.ndarray of int64
+        Hand ids in file order
+    """
+
+    with open(filename, "rb") as raw_file:
+        if not raw_file.seek(0, 2):
+            return np.zeros(0, dtype=np.int64)
+        with mmap.mmap(raw_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return np.array(
+                [int(match.group(1)) for match in _hand_header.finditer(mapped)],
+                dtype=np.int64,
+            )
+
+
+def find_duplicates(hand_ids, seen=None):
+    """Finds the hands of each file that an earlier file already recorded
+
+    Parameters
+    ----------
+    hand_ids : iterable of tuple
+        (file, hand ids of the file) in the order the files are read, e.g.
+        ((filename, scan_hand_ids(filename)) for filename in filenames). Can be
+        a generator, only one file's ids are needed at a time.
+    seen : HandIdSet, optional
+        Ids recorded before the first file, by default none. Every id read is
+        added to it.
+
+    Returns
+    -------
+    dict
+        Set of the ids already recorded (dict value) for each file with at least
+        one of them (dict key)
+    """
+
+    if seen is None:
+        seen = HandIdSet()
+    duplicates = {}
+    for filename, ids in hand_ids:
+        ids = np.asarray(ids, dtype=np.int64)
+        repeated = ids[seen.contains(ids)]
+        if len(repeated):
+            duplicates[filename] = set(repeated.tolist())
+        seen.add(ids)
+    return duplicates
+
+
+if __name__ == "__main__":
+    from archive import find_hand_histories, path_hand_default
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=path_hand_default)
+    args = parser.parse_args()
+
+    filenames = find_hand_histories(args.path)
+    seen = HandIdSet()
+    duplicates = find_duplicates(
+        ((filename, scan_hand_ids(filename)) for filename in filenames), seen
+    )
+    for filename, ids in duplicates.items():
+        print(f"{filename}: {len(ids)} hands recorded before")
+    print(
+        f"{len(seen)} hands in {len(filenames)} files, "
+        + f"{sum(map(len, duplicates.values()))} duplicates in {len(duplicates)} files"
+    )
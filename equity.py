@@ -0,0 +1,597 @@
+"""All-in equity and expected value of the all-ins of a session
+
+The parser records every hand in which a player was all-in before the board was
+complete and the hand went to showdown (AllinTracker): the cards shown (or
+dealt), the board, how many board cards were out at the all-in and what each
+player put into the pot and won. The equity of each player at that point is the
+share of the pot the player wins averaged over every possible rest of the board,
+enumerated exactly when there are few (after the flop) or sampled otherwise
+(preflop). The expected value of the hand is the pot (after rake) times the
+equity, pot by pot when there are side pots; the all-in EV chip count of a player
+is the chip count with the actual result of every all-in replaced by that
+expected value.
+
+Hands are evaluated with bit masks: each card is a bit in a 13-bit rank mask of
+its suit, and pairs, trips, quads, flushes and straights of a 7-card hand follow
+from bitwise operations on the four suit masks and lookups in 8192-entry tables.
+Everything is a NumPy operation over all runouts at once, so an all-in costs
+milliseconds after the flop and a few tens of milliseconds preflop. The result is
+kept with the recorded hand, so a live session only evaluates new all-ins.
+
+Run as a script to print the all-in EV of every player of a hand history:
+
+    python equity.py path [--samples N]
+"""
+
+import argparse
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from hud import (
+    BET,
+    CALL,
+    CHECK,
+    FLOP,
+    FOLD,
+    POST_BIG_BLIND,
+    POST_BOTH_BLINDS,
+    POST_SMALL_BLIND,
+    PREFLOP,
+    RAISE,
+    RIVER,
+    TURN,
+)
+
+ranks = "23456789TJQKA"
+suits = "cdhs"
+
+# Number of runouts sampled when there are more than exact_limit of them
+samples_default = 20000
+exact_limit_default = 50000
+
+# Board cards out on each street
+_board_size = {PREFLOP: 0, FLOP: 3, TURN: 4, RIVER: 5}
+
+# Actions that add their amount to the chips in front of the player, a raise sets it
+_adds = {BET, CALL, POST_SMALL_BLIND, POST_BIG_BLIND}
+
+# Hand categories, the highest bits of a hand value
+(
+    HIGH_CARD,
+    PAIR,
+    TWO_PAIR,
+    TRIPS,
+    STRAIGHT,
+    FLUSH,
+    FULL_HOUSE,
+    QUADS,
+    STRAIGHT_FLUSH,
+) = range(9)
+
+
+def parse_cards(text):
+    """Returns the cards of e.g. "Js Ac" as integers rank * 4 + suit
+
+    Parameters
+    ----------
+    text : str
+        Cards as written in the hand history, separated by spaces
+
+    Returns
+    -------
+    list of int
+    """
+
+    return [ranks.index(card[0]) * 4 + suits.index(card[1]) for card in text.split()]
+
+
+def _tables():
+    """Lookup tables over all 13-bit rank masks"""
+
+    masks = np.arange(1 << 13)
+    bits = (masks[:, None] >> np.arange(13)) & 1
+    popcount = bits.sum(axis=1)
+    # Highest rank in the mask (0 for the empty mask)
+    high = np.where(masks > 0, 12 - np.argmax(bits[:, ::-1], axis=1), 0)
+    # The five highest ranks, 4 bits each with the highest in bits 16-19
+    top5 = np.zeros(1 << 13, dtype=np.int64)
+    rest = masks
+    for shift in (16, 12, 8, 4, 0):
+        rank = high[rest]
+        top5 |= np.where(rest > 0, rank << shift, 0)
+        rest = rest & ~(1 << rank)
+    # Highest rank of a straight, the ace also counts below the deuce (-1 for none)
+    wheel = (masks << 1) | (masks >> 12)
+    runs = wheel & (wheel >> 1) & (wheel >> 2) & (wheel >> 3) & (wheel >> 4)
+    runs_bits = (runs[:, None] >> np.arange(14)) & 1
+    straight = np.where(runs > 0, 13 - np.argmax(runs_bits[:, ::-1], axis=1) + 3, -1)
+    return popcount, high, top5, straight
+
+
+_popcount, _high, _top5, _straight = _tables()
+
+
+def evaluate(cards):
+    """Returns the value of 7-card hands, a higher value is a better hand
+
+    Parameters
+    ----------
+    cards : numpy.ndarray of ints
+        ... x 7 cards, see parse_cards()
+
+    Returns
+    -------
+    numpy.ndarray of ints
+        Value of each hand: the category (HIGH_CARD ... STRAIGHT_FLUSH) in bits
+        20-23 and the ranks deciding between hands of the category below
+    """
+
+    cards = np.asarray(cards)
+    bits = 1 << (cards >> 2)
+    suit = cards & 3
+    a, b, c, d = (np.where(suit == s, bits, 0).sum(axis=-1) for s in range(4))
+    ranks_mask = a | b | c | d
+    pairs = (a & b) | (a & c) | (a & d) | (b & c) | (b & d) | (c & d)
+    trips = (a & b & c) | (a & b & d) | (a & c & d) | (b & c & d)
+    quads = a & b & c & d
+    flush = np.zeros_like(a)
+    for suit_mask in (a, b, c, d):
+        flush = np.where(_popcount[suit_mask] >= 5, suit_mask, flush)
+
+    high, top5 = _high, _top5
+    quad, trip, pair = high[quads], high[trips], high[pairs]
+    second_pair = high[pairs & ~(1 << pair)]
+    full_pair = high[pairs & ~(1 << trip)]
+    straight_flush = _straight[flush]
+    straight = _straight[ranks_mask]
+    return np.select(
+        [
+            (flush > 0) & (straight_flush >= 0),
+            quads > 0,
+            (trips > 0) & ((pairs & ~(1 << trip)) > 0),
+            flush > 0,
+            straight >= 0,
+            trips > 0,
+            _popcount[pairs] >= 2,
+            pairs > 0,
+        ],
+        [
+            STRAIGHT_FLUSH << 20 | straight_flush << 16,
+            QUADS << 20 | quad << 16 | high[ranks_mask & ~(1 << quad)] << 12,
+            FULL_HOUSE << 20 | trip << 16 | full_pair << 12,
+            FLUSH << 20 | top5[flush],
+            STRAIGHT << 20 | straight << 16,
+            TRIPS << 20 | trip << 16 | (top5[ranks_mask & ~(1 << trip)] >> 12) << 8,
+            TWO_PAIR << 20
+            | pair << 16
+            | second_pair << 12
+            | high[ranks_mask & ~(1 << pair) & ~(1 << second_pair)] << 8,
+            PAIR << 20 | pair << 16 | (top5[ranks_mask & ~(1 << pair)] >> 8) << 4,
+        ],
+        HIGH_CARD << 20 | top5[ranks_mask],
+    )
+
+
+def runout_values(
+    holes, board=(), samples=samples_default, exact_limit=exact_limit_default, rng=None
+):
+    """Returns the value of each player's hand on every runout of the board
+
+    Parameters
+    ----------
+    holes : list of list of int
+        The two cards of each player, see parse_cards()
+    board : list of int, optional
+        Board cards already out, by default none
+    samples : int, optional
+        Number of runouts sampled if there are more than exact_limit, by default
+        20000
+    exact_limit : int, optional
+        Every runout is evaluated if there are at most this many, by default 50000
+    rng : numpy.random.Generator, optional
+        Draws the sampled runouts, by default a new unseeded one
+
+    Returns
+    -------
+    numpy.ndarray of ints
+        Players x runouts, see evaluate()
+    """
+
+    holes = np.asarray(holes, dtype=np.int64).reshape(-1, 2)
+    board = np.asarray(board, dtype=np.int64)
+    deck = np.setdiff1d(np.arange(52), np.concatenate([holes.ravel(), board]))
+    missing = 5 - len(board)
+    if missing == 0:
+        runouts = np.zeros((1, 0), dtype=np.int64)
+    elif comb(len(deck), missing) <= exact_limit:
+        runouts = np.array(list(combinations(range(len(deck)), missing)))
+    else:
+        rng = rng or np.random.default_rng()
+        # The missing cards with the smallest random keys: a sample without repeats
+        keys = rng.random((samples, len(deck)))
+        runouts = np.argpartition(keys, missing - 1, axis=1)[:, :missing]
+    boards = np.concatenate(
+        [np.broadcast_to(board, (len(runouts), len(board))), deck[runouts]], axis=1
+    )
+    cards = np.concatenate(
+        [
+            np.broadcast_to(holes[:, None, :], (len(holes), len(boards), 2)),
+            np.broadcast_to(boards, (len(holes), *boards.shape)),
+        ],
+        axis=2,
+    )
+    return evaluate(cards)
+
+
+def pot_shares(values, contenders=None):
+    """Returns the share of a pot each player wins on average over the runouts
+
+    Parameters
+    ----------
+    values : numpy.ndarray of ints
+        Players x runouts, see runout_values()
+    contenders : array-like of bool, optional
+        Players that can win the pot, by default all
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        Share of each player, ties split the pot
+    """
+
+    if contenders is not None:
+        values = np.where(np.asarray(contenders)[:, None], values, -1)
+    winners = values == values.max(axis=0)
+    return (winners / winners.sum(axis=0)).mean(axis=1)
+
+
+def equity(
+    holes, board=(), samples=samples_default, exact_limit=exact_limit_default, rng=None
+):
+    """Returns the all-in equity of each player
+
+    Parameters
+    ----------
+    holes : list of str
+        The two cards of each player, e.g. ["Ac Ad", "8h 8s"]
+    board : str, optional
+        Board cards already out, e.g. "Js 4c 7d", by default none
+    samples, exact_limit, rng : optional
+        see runout_values()
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        Share of the pot each player wins on average
+    """
+
+    values = runout_values(
+        [parse_cards(hole) for hole in holes],
+        parse_cards(board) if board else [],
+        samples=samples,
+        exact_limit=exact_limit,
+        rng=rng,
+    )
+    return pot_shares(values)
+
+
+class AllinHand:
+    """A hand with an all-in before the board was complete that went to showdown
+
+    Attributes
+    ----------
+    hand : int
+        Hand number
+    names : list of str
+        Every player who put chips into the pot
+    cards : list of str or None
+        Hole cards of each player, None if the player folded
+    contributions : list of int
+        Chips each player put into the pot
+    won : list of int
+        Chips each player won
+    board : str
+        The whole board
+    known : int
+        Number of board cards out at the all-in (0, 3 or 4)
+    rake : float
+        Rake of the hand
+    ev : list of float or None
+        Chips each player was expected to win at the all-in, None until computed
+        by expected_winnings()
+    """
+
+    __slots__ = (
+        "hand",
+        "names",
+        "cards",
+        "contributions",
+        "won",
+        "board",
+        "known",
+        "rake",
+        "ev",
+    )
+
+    def __init__(self, hand, names, cards, contributions, board, known, rake):
+        self.hand = hand
+        self.names = names
+        self.cards = cards
+        self.contributions = contributions
+        self.won = [0] * len(names)
+        self.board = board
+        self.known = known
+        self.rake = rake
+        self.ev = None
+
+
+def expected_winnings(record, samples=samples_default, exact_limit=exact_limit_default):
+    """Computes (once) the chips each player of an all-in was expected to win
+
+    The pot is split into the main pot and the side pots by the contributions of
+    the players still in the hand, each won on average by the contenders for it.
+    The rake is taken from every pot in proportion to its size.
+
+    Parameters
+    ----------
+    record : AllinHand
+        The hand, its ev attribute is set
+    samples, exact_limit : int, optional
+        see runout_values()
+
+    Returns
+    -------
+    list of float
+        Expected winnings of each player of the hand
+    """
+
+    if record.ev is not None:
+        return record.ev
+    live = [i for i, cards in enumerate(record.cards) if cards is not None]
+    values = runout_values(
+        [parse_cards(record.cards[i]) for i in live],
+        parse_cards(record.board)[: record.known],
+        samples=samples,
+        exact_limit=exact_limit,
+        # Seeded by the hand so the sampled equity is the same on every run
+        rng=np.random.default_rng(record.hand),
+    )
+    contributions = np.array(record.contributions, dtype=float)
+    live_contributions = contributions[live]
+    pot = contributions.sum()
+    payout = 1 - record.rake / pot if pot else 0
+    ev = np.zeros(len(record.names))
+    previous = 0.0
+    for level in np.unique(live_contributions):
+        amount = (
+            np.minimum(contributions, level) - np.minimum(contributions, previous)
+        ).sum()
+        previous = level
+        ev[live] += amount * pot_shares(values, live_contributions >= level)
+    # Folded chips above the largest live contribution go to its contenders
+    rest = (contributions - np.minimum(contributions, previous)).sum()
+    if rest:
+        ev[live] += rest * pot_shares(values, live_contributions >= previous)
+    record.ev = (ev * payout).tolist()
+    return record.ev
+
+
+def action_amount(action_type, action):
+    """Returns the chips of a bet, call or blind, for a raise the total it raises
+    to, None for a fold or check
+
+    Parameters
+    ----------
+    action_type : int
+        One of the actions of hud, e.g. hud.RAISE
+    action : str
+        The text of the action after the player name, see hand_history.tokenize()
+
+    Returns
+    -------
+    int or None
+    """
+
+    if action_type == FOLD or action_type == CHECK:
+        return None
+    words = action.split()
+    if action_type == RAISE:
+        return int(words[3])  # "raises <by> to <total>"
+    return int(words[-4] if words[-1] == "all-in" else words[-1])
+
+
+class AllinTracker:
+    """Records the all-in hands of the hand being parsed, see AllinHand
+
+    The parser hands every action (name, action type, text) and street to actions,
+    a list kept for the current hand and replayed only when the hand turns out to
+    be an all-in that went to showdown.
+
+    Parameters
+    ----------
+    allin_hands : list of AllinHand
+        Where recorded hands are added, see Session.allin_hands
+    """
+
+    def __init__(self, allin_hands):
+        self.allin_hands = allin_hands
+        self.actions = []
+        self.cards = {}
+        self.returned = {}
+        self.new_hand()
+
+    def new_hand(self):
+        """Forgets the state of the previous hand"""
+
+        self.actions.clear()
+        self.cards.clear()
+        self.returned.clear()
+        self.pot = None
+        self.record = None
+
+    def hole_cards(self, name, cards):
+        """The cards of a player were dealt or shown"""
+
+        self.cards[name] = cards
+
+    def uncalled(self, name, amount):
+        """An uncalled bet was returned"""
+
+        self.returned[name] = self.returned.get(name, 0) + amount
+
+    def total_pot(self, potsize, rake):
+        """The pot and rake of the hand"""
+
+        self.pot = (potsize, rake)
+
+    def board(self, board, hand, allin):
+        """The board of the hand, the hand is recorded if it is an all-in
+
+        Parameters
+        ----------
+        board : str
+            The whole board
+        hand : int
+            Hand number
+        allin : function
+            Whether a player (name) is all-in at the end of the hand
+        """
+
+        # Only a player who showed cards can have been all-in at the showdown
+        if (
+            self.pot is None
+            or len(self.cards) < 2
+            or not any(allin(name) for name in self.cards)
+        ):
+            return
+        # Replay the actions: chips in the pot and the street of the last action
+        contributions, street_bets, folded = {}, {}, set()
+        street = last_street = PREFLOP
+        small_blind = False
+        for action in self.actions:
+            if type(action) is int:
+                street = action
+                # The blinds count towards the bets of the preflop street
+                if street != PREFLOP:
+                    for name, bet in street_bets.items():
+                        contributions[name] = contributions.get(name, 0) + bet
+                    street_bets.clear()
+                continue
+            name, action_type, text = action
+            last_street = street
+            contributions.setdefault(name, 0)
+            if action_type == FOLD:
+                folded.add(name)
+            elif action_type == POST_SMALL_BLIND and small_blind:
+                # A second small blind, posted on joining, is dead money
+                contributions[name] += action_amount(action_type, text)
+            elif action_type == POST_BOTH_BLINDS:
+                # The small blind part (a third at half the big blind) is dead money
+                amount = action_amount(action_type, text)
+                contributions[name] += amount // 3
+                street_bets[name] = street_bets.get(name, 0) + amount - amount // 3
+            elif action_type == RAISE:
+                street_bets[name] = action_amount(action_type, text)
+            elif action_type in _adds:
+                street_bets[name] = street_bets.get(name, 0) + action_amount(
+                    action_type, text
+                )
+                small_blind |= action_type == POST_SMALL_BLIND
+        for name, bet in street_bets.items():
+            contributions[name] = contributions.get(name, 0) + bet
+        for name, amount in self.returned.items():
+            contributions[name] = contributions.get(name, 0) - amount
+
+        known = _board_size[last_street]
+        live = [name for name in contributions if name not in folded]
+        if (
+            known >= 5
+            or len(live) < 2
+            or not any(allin(name) for name in live)
+            or any(name not in self.cards for name in live)
+            or sum(contributions.values()) != self.pot[0]
+        ):
+            return
+        names = list(contributions)
+        self.record = AllinHand(
+            hand,
+            names,
+            [None if name in folded else self.cards[name] for name in names],
+            [contributions[name] for name in names],
+            board,
+            known,
+            self.pot[1],
+        )
+        self.allin_hands.append(self.record)
+
+    def won(self, name, amount):
+        """A player won chips (summary line of the seat)"""
+
+        if self.record is not None and name in self.record.names:
+            self.record.won[self.record.names.index(name)] += amount
+
+
+def ev_chips(session, stats, samples=samples_default, exact_limit=exact_limit_default):
+    """Returns the all-in EV chip count: the chip count with the result of every
+    all-in replaced by its expected value
+
+    Parameters
+    ----------
+    session : Session
+        see hand_history.data_extract()
+    stats : SessionStats
+        Statistics of session, see session_stats.SessionStats
+    samples, exact_limit : int, optional
+        see runout_values()
+
+    Returns
+    -------
+    ev : numpy.ndarray of floats
+        Players x hands like stats.chips
+    players : numpy.ndarray of bool
+        Whether each player was in an all-in
+    """
+
+    adjustments = np.zeros(stats.chips.shape)
+    players = np.zeros(len(stats.names), dtype=bool)
+    for record in session.allin_hands:
+        if record.hand >= stats.hand_count:
+            continue  # the next hand shows the result
+        ev = expected_winnings(record, samples=samples, exact_limit=exact_limit)
+        for name, expected, won in zip(record.names, ev, record.won):
+            row = stats.index[name]
+            adjustments[row, record.hand + 1] += expected - won
+            players[row] = True
+    return stats.chips + np.cumsum(adjustments, axis=1), players
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    from hand_history import parse_file
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--samples", type=int, default=samples_default)
+    args = parser.parse_args()
+
+    session = parse_file(args.path, actions=True)
+    before = perf_counter()
+    expected, won = {}, {}
+    for record in session.allin_hands:
+        ev = expected_winnings(record, samples=args.samples)
+        for name, chips_ev, chips_won in zip(record.names, ev, record.won):
+            contribution = record.contributions[record.names.index(name)]
+            expected[name] = expected.get(name, 0) + chips_ev - contribution
+            won[name] = won.get(name, 0) + chips_won - contribution
+    elapsed = perf_counter() - before
+    print(f"{len(session.allin_hands)} all-ins evaluated in {elapsed * 1e3:.0f} ms\n")
+    width = max([len(name) for name in expected] + [len("player")])
+    print(f"{'player':<{width}}  {'won':>9}  {'all-in EV':>9}  {'luck':>9}")
+    for name in expected:
+        print(
+            f"{name:<{width}}  {won[name]:>9.0f}  {expected[name]:>9.0f}  "
+            + f"{won[name] - expected[name]:>9.0f}"
+        )
@@ -0,0 +1,175 @@
+"""Headless export of session statistics
+
+Parses hand histories and writes the statistics of every player in every session
+to a JSON, CSV or Parquet file, without importing any plotting, Google or email
+modules (Parquet needs pyarrow, which is only imported for Parquet files):
+
+    python export.py [path ...] [--output FILE] [--format {json,csv,parquet}]
+                     [--chip-count-start N] [--no-cache]
+
+Paths can be hand history files or folders, by default all hand histories in
+poker_session/hand_history. The format follows from the extension of the output
+file unless it is given, by default JSON is written to stdout.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+
+from archive import find_hand_histories, path_hand_default, session_date
+from session_cache import load_session, path_cache_default
+from session_stats import SessionStats
+
+formats = ("json", "csv", "parquet")
+player_columns = (
+    "showdown_wins",
+    "wins_no_showdown",
+    "losses",
+    "preflop_folds",
+    "allins",
+    "allins_won",
+    "busts",
+    "rebuys",
+)
+
+
+def session_rows(filename, session):
+    """Returns one row of statistics for each player of a session
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file of the session
+    session : Session
+        see hand_history.data_extract()
+
+    Returns
+    -------
+    list of dict
+        Session columns (file, date, hands, family pots, rake, pot) followed by
+        the player columns (name, hands seated, final and highest chip count and
+        the sum of each flag column)
+    """
+
+    stats = SessionStats(session)
+    common = {
+        "file": Path(filename).name,
+        "date": session_date(filename),
+        "session_hands": stats.hand_count,
+        "family_pots": stats.family_pot_count,
+        "rake": round(float(stats.rake[1:].sum()), 2),
+        "pot": round(float(stats.potsize[1:].sum()), 2),
+    }
+    columns = {
+        "hands": stats.seated_count - 1,  # without the entry for the start
+        "chips": stats.final_chips,
+        "max_chips": stats.chips.max(axis=1),
+        **{column: stats.totals[column] for column in player_columns},
+    }
+    return [
+        {
+            **common,
+            "player": name,
+            **{column: int(values[row]) for column, values in columns.items()},
+        }
+        for row, name in enumerate(stats.names)
+    ]
+
+
+def collect_stats(
+    paths=(path_hand_default,), chip_count_start=10000, cache_dir=path_cache_default
+):
+    """Parses hand histories and returns the statistics of every player in every
+    session
+
+    Parameters
+    ----------
+    paths : iterable of str or Path, optional
+        Hand history files or folders, by default poker_session/hand_history
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    cache_dir : str or Path, optional
+        Folder of the session cache, by default poker_session/cache. None disables
+        the cache
+
+    Returns
+    -------
+    list of dict
+        see session_rows()
+    """
+
+    rows = []
+    for path in paths:
+        filenames = find_hand_histories(path) if Path(path).is_dir() else [Path(path)]
+        for filename in filenames:
+            session = load_session(
+                filename, cache_dir=cache_dir, chip_count_start=chip_count_start
+            )
+            rows += session_rows(filename, session)
+    return rows
+
+
+def write_stats(rows, output=None, fmt=None):
+    """Writes statistics rows to a file
+
+    Parameters
+    ----------
+    rows : list of dict
+        see collect_stats()
+    output : str or Path, optional
+        File to write, by default stdout (not for Parquet)
+    fmt : str, optional
+        One of "json", "csv" or "parquet", by default the extension of output or
+        JSON without output
+    """
+
+    if fmt is None:
+        fmt = Path(output).suffix.lstrip(".").lower() if output else "json"
+    if fmt not in formats:
+        raise ValueError(f"Unknown format {fmt}, use one of {', '.join(formats)}")
+
+    if fmt == "parquet":
+        if output is None:
+            raise ValueError("Parquet files can not be written to stdout")
+        # Only needed for Parquet, so it is only imported here
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as err:
+            raise ImportError("Writing Parquet files needs pyarrow") from err
+
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), output)
+        return
+
+    out_file = open(output, "w", newline="") if output else sys.stdout
+    try:
+        if fmt == "json":
+            json.dump(rows, out_file, indent=2)
+            out_file.write("\n")
+        else:
+            fieldnames = list(rows[0]) if rows else ["file", "player"]
+            writer = csv.DictWriter(out_file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if output:
+            out_file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[path_hand_default])
+    parser.add_argument("--output", "-o", default=None)
+    parser.add_argument("--format", choices=formats, default=None)
+    parser.add_argument("--chip-count-start", type=int, default=10000)
+    parser.add_argument("--no-cache", action="store_true", help="always parse anew")
+    args = parser.parse_args()
+
+    rows = collect_stats(
+        args.paths,
+        chip_count_start=args.chip_count_start,
+        cache_dir=None if args.no_cache else path_cache_default,
+    )
+    write_stats(rows, args.output, args.format)
@@ -0,0 +1,374 @@
+"""Upload of a session to the Google spreadsheet of the poker nights
+
+All reads and writes of a session go through a handful of batch requests, so an
+upload costs about seven API calls however many players took part. Corrections
+are asked for before the upload (collect_results()), so the upload itself runs
+without any input and can be retried or run next to other tasks.
+"""
+
+import csv
+import string
+
+
+def open_spreadsheet(name, path_creds):
+    """Opens a google spreadsheet with the credentials of a service account
+
+    Parameters
+    ----------
+    name : str
+        name of the google spreadsheet
+    path_creds : str
+        path to the credentials file (.json) of the service account
+
+    Returns
+    -------
+    gspread.Spreadsheet
+    """
+
+    # Only needed to upload, the rest of the scripts runs without the Google client libraries
+    import gspread  # for manipulating google sheets https://gspread.readthedocs.io/en/latest/index.html
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    scope = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive.file",
+        "https://www.googleapis.com/auth/drive",
+    ]
+
+    creds = ServiceAccountCredentials.from_json_keyfile_name(path_creds, scope)
+
+    # To succesfully be authorized, share the spreadsheet on the google account with the email define in the credential.json file.
+    client = gspread.authorize(creds)
+    return client.open(name)
+
+
+def column_to_a1(col):
+    """Helper function to convert a column index into its A1 letters (1 -> A, 27 -> AA, 703 -> AAA)
+
+    Parameters
+    ----------
+    col : int
+        column index, starting at 1
+
+    Returns
+    -------
+    str
+        column letters
+    """
+
+    letters = ""
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = string.ascii_uppercase[remainder] + letters
+    return letters
+
+
+def column_range(row, col, values):
+    """Helper function to build a batch_update entry writing values down one column
+
+    Parameters
+    ----------
+    row : int
+        row index of the first value, starting at 1
+    col : int
+        column index, starting at 1
+    values : list
+        values to write, one per row
+
+    Returns
+    -------
+    dict
+        range in A1 notation and values
+    """
+
+    letters = column_to_a1(col)
+    return {
+        "range": f"{letters}{row}:{letters}{row+len(values)-1}",
+        "values": [[value] for value in values],
+    }
+
+
+def transient_errors():
+    """Returns the errors of an upload worth another attempt: network errors and the
+    errors the Sheets API returns when it is busy
+
+    Returns
+    -------
+    tuple of exception classes
+    """
+
+    try:
+        from gspread.exceptions import APIError
+    except ImportError:
+        return (OSError,)
+    return (OSError, APIError)
+
+
+def collect_results(stats, name_index, ask=input):
+    """Asks to confirm or correct the buy-ins and the chip count of every player, before
+    anything is uploaded
+
+    Parameters
+    ----------
+    stats : SessionStats
+        statistics of the parsed session, see session_stats.SessionStats
+    name_index : dict
+        dictionary containing player names and their PokerStars aliases, in the order
+        of the rows of the spreadsheet
+    ask : function, optional
+        asks the user to confirm or correct the values found, by default input
+
+    Returns
+    -------
+    dict
+        (buy-ins, chip count) (dict value) of each player name (dict key), (0, 0) for
+        players that did not play
+    """
+
+    results = {}
+    for current_name, aliases in name_index.items():
+        count_buyin = chip_count = None
+        for poker_alias in aliases:
+            row = stats.index.get(poker_alias)
+            if row is None:
+                continue
+            print("\n---\n")
+            # Look up buy-ins
+            skip = ""
+            if count_buyin is not None:
+                skip = ask(
+                    f"{current_name} already has an entry other than {poker_alias} with {count_buyin} buy-ins. If you want to add counts enter 'add'  :  "
+                )
+                old_buyinCount = float(count_buyin)
+            count_buyin = int(stats.buyins[row])
+            saved_input = ask(
+                f"Found {current_name} as {poker_alias} with {count_buyin} buy-ins. Correct? (y/correction)  :  "
+            )
+            if saved_input != "y":
+                count_buyin = float(saved_input)
+            if skip == "add":
+                count_buyin += old_buyinCount
+            # Look up chip count
+            if chip_count is not None:
+                skip = ask(
+                    f"{current_name} already has an entry as {poker_alias} with {chip_count} chips and {count_buyin} buy-ins. Skip? (y/n)  :  "
+                )
+                if skip != "n":
+                    continue
+            chip_count = int(stats.final_chips[row])
+            saved_input = ask(
+                f"Found {current_name} as {poker_alias} with {chip_count} chips. Correct? (y/correction)  :  "
+            )
+            if saved_input != "y":
+                chip_count = int(saved_input)
+
+        if chip_count is not None:
+            saved_input = ask(
+                f"Saving {current_name} with {chip_count} chips and {count_buyin} buy-ins. Correct? (y/n)  :  "
+            )
+            if saved_input != "y":
+                chip_count = int(
+                    ask(
+                        f"The chip count of {current_name} ({chip_count}) should be  :  "
+                    )
+                )
+                count_buyin = float(
+                    ask(
+                        f"The buy-ins count of {current_name} ({count_buyin}) should be  :  "
+                    )
+                )
+            results[current_name] = (count_buyin, chip_count)
+        else:
+            results[current_name] = (0, 0)
+    return results
+
+
+def email_summary(stats, results, path_email):
+    """Writes the overview email of a session
+
+    Parameters
+    ----------
+    stats : SessionStats
+        statistics of the parsed session, see session_stats.SessionStats
+    results : dict
+        buy-ins and chip count of each player, see collect_results()
+    path_email : str
+        path to the csv file with the email address of each player
+
+    Returns
+    -------
+    email_message : str
+        message to send via email
+    email_recipients : list of str
+        contains all the emails of players that participated
+    """
+
+    email_recipients = []
+    with open(path_email, mode="r") as infile:
+        reader = csv.reader(infile)
+        for rows in reader:
+            t_email_list = [rows for rows in reader]
+    email_message = (
+        f"[automatically created email]\n\nHey guys,\n\nI just updated the excel sheet !\n"
+        + f"I've attached the statistic overview picture to this email and see below for a short summary. As usual, lemme know if something is incorrect.\n\n"
+        + f"See you next time!\nMichel\n\n\nSummary ({stats.hand_count} hands played with {stats.family_pot_count} family pots)\n\n(name : buyins / chip count)\n"
+    )
+    for current_name, (f_count_buyin, f_count_chip) in results.items():
+        # Update email_message and add player email to list of recipients
+        if f_count_buyin != 0:
+            email_message = (
+                email_message
+                + f"{current_name} :   {f_count_buyin}   /   {f_count_chip}\n"
+            )
+            current_email = str(
+                t_email_list[t_email_list.index([f"{current_name}"]) + 1]
+            )
+            email_recipients.append(
+                current_email.translate({ord(i): None for i in "[];'"})
+            )
+    return email_message, email_recipients
+
+
+def upload_session(
+    spreadsheet,
+    results,
+    date,
+    starti_players=5,
+    starti_graph1=63,
+    starti_graph2=81,
+):
+    """Function to save session to google spreadsheet, without asking anything. It can
+    be retried: a session sheet and overview columns already made for the date are
+    written again instead of added once more.
+
+    Parameters
+    ----------
+    spreadsheet : gspread.Spreadsheet
+        the google spreadsheet, see open_spreadsheet()
+    results : dict
+        buy-ins and chip count of each player, see collect_results()
+    date : str
+        date of poker night
+    starti_players : int, optional
+        starting index for the chip count list in overview, by default 5
+    starti_graph1 : int, optional
+        starting index for the chip count list of graph 1, by default 63
+    starti_graph2 : int, optional
+        starting index for the chip count list of graph 2, by default 81
+    """
+
+    # Create new session sheet
+    worksheets = spreadsheet.worksheets()
+    session_worksheet = next(
+        (worksheet for worksheet in worksheets if worksheet.title == date), None
+    )
+    if session_worksheet is None:
+        session_worksheet = worksheets[-1].duplicate(
+            len(worksheets), new_sheet_name=date
+        )
+
+    # Update overall sheet, all rows needed are read in one request
+    print("Updating spreadsheet ...\n")
+    current_worksheet = worksheets[0]
+    row_players, row_graph1, row_graph2 = [
+        (rows or [[]])[0]
+        for rows in current_worksheet.batch_get(
+            [f"{row}:{row}" for row in (starti_players, starti_graph1, starti_graph2)]
+        )
+    ]
+    # A column of an earlier attempt for this date is written again
+    col_players, col_graph1, col_graph2 = [
+        len(row) if row and row[-1] == date else len(row) + 1
+        for row in (row_players, row_graph1, row_graph2)
+    ]
+    old_date = row_players[col_players - 2]  # save old date for later
+
+    # Each of the three blocks gets a new column, written as one range each in one request
+    n_players = len(results)
+    col_session = column_to_a1(col_players)
+    column_players = [date] + [f"='{date}'!G{9+i}" for i in range(n_players)]
+    column_graph1 = [date] + [
+        f"=SUM($E${6+i}:{col_session}{6+i})" for i in range(n_players)
+    ]
+    column_graph2 = [date] + [
+        f"={col_session}{starti_players+1+i}" for i in range(n_players)
+    ]
+    current_worksheet.batch_update(
+        [
+            column_range(starti_players, col_players, column_players),
+            column_range(starti_graph1, col_graph1, column_graph1),
+            column_range(starti_graph2, col_graph2, column_graph2),
+        ],
+        value_input_option="USER_ENTERED",
+    )
+
+    # Continue in the new session sheet, its rows follow the names in column A
+    current_worksheet = session_worksheet
+    player_names = [
+        row[0] if row else "" for row in current_worksheet.get(f"A9:A{8+n_players}")
+    ]
+    player_names += [""] * (n_players - len(player_names))
+    session_cells = []
+    for i, current_name in enumerate(player_names):
+        f_count_buyin, f_count_chip = results.get(current_name, (0, 0))
+        # Update the worksheet (written at the end in one request)
+        session_cells += [
+            {
+                "range": f"F{9+i}",
+                "values": [["='" + f"{old_date}" + "'" + f"!H{9+i}"]],
+            },  # gspread has trouble interpreting ' in a full string hence the fragmentation
+            {"range": f"B{9+i}", "values": [[f_count_buyin]]},
+            {"range": f"D{9+i}", "values": [[f_count_chip]]},
+        ]
+    current_worksheet.batch_update(session_cells, value_input_option="USER_ENTERED")
+
+
+def save_session(
+    spreadsheet,
+    stats,
+    date,
+    name_index,
+    path_email,
+    starti_players=5,
+    starti_graph1=63,
+    starti_graph2=81,
+    ask=input,
+):
+    """Function to save session to google spreadsheet: asks for corrections, then
+    uploads and writes the overview email
+
+    Parameters
+    ----------
+    spreadsheet : gspread.Spreadsheet
+        the google spreadsheet, see open_spreadsheet()
+    stats : SessionStats
+        statistics of the parsed session, see session_stats.SessionStats
+    date : str
+        date of poker night
+    name_index : dict
+        dictionary containing player names and their PokerStars aliases
+    path_email : str
+        path to the csv file with the email address of each player
+    starti_players : int, optional
+        starting index for the chip count list in overview, by default 5
+    starti_graph1 : int, optional
+        starting index for the chip count list of graph 1, by default 63
+    starti_graph2 : int, optional
+        starting index for the chip count list of graph 2, by default 81
+    ask : function, optional
+        asks the user to confirm or correct the values found, by default input
+
+    Returns
+    -------
+    email_message : str
+        message to send via email
+    email_recipients : list of str
+        contains all the emails of players that participated
+    """
+
+    results = collect_results(stats, name_index, ask=ask)
+    upload_session(
+        spreadsheet, results, date, starti_players, starti_graph1, starti_graph2
+    )
+    return email_summary(stats, results, path_email)
@@ -0,0 +1,750 @@
+"""Reading and parsing of PokerStars hand history files (.txt)"""
+
+import mmap
+import os
+from array import array
+
+import numpy as np
+
+from hud import (
+    BET,
+    CALL,
+    CHECK,
+    FLOP,
+    FOLD,
+    POST_BIG_BLIND,
+    POST_BOTH_BLINDS,
+    POST_SMALL_BLIND,
+    PREFLOP,
+    RAISE,
+    RIVER,
+    TURN,
+    HudTracker,
+    new_counters,
+)
+from equity import AllinTracker
+from instrument import laps
+
+# Bump whenever the parser changes what it extracts, this invalidates cached sessions
+PARSER_VERSION = 5
+
+
+BOM = b"\xef\xbb\xbf"  # UTF-8 byte order mark at the start of the files
+
+# Line types yielded by tokenize()
+(
+    HAND,
+    SEAT,
+    ALLIN,
+    UNCALLED,
+    SHOWDOWN_WIN,
+    LOSS,
+    COLLECTED,
+    POT,
+    PREFLOP_FOLD,
+    BUTTON,
+    STREET,
+    ACTION,
+    HOLE_CARDS,
+    BOARD,
+) = range(14)
+
+_line_starts = {
+    "S": SEAT,
+    "P": HAND,
+    "\ufeff": HAND,  # first line of a file read without utf-8-sig
+    "T": POT,
+    "U": UNCALLED,
+    "*": STREET,
+    "D": HOLE_CARDS,
+    "B": BOARD,
+}
+# Without the actions only the lines of the seats, the hand header, the pot and
+# uncalled bets are needed
+_summary_line_starts = {"S": SEAT, "P": HAND, "\ufeff": HAND, "T": POT, "U": UNCALLED}
+_streets = {"HOLE": PREFLOP, "FLOP": FLOP, "TURN": TURN, "RIVE": RIVER}
+_actions = {"fold": FOLD, "chec": CHECK, "call": CALL, "bets": BET, "rais": RAISE}
+_blinds = {
+    "posts small blind": POST_SMALL_BLIND,
+    "posts big blind": POST_BIG_BLIND,
+    "posts small & big blind": POST_BOTH_BLINDS,
+}
+
+
+def tokenize(rawlines, actions=False):
+    """Classifies each line of a hand history once by its prefix or suffix and
+    extracts its fields. Lines the parser does not need (chat, the streets' cards)
+    are skipped after a dict lookup of their first character and a partition at
+    the last ": ", without being stripped or split. Without actions, the action
+    lines (most lines of a file) are skipped after a substring search for
+    "all-in".
+
+    Parameters
+    ----------
+    rawlines : iterable of str
+        Lines of the hand history file, with or without line endings
+    actions : bool, optional
+        Also yield ACTION, BUTTON, STREET, HOLE_CARDS and BOARD, by default False
+
+    Yields
+    ------
+    line_type : int
+        One of HAND, SEAT, ALLIN, UNCALLED, SHOWDOWN_WIN, LOSS, COLLECTED, POT,
+        PREFLOP_FOLD, BUTTON, STREET, ACTION, HOLE_CARDS, BOARD
+    fields : int, str or tuple
+        (PokerStars hand id, start time as "yyyy/mm/dd hh:mm:ss" ET) for HAND,
+        (seat number, name, chips) for SEAT, (pot size, rake) for
+        POT, (name, action, text) for ACTION (an action of hud and the text after
+        the name), the street (of hud) for STREET, (name, cards) for HOLE_CARDS
+        (dealt or shown), the cards for BOARD, the player name for ALLIN,
+        (name, amount) for UNCALLED, (seat number, amount won) for SHOWDOWN_WIN
+        and COLLECTED and the seat number for all other line types. An action
+        that puts the player all-in yields ACTION and then ALLIN.
+    """
+
+    line_starts = _line_starts if actions else _summary_line_starts
+    streets, action_types, blinds = _streets, _actions, _blinds
+    for line in rawlines:
+        # Cheap first guess from the first character, a player name can start the
+        # same way so the guess is confirmed before the line is split
+        line_type = line_starts.get(line[:1])
+        if line_type is None and not actions:
+            # An action, only an all-in is needed
+            if "all-in" not in line:
+                continue
+        # Seats at the start of a hand and the summary of each seat at its end, both
+        # "Seat <seat number>: <name> ..."
+        elif line_type == SEAT and line.startswith("Seat "):
+            colon = line.find(": ")
+            seat = line[5:colon]
+            if not seat.isdigit():
+                continue
+            line = line.rstrip()
+            if line.endswith(" in chips)"):
+                # "Seat <seat number>: <name> (<chips> in chips)"
+                paren = line.rindex(" (")
+                yield SEAT, (
+                    int(seat),
+                    line[colon + 2 : paren],
+                    int(line[paren + 2 : -10]),
+                )
+            # The summary only refers to the seat number, a name can contain anything
+            # but not the parentheses and brackets of these phrases
+            elif " and won (" in line:
+                won = line.rpartition(" and won (")[2]
+                yield SHOWDOWN_WIN, (int(seat), int(won[: won.find(")")]))
+            elif " and lost with " in line or " mucked [" in line:
+                yield LOSS, int(seat)
+            elif " collected (" in line:
+                won = line.rpartition(" collected (")[2]
+                yield COLLECTED, (int(seat), int(won[: won.find(")")]))
+            elif " folded before Flop" in line:
+                yield PREFLOP_FOLD, int(seat)
+            continue
+        elif line_type == HAND and line.rstrip().endswith(" ET"):
+            # "PokerStars Home Game Hand #<hand id>: ... - <yyyy/mm/dd hh:mm:ss> ET"
+            line = line.rstrip()
+            hand_id = line[line.find("#") + 1 : line.find(":")]
+            yield HAND, (
+                int(hand_id) if hand_id.isdigit() else 0,
+                line.rpartition(" - ")[2][:-3],
+            )
+            continue
+        elif line_type == POT and line.startswith("Total pot "):
+            words = line.split()
+            yield POT, (float(words[2]), float(words[-1]))
+            continue
+        elif line_type == UNCALLED and line.startswith("Uncalled bet"):
+            # "Uncalled bet (<amount>) returned to <name>"
+            words = line.split(None, 5)
+            yield UNCALLED, (words[5].rstrip(), int(words[2][1:-1]))
+            continue
+        elif not actions:
+            # A line of a player whose name starts like one of the lines above
+            if "all-in" not in line:
+                continue
+        elif line_type == POT and line.startswith("Table '"):
+            # "Table '<name>' 9-max (Play Money) Seat #<seat number> is the button"
+            button = line.rpartition(" Seat #")[2].partition(" ")[0]
+            if button.isdigit():
+                yield BUTTON, int(button)
+            continue
+        elif line_type == STREET and line.startswith("*** "):
+            street = streets.get(line[4:8])
+            if street is not None:
+                yield STREET, street
+            continue
+        elif line_type == HOLE_CARDS and line.startswith("Dealt to "):
+            # "Dealt to <name> [<cards>]"
+            bracket = line.rindex(" [")
+            yield HOLE_CARDS, (line[9:bracket], line[bracket + 2 : line.rindex("]")])
+            continue
+        elif line_type == BOARD and line.startswith("Board ["):
+            yield BOARD, line[7 : line.rindex("]")]
+            continue
+        # "<name>: <action> ...", the name ends at the last ": "
+        name, colon, action = line.rpartition(": ")
+        if not colon:
+            continue
+        if actions:
+            action_type = action_types.get(action[:4])
+            if action_type is None and action.startswith("posts "):
+                action_type = blinds.get(action[: action.find(" blind") + 6])
+            if action_type is not None:
+                yield ACTION, (name, action_type, action)
+            elif action.startswith("shows ["):
+                # "<name>: shows [<cards>] (<hand>)"
+                yield HOLE_CARDS, (name, action[7 : action.find("]")])
+        if "all-in" in action and action.rstrip().endswith(" all-in"):
+            yield ALLIN, name
+
+
+def data_extract(rawlines, chip_count_start=10000, skip=None, actions=False):
+    """Extracts relevant data from hand history file (.txt)
+
+    Parameters
+    ----------
+    rawlines : list of str
+        Contains the content of hand history file as a list of lines
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        PokerStars hand ids of hands to leave out, see SessionParser
+    actions : bool, optional
+        Also follow the actions for the HUD counters and the all-ins, see
+        SessionParser, by default False
+
+    Returns
+    -------
+    Session
+        Per-hand session columns and a PlayerStats record for each player
+    """
+
+    parser = SessionParser(
+        chip_count_start=chip_count_start, skip=skip, actions=actions
+    )
+    parser.feed(rawlines)
+    return parser.session
+
+
+def parse_file(filename, chip_count_start=10000, skip=None, actions=False):
+    """Parses a complete hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        PokerStars hand ids of hands to leave out, see SessionParser
+    actions : bool, optional
+        see data_extract()
+
+    Returns
+    -------
+    Session
+        see data_extract()
+    """
+
+    # Files start with a UTF-8 BOM which must not end up in the first line
+    with open(filename, encoding="utf-8-sig", errors="replace") as raw_file:
+        return data_extract(
+            raw_file, chip_count_start=chip_count_start, skip=skip, actions=actions
+        )
+
+
+class PlayerStats:
+    """Columns for one player with one entry for each hand the player was seated at,
+    plus a leading entry for the start of the session. The columns are compact
+    arrays, flags are 0/1.
+
+    Attributes
+    ----------
+    name : str
+        PokerStars alias of the player
+    chips : array of ints
+        Chip count at the start of each hand
+    hands : array of ints
+        Corresponding hand number
+    showdown_wins, losses, wins_no_showdown, preflop_folds : array of 0/1
+        Won w/ showdown, lost w/ or w/o showdown, won w/o showdown, preflop fold
+    allins, allins_won, busts, rebuys : array of 0/1
+        All-in, all-in won, bust, rebuy
+    hud : list of arrays of ints
+        Running HUD counters of the session, one array of hud.counter_columns for
+        each of hud.positions, see hud.HudTracker. All 0 unless the actions were
+        parsed.
+    """
+
+    __slots__ = (
+        "name",
+        "chips",
+        "hands",
+        "showdown_wins",
+        "losses",
+        "wins_no_showdown",
+        "preflop_folds",
+        "allins",
+        "allins_won",
+        "busts",
+        "rebuys",
+        "flags",
+        "hud",
+    )
+    flag_columns = __slots__[3:-2]
+
+    def __init__(self, name, chips, hand, chip_count_start=10000):
+        self.name = name
+        self.chips = array("i", [chip_count_start, chips])
+        self.hands = array("i", [0, hand])
+        for column in self.flag_columns:
+            setattr(self, column, array("b", [0, 0]))
+        self.flags = tuple(getattr(self, column) for column in self.flag_columns)
+        self.hud = new_counters()
+
+    def seat(self, chips, hand):
+        """Adds a new hand the player is seated at
+
+        Parameters
+        ----------
+        chips : int
+            Chip count at the start of the hand
+        hand : int
+            Hand number
+        """
+
+        self.chips.append(chips)
+        self.hands.append(hand)
+        for column in self.flags:
+            column.append(0)
+        # Check if player went bust and rebought
+        if self.busts[-2]:
+            self.rebuys[-1] = 1
+
+    def column(self, column):
+        """Returns a copy of a column as NumPy array. It is a copy so the parser can
+        keep appending to the column while the caller holds on to the result.
+
+        Parameters
+        ----------
+        column : str
+            Name of the column, e.g. "chips"
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+
+        return np.array(getattr(self, column))
+
+    def total(self, column):
+        """Returns the sum of a column
+
+        Parameters
+        ----------
+        column : str
+            Name of the column, e.g. "busts"
+
+        Returns
+        -------
+        int
+        """
+
+        values = getattr(self, column)
+        return int(np.frombuffer(values, dtype=values.typecode).sum())
+
+
+class Session:
+    """Everything parsed from a hand history file
+
+    Attributes
+    ----------
+    players : dict
+        PlayerStats for each player name (dict key), in order of appearance
+    ids : dict
+        Integer id (dict value) for each player name (dict key), the index in roster
+    roster : list of PlayerStats
+        The players in order of appearance, indexed by their id
+    hand_count : int
+        Number of hands played
+    hand_ids : array of ints
+        PokerStars hand id of each hand, 0 for the start of the session
+    rake : array of floats
+        Rake per hand
+    potsize : array of floats
+        Pot size per hand
+    family_pots : array of 0/1
+        Presence/absence of a family pot per hand
+    allin_hands : list of AllinHand
+        Hands with an all-in before the board was complete that went to showdown,
+        see equity.AllinHand. Empty unless the actions were parsed.
+    """
+
+    __slots__ = (
+        "chip_count_start",
+        "players",
+        "ids",
+        "roster",
+        "hand_count",
+        "hand_ids",
+        "rake",
+        "potsize",
+        "family_pots",
+        "allin_hands",
+    )
+
+    def __init__(self, chip_count_start=10000):
+        self.chip_count_start = chip_count_start
+        self.players = {}
+        self.ids = {}
+        self.roster = []
+        self.hand_count = 0
+        self.hand_ids = array("q", [0])
+        self.rake = array("d", [0.01e-20])
+        self.potsize = array("d", [0.01e-20])
+        self.family_pots = array("b", [0])
+        self.allin_hands = []
+
+    @property
+    def names(self):
+        """list of str : player names in order of appearance"""
+
+        return list(self.players)
+
+    def hand_numbers(self):
+        """Returns the hand numbers matching the entries of rake and potsize
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+
+        return np.arange(len(self.potsize))
+
+    def totals(self, column):
+        """Returns the sum of a player column for each player
+
+        Parameters
+        ----------
+        column : str
+            Name of the PlayerStats column, e.g. "showdown_wins"
+
+        Returns
+        -------
+        numpy.ndarray
+            One sum for each player, in order of self.players
+        """
+
+        return np.array(
+            [player.total(column) for player in self.players.values()], dtype=int
+        )
+
+    def seated(self):
+        """Returns for each player the number of hands the player was seated at
+
+        Returns
+        -------
+        numpy.ndarray
+            One count for each player, in order of self.players
+        """
+
+        return np.array([len(player.hands) for player in self.players.values()])
+
+    def max_chips(self):
+        """Returns the highest chip count any player had during the session
+
+        Returns
+        -------
+        int
+        """
+
+        return max(
+            [max(player.chips) for player in self.players.values()],
+            default=self.chip_count_start,
+        )
+
+    def family_pot_count(self):
+        """Returns the number of family pots
+
+        Returns
+        -------
+        int
+        """
+
+        return int(np.frombuffer(self.family_pots, dtype="b").sum())
+
+
+class SessionParser:
+    """Line parser that keeps its state between calls, so a hand history can be
+    fed in pieces and the result is the same as parsing it in one go.
+
+    Names are only read from the seat lines at the start of a hand (and from the
+    all-in and uncalled bet lines) and interned into the id table of the session.
+    The summary lines at the end of a hand are resolved through the seat number.
+    With actions, the actions, streets and showdowns also go to a hud.HudTracker,
+    which keeps the HUD counters of the players up to date, and with the cards and
+    the pot to an equity.AllinTracker, which records the all-ins that went to
+    showdown. The actions are most lines of a file, so this is left to the callers
+    that show the HUD or the expected winnings.
+
+    Hands whose PokerStars hand id is in skip are left out as if they were not in
+    the file, e.g. hands another account already recorded (see dedup.py).
+
+    Parameters
+    ----------
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        PokerStars hand ids of hands to leave out, by default none
+    actions : bool, optional
+        Follow the actions for the HUD counters and the all-ins, by default False
+    """
+
+    def __init__(self, chip_count_start=10000, skip=None, actions=False):
+        self.session = Session(chip_count_start=chip_count_start)
+        self.skip = skip
+        self.actions = actions
+        self.skipping = False  # whether the current hand is left out
+        self.seats = {}  # player id for each seat number of the current hand
+        self.hud = HudTracker(self.session.roster, self.seats)
+        self.allin = AllinTracker(self.session.allin_hands)
+
+    def feed(self, rawlines):
+        """Parses the given lines and adds them to the session
+
+        Parameters
+        ----------
+        rawlines : iterable of str
+            Complete lines of the hand history file
+        """
+
+        self.feed_tokens(tokenize(rawlines, actions=self.actions))
+
+    def feed_tokens(self, tokens):
+        """Adds lines tokenized by someone else to the session, e.g. by a reader that
+        needs the same lines, so the file is only tokenized once
+
+        Parameters
+        ----------
+        tokens : iterable of tuple
+            line_type and fields of complete lines, see tokenize(). With actions
+            they have to be tokenized with actions too.
+        """
+
+        session = self.session
+        players, ids, roster = session.players, session.ids, session.roster
+        seats, hud, allin, actions = self.seats, self.hud, self.allin, self.actions
+        hud_action, allin_action = hud.action, allin.actions.append
+        if self.skip:
+            tokens = self._skip_hands(tokens)
+        for line_type, fields in tokens:
+            # Actions only count towards the HUD and the all-ins, they are the most
+            # frequent lines
+            if line_type == ACTION:
+                player_id = ids.get(fields[0])
+                if player_id is None:
+                    continue  # a player without a seat line, e.g. in a cut-off hand
+                hud_action(player_id, fields[1])
+                allin_action(fields)
+            # Chip count
+            elif line_type == SEAT:
+                seat, name, chips = fields
+                player_id = ids.get(name)
+                if player_id is None:
+                    player_id = ids[name] = len(roster)
+                    player = PlayerStats(
+                        name,
+                        chips,
+                        session.hand_count,
+                        chip_count_start=session.chip_count_start,
+                    )
+                    roster.append(player)
+                    players[name] = player
+                else:
+                    roster[player_id].seat(chips, session.hand_count)
+                seats[seat] = player_id
+            # Preflop fold
+            elif line_type == PREFLOP_FOLD:
+                session.family_pots[-1] = 0
+                player_id = seats.get(fields)
+                if player_id is not None:
+                    roster[player_id].preflop_folds[-1] = 1
+            # Hand count
+            elif line_type == HAND:
+                session.hand_count += 1
+                session.hand_ids.append(fields[0])
+                session.family_pots.append(1)
+                seats.clear()
+                if actions:
+                    hud.new_hand()
+                    allin.new_hand()
+            elif line_type == STREET:
+                hud.new_street(fields)
+                allin_action(fields)
+            elif line_type == BUTTON:
+                hud.button(fields)
+            # All-In
+            elif line_type == ALLIN:
+                player_id = ids.get(fields)
+                if player_id is None:
+                    continue
+                roster[player_id].allins[-1] = 1
+            # Uncalled bet returns
+            elif line_type == UNCALLED:
+                # If all-in bet is uncalled and remainder returned, status all-in has to be reset to 0
+                player_id = ids.get(fields[0])
+                if player_id is None:
+                    continue
+                roster[player_id].allins[-1] = 0
+                if actions:
+                    allin.uncalled(*fields)
+            # Win w/ showdown count
+            elif line_type == SHOWDOWN_WIN:
+                player_id = seats.get(fields[0])
+                if player_id is None:
+                    continue
+                player = roster[player_id]
+                player.showdown_wins[-1] = 1
+                if actions:
+                    allin.won(player.name, fields[1])
+                    hud.showdown(player_id, True)
+                # if all-in and won
+                if player.allins[-1]:
+                    player.allins_won[-1] = 1
+            # Lost count
+            elif line_type == LOSS:
+                player_id = seats.get(fields)
+                if player_id is None:
+                    continue
+                player = roster[player_id]
+                player.losses[-1] = 1
+                if actions:
+                    hud.showdown(player_id, False)
+                # if all-in and lost/mucked, player went bust
+                if player.allins[-1]:
+                    player.busts[-1] = 1
+            # Won w/o showdown count
+            elif line_type == COLLECTED:
+                player_id = seats.get(fields[0])
+                if player_id is None:
+                    continue
+                player = roster[player_id]
+                player.wins_no_showdown[-1] = 1
+                if actions:
+                    allin.won(player.name, fields[1])
+                # if all-in and won
+                if player.allins[-1]:
+                    player.allins_won[-1] = 1
+            # Rake and pot size
+            elif line_type == POT:
+                potsize, rake = fields
+                session.rake.append(rake if rake else 0.01e-20)
+                session.potsize.append(potsize)
+                if actions:
+                    allin.total_pot(potsize, rake)
+            # Cards dealt to the hero or shown
+            elif line_type == HOLE_CARDS:
+                allin.hole_cards(*fields)
+            # The all-in is recorded once the whole board is known
+            elif line_type == BOARD:
+                allin.board(
+                    fields,
+                    session.hand_count,
+                    lambda name: name in ids and roster[ids[name]].allins[-1],
+                )
+
+    def _skip_hands(self, tokens):
+        """Leaves out the lines of the hands in skip"""
+
+        skip = self.skip
+        for line_type, fields in tokens:
+            if line_type == HAND:
+                self.skipping = fields[0] in skip
+            if not self.skipping:
+                yield line_type, fields
+
+
+def mapped_lines(mapped, start, end):
+    """Yields the lines of mapped[start:end] decoded one at a time, so only one line
+    exists as str at any time however many lines there are
+
+    Parameters
+    ----------
+    mapped : mmap.mmap
+        The mapped hand history file
+    start, end : int
+        Offsets of the first byte and after the last newline. Files start with a
+        UTF-8 BOM which is skipped at offset 0.
+    """
+
+    if start == 0 and mapped[:3] == BOM:
+        start = 3
+    mapped.seek(start)
+    readline, tell = mapped.readline, mapped.tell
+    while tell() < end:
+        yield readline().decode("utf-8", errors="replace")
+
+
+class HandHistoryFollower:
+    """Follows a hand history file that PokerStars is still writing to. Every poll
+    only reads and parses the bytes appended since the last poll, so the cost of a
+    poll does not grow with the length of the session.
+
+    Only complete lines are parsed: a line PokerStars is still in the middle of
+    writing stays in the file until the next poll picks it up in full. If the file
+    shrinks (e.g. it was replaced) the follower starts over from the beginning.
+
+    The file is memory-mapped and decoded line by line, so catching up on a long
+    session at the first poll needs no more memory than a poll of a single hand.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    actions : bool, optional
+        Follow the actions for the HUD counters and the all-ins, see SessionParser,
+        by default False
+    """
+
+    def __init__(self, filename, chip_count_start=10000, actions=False):
+        self.filename = filename
+        self.chip_count_start = chip_count_start
+        self.actions = actions
+        self.reset()
+
+    def reset(self):
+        """Forgets everything read so far"""
+
+        self.offset = 0
+        self.parser = SessionParser(
+            chip_count_start=self.chip_count_start, actions=self.actions
+        )
+
+    def poll(self):
+        """Parses whatever was appended to the file since the last poll
+
+        Returns
+        -------
+        Session
+            the session parsed so far, see data_extract()
+        """
+
+        lap = laps("poll")
+        size = os.path.getsize(self.filename)
+        if size < self.offset:
+            self.reset()
+        if size > self.offset:
+            with open(self.filename, "rb") as raw_file, mmap.mmap(
+                raw_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                # Keep a half-written last line for later
+                end = mapped.rfind(b"\n", self.offset, size) + 1
+                lap("read")
+                if end:
+                    self.parser.feed(mapped_lines(mapped, self.offset, end))
+                    self.offset = end
+                    lap("parse")
+        return self.parser.session
@@ -0,0 +1,300 @@
+"""HUD metrics of every player, kept up to date action by action
+
+The parser hands every action, street and showdown of a hand to a HudTracker,
+which adds them to running counters of the player (PlayerStats.hud), one row of
+counters per position. The cost of a hand does not depend on how many hands were
+played before, so the metrics stay current in a live session of any length.
+
+Metrics are ratios of two counters:
+
+    vpip        voluntarily put chips in preflop (calls, bets, raises) / hands
+    pfr         raised preflop / hands
+    three_bet   re-raised an open raise preflop / faced an open raise preflop
+    af          postflop bets and raises / postflop calls (aggression factor)
+    wtsd        went to showdown / saw the flop
+    wsd         won at showdown / went to showdown (W$SD)
+
+Run as a script to print the metrics of every player of a hand history:
+
+    python hud.py path [--by-position]
+"""
+
+import argparse
+from array import array
+
+import numpy as np
+
+# Positions, the rows of the counters. Heads-up the button posts the small blind
+# and counts as small blind, a player posting both blinds at once counts as other.
+BUTTON, SMALL_BLIND, BIG_BLIND, OTHER = range(4)
+positions = ("button", "small blind", "big blind", "other")
+
+# Counters, the columns
+(
+    HANDS,
+    VPIP,
+    PFR,
+    THREE_BET_CHANCES,
+    THREE_BETS,
+    POSTFLOP_AGGRESSIVE,
+    POSTFLOP_CALLS,
+    SAW_FLOP,
+    SHOWDOWNS,
+    SHOWDOWN_WINS,
+) = range(10)
+counter_columns = (
+    "hands",
+    "vpip",
+    "pfr",
+    "three_bet_chances",
+    "three_bets",
+    "postflop_aggressive",
+    "postflop_calls",
+    "saw_flop",
+    "showdowns",
+    "showdown_wins",
+)
+
+# Actions yielded by hand_history.tokenize(), posting both blinds at once (on
+# joining a table) is not a position and does not count towards any counter
+(
+    FOLD,
+    CHECK,
+    CALL,
+    BET,
+    RAISE,
+    POST_SMALL_BLIND,
+    POST_BIG_BLIND,
+    POST_BOTH_BLINDS,
+) = range(8)
+
+# Streets yielded by hand_history.tokenize(), from the "*** <street> ***" lines
+PREFLOP, FLOP, TURN, RIVER = range(4)
+
+# Numerator and denominator counter of each metric
+metrics = {
+    "vpip": ("vpip", "hands"),
+    "pfr": ("pfr", "hands"),
+    "three_bet": ("three_bets", "three_bet_chances"),
+    "af": ("postflop_aggressive", "postflop_calls"),
+    "wtsd": ("showdowns", "saw_flop"),
+    "wsd": ("showdown_wins", "showdowns"),
+}
+
+
+def new_counters():
+    """Returns zeroed counters: one array of counter_columns for each position"""
+
+    return [array("q", bytes(8 * len(counter_columns))) for _ in positions]
+
+
+class HudTracker:
+    """Adds the events of the hand being parsed to the counters of the players
+
+    Parameters
+    ----------
+    roster : list of PlayerStats
+        The players of the session indexed by their id, see Session.roster
+    seats : dict
+        Player id (dict value) for each seat number (dict key) of the current hand,
+        kept up to date by the parser
+    """
+
+    def __init__(self, roster, seats):
+        self.roster = roster
+        self.seats = seats
+        self.new_hand()
+
+    def new_hand(self):
+        """Forgets the state of the previous hand"""
+
+        self.button_seat = None
+        self.street = None
+        self.blinds = {}  # position of each player id that posted a blind
+        self.position = {}  # position of each player id dealt in
+        self.folded = set()
+        self.vpip = set()
+        self.pfr = set()
+        self.three_bet_chances = set()
+        self.saw_flop = set()
+        self.preflop_raises = 0
+
+    def button(self, seat):
+        """The seat number of the button"""
+
+        self.button_seat = seat
+
+    def new_street(self, street):
+        """The cards of a street were dealt
+
+        Parameters
+        ----------
+        street : int
+            PREFLOP, FLOP, TURN or RIVER
+        """
+
+        self.street = street
+        roster = self.roster
+        if street == PREFLOP:
+            for seat, player_id in self.seats.items():
+                position = self.blinds.get(player_id)
+                if position is None:
+                    position = BUTTON if seat == self.button_seat else OTHER
+                self.position[player_id] = position
+                roster[player_id].hud[position][HANDS] += 1
+        elif street == FLOP:
+            for player_id, position in self.position.items():
+                if player_id not in self.folded:
+                    self.saw_flop.add(player_id)
+                    roster[player_id].hud[position][SAW_FLOP] += 1
+
+    def action(self, player_id, action):
+        """A player acted
+
+        Parameters
+        ----------
+        player_id : int
+            Id of the player, see Session.ids
+        action : int
+            FOLD, CHECK, CALL, BET, RAISE, POST_SMALL_BLIND, POST_BIG_BLIND or
+            POST_BOTH_BLINDS
+        """
+
+        if action == POST_SMALL_BLIND:
+            self.blinds[player_id] = SMALL_BLIND
+            return
+        if action == POST_BIG_BLIND:
+            self.blinds[player_id] = BIG_BLIND
+            return
+        if action == POST_BOTH_BLINDS:
+            return
+        position = self.position.get(player_id)
+        if position is None:
+            return  # acted without being dealt in
+        counters = self.roster[player_id].hud[position]
+        if self.street == PREFLOP:
+            # Facing an open raise is a chance to 3-bet, whatever the player does
+            if self.preflop_raises == 1 and player_id not in self.three_bet_chances:
+                self.three_bet_chances.add(player_id)
+                counters[THREE_BET_CHANCES] += 1
+            if action == FOLD:
+                self.folded.add(player_id)
+            elif action != CHECK and player_id not in self.vpip:
+                self.vpip.add(player_id)
+                counters[VPIP] += 1
+            if action == BET or action == RAISE:
+                self.preflop_raises += 1
+                if player_id not in self.pfr:
+                    self.pfr.add(player_id)
+                    counters[PFR] += 1
+                if self.preflop_raises == 2:
+                    counters[THREE_BETS] += 1
+        elif action == BET or action == RAISE:
+            counters[POSTFLOP_AGGRESSIVE] += 1
+        elif action == CALL:
+            counters[POSTFLOP_CALLS] += 1
+
+    def showdown(self, player_id, won):
+        """A player showed down (the summary line of the seat)
+
+        Parameters
+        ----------
+        player_id : int
+            Id of the player, see Session.ids
+        won : bool
+            Whether the player won (a share of) the pot
+        """
+
+        if player_id not in self.saw_flop:
+            return
+        counters = self.roster[player_id].hud[self.position[player_id]]
+        counters[SHOWDOWNS] += 1
+        if won:
+            counters[SHOWDOWN_WINS] += 1
+
+
+def rates(counters):
+    """Returns the metrics of counters
+
+    Parameters
+    ----------
+    counters : array-like
+        Counters in the order of counter_columns, the last axis if there are more,
+        e.g. players x positions x counters
+
+    Returns
+    -------
+    dict
+        Metric (dict value, NaN where the denominator is 0) for each metric name
+        (dict key), plus the number of hands
+    """
+
+    counters = np.asarray(counters, dtype=float)
+    result = {"hands": counters[..., HANDS]}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name, (numerator, denominator) in metrics.items():
+            denominators = counters[..., counter_columns.index(denominator)]
+            result[name] = np.where(
+                denominators > 0,
+                counters[..., counter_columns.index(numerator)] / denominators,
+                np.nan,
+            )
+    return result
+
+
+def player_hud(player, position=None):
+    """Returns the metrics of a player
+
+    Parameters
+    ----------
+    player : PlayerStats
+        The player
+    position : str, optional
+        One of positions to only count hands from that position, by default all
+
+    Returns
+    -------
+    dict
+        see rates()
+    """
+
+    counters = np.array(player.hud)
+    if position is None:
+        counters = counters.sum(axis=0)
+    else:
+        counters = counters[positions.index(position)]
+    return {name: value.item() for name, value in rates(counters).items()}
+
+
+def _format(hud):
+    return (
+        f"{int(hud['hands']):>6}  "
+        + "  ".join(
+            f"{hud[name]:>9.0%}" if hud[name] == hud[name] else f"{'-':>9}"
+            for name in ("vpip", "pfr", "three_bet", "wtsd", "wsd")
+        )
+        + f"  {hud['af']:>5.2f}"
+    )
+
+
+if __name__ == "__main__":
+    from hand_history import parse_file
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--by-position", action="store_true")
+    args = parser.parse_args()
+
+    session = parse_file(args.path, actions=True)
+    width = max([len(name) for name in session.players] + [len("player")])
+    print(
+        f"{'player':<{width}}  {'hands':>6}  {'VPIP':>9}  {'PFR':>9}  {'3-bet':>9}  "
+        + f"{'WTSD':>9}  {'W$SD':>9}  {'AF':>5}"
+    )
+    for name, player in session.players.items():
+        print(f"{name:<{width}}  {_format(player_hud(player))}")
+        if args.by_position:
+            for position in positions:
+                print(
+                    f"{'  ' + position:<{width}}  {_format(player_hud(player, position))}"
+                )
@@ -0,0 +1,200 @@
+"""Timing of the hot paths (polling, parsing, drawing) over a whole session
+
+Instrumentation is switched on with environment variables and costs next to
+nothing while it is off:
+
+    POKER_INSTRUMENT=1          time every stage and print a summary at exit
+    POKER_PROFILE=stages.prof   also run cProfile while a timed function runs and
+                                write its stats to the given file at exit
+
+Stages are timed either as a span around a block (span()), as laps of a
+function split into consecutive stages (laps()) or as a whole function (timed()).
+Each stage keeps the durations of all its runs, summary() turns them into
+count, total, p50, p95 and max.
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import os
+from array import array
+from time import perf_counter
+
+profile_path = os.environ.get("POKER_PROFILE") or None
+enabled = os.environ.get("POKER_INSTRUMENT", "") not in ("", "0") or bool(profile_path)
+
+durations = {}  # array of durations in seconds (dict value) for each stage (dict key)
+_off = contextlib.nullcontext()
+_profiler = cProfile.Profile() if profile_path else None
+_profile_depth = 0
+
+
+def record(name, seconds):
+    """Adds the duration of one run of a stage
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, e.g. "poll.parse"
+    seconds : float
+        Duration of the run
+    """
+
+    values = durations.get(name)
+    if values is None:
+        values = durations[name] = array("d")
+    values.append(seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, perf_counter() - self.start)
+
+
+def span(name):
+    """Times the block of a with statement as one run of a stage
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+
+    Returns
+    -------
+    context manager
+    """
+
+    return _Span(name) if enabled else _off
+
+
+def _no_lap(name):
+    pass
+
+
+def laps(prefix):
+    """Times consecutive stages of a function without indenting them: every call
+    of the returned function ends a stage that started at the previous call (or
+    when laps() was called)
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix of the stage names, e.g. "update" for "update.clear"
+
+    Returns
+    -------
+    function
+        Takes the name of the stage that just ended
+    """
+
+    if not enabled:
+        return _no_lap
+    last = perf_counter()
+
+    def lap(name):
+        nonlocal last
+        now = perf_counter()
+        record(f"{prefix}.{name}", now - last)
+        last = now
+
+    return lap
+
+
+def timed(name):
+    """Decorator that times every call of a function as one run of a stage. With
+    instrumentation off the function is returned unchanged.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+    """
+
+    def decorate(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            global _profile_depth
+            if _profiler is not None:
+                if _profile_depth == 0:
+                    _profiler.enable()
+                _profile_depth += 1
+            try:
+                with _Span(name):
+                    return func(*args, **kwargs)
+            finally:
+                if _profiler is not None:
+                    _profile_depth -= 1
+                    if _profile_depth == 0:
+                        _profiler.disable()
+
+        return wrapper
+
+    return decorate
+
+
+def summary():
+    """Returns statistics of the durations of each stage
+
+    Returns
+    -------
+    dict
+        count, total, p50, p95 and max in seconds (dict value, a dict) for each
+        stage (dict key), in order of the first run
+    """
+
+    import numpy as np  # only needed for the summary, not for timing
+
+    stats = {}
+    for name, values in durations.items():
+        seconds = np.frombuffer(values, dtype="d")
+        p50, p95 = np.percentile(seconds, [50, 95])
+        stats[name] = {
+            "count": len(seconds),
+            "total": float(seconds.sum()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "max": float(seconds.max()),
+        }
+    return stats
+
+
+def report():
+    """Prints the statistics of all stages in ms"""
+
+    stats = summary()
+    if not stats:
+        return
+    width = max(len(name) for name in stats)
+    print(
+        f"\n{'stage':<{width}}  {'count':>6}  {'total':>9}  {'p50':>8}  {'p95':>8}  {'max':>8}"
+    )
+    for name, stage in stats.items():
+        print(
+            f"{name:<{width}}  {stage['count']:>6}  {stage['total'] * 1e3:>9.1f}  "
+            + f"{stage['p50'] * 1e3:>8.2f}  {stage['p95'] * 1e3:>8.2f}  "
+            + f"{stage['max'] * 1e3:>8.2f}"
+        )
+
+
+def _at_exit():
+    report()
+    if _profiler is not None:
+        _profiler.dump_stats(profile_path)
+        print(f"Profile written to {profile_path}")
+
+
+if enabled:
+    atexit.register(_at_exit)
@@ -0,0 +1,415 @@
+"""Live session plot that reuses its artists between updates
+
+Instead of clearing and rebuilding every axes on each tick, LivePlot creates the
+lines, bars and annotations once and afterwards only updates their data. Things
+that rarely change (axis limits, tick labels, bust markers) live in a cached
+background of the whole figure, everything else is blitted on top of it (see
+https://matplotlib.org/stable/tutorials/advanced/blitting.html). Axis limits grow
+in steps, so most ticks only blit and never redraw the whole figure.
+
+Players who were in an all-in get a second, dashed line in the colour of their
+chip count: the all-in EV chip count (see equity.py), what they would have had if
+every all-in had paid out its expected value instead of the actual result.
+
+Lines and the pot area are decimated to the width of the axes in pixels (see
+lod.py): a session of thousands of hands draws as many vertices as a short one,
+and peaks and busts stay visible. Growing or zooming the hand axis picks the
+cached decimation of the new zoom level.
+"""
+
+import math
+
+import numpy as np
+from matplotlib.lines import Line2D
+from matplotlib.ticker import MaxNLocator
+
+from equity import ev_chips
+from instrument import laps
+from lod import LodLine, LodSeries
+from session_stats import SessionStats
+
+
+def _round_up(value, step):
+    """Rounds value up to the next multiple of step (with at least one step)"""
+
+    return step * max(1, math.ceil(value / step))
+
+
+class LivePlot:
+    """Draws a session into the axes of the statistics figure
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure containing all axes
+    ax1, ax1sec : matplotlib.axes.Axes
+        Axes for the chip count and its twin for the pot size
+    ax2, ax2sec : matplotlib.axes.Axes
+        Axes for wins, losses and its twin for the preflop fold percentage
+    ax3 : matplotlib.axes.Axes
+        Axes for all-in wins, losses and rebuys
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    big_blind : int, optional
+        Size of the big blind, by default 100
+    hand_step : int, optional
+        The hand axis grows in steps of this many hands, by default 50
+    chip_step : int, optional
+        The chip count axis grows in steps of this many chips, by default 2500
+    """
+
+    def __init__(
+        self,
+        fig,
+        ax1,
+        ax1sec,
+        ax2,
+        ax2sec,
+        ax3,
+        chip_count_start=10000,
+        big_blind=100,
+        hand_step=50,
+        chip_step=2500,
+    ):
+        self.fig = fig
+        self.ax1, self.ax1sec = ax1, ax1sec
+        self.ax2, self.ax2sec = ax2, ax2sec
+        self.ax3 = ax3
+        self.chip_count_start = chip_count_start
+        self.big_blind = big_blind
+        self.hand_step = hand_step
+        self.chip_step = chip_step
+
+        self.lines = {}
+        self.ev_lines = {}  # all-in EV chip count of each player
+        self.lods = {}  # LodLine of each line and EV line
+        self.pot_series = LodSeries()
+        self.checked = {}  # number of hands searched for busts, for each player
+        self.busted = {}  # names of the players that went bust, for each hand
+        self.bust_annotations = {}
+        self.pot = None
+        self.bars2, self.bars2sec, self.bars3 = [], None, []
+        self.legends = []
+        self.background = None
+        self._style()
+        self.draw_id = fig.canvas.mpl_connect("draw_event", self._on_draw)
+        self.xlim_id = ax1.callbacks.connect("xlim_changed", self._on_xlim)
+
+    def _style(self):
+        """Sets everything that never changes during the session"""
+
+        ax1, ax1sec, ax2, ax2sec, ax3 = (
+            self.ax1,
+            self.ax1sec,
+            self.ax2,
+            self.ax2sec,
+            self.ax3,
+        )
+        ax1sec.axes.yaxis.set_ticklabels([])
+        ax1sec.grid(False)
+        ax1.yaxis.set_label_position("right")
+        ax1.yaxis.tick_right()
+        ax1.set_ylabel("Chip count", fontsize=17)
+        ax1.set_xlabel("Hand #", fontsize=17)
+        ax1.set_xlim(xmin=0, xmax=self.hand_step)
+        ax1.tick_params(axis="x", labelsize=15)
+        ax1.tick_params(axis="y", labelsize=15)
+        ax1.axhline(
+            self.chip_count_start,
+            color="black",
+            lw=1.5,
+            dashes=[6, 4],
+            dash_capstyle="round",
+        )
+        ax1.set_title("", fontsize=17, fontweight="bold")
+        ax1.title.set_animated(True)
+        ax1.grid(True, which="major")
+
+        ax2.yaxis.set_label_position("left")
+        ax2.yaxis.tick_left()
+        ax2.set_ylabel("Count", fontsize=15)
+        ax2.tick_params(axis="x", labelsize=14)
+        ax2.tick_params(axis="y", labelsize=12)
+        ax2.set_title("Wins, losses and preflop folds", fontsize=16, fontweight="bold")
+        ax2.yaxis.set_major_locator(MaxNLocator(8))
+        ax2sec.set_ylabel("Percentage", fontsize=15)
+        ax2sec.set_ylim(ymin=0, ymax=0.8)
+        ax2sec.tick_params(axis="y", labelsize=11)
+        ax2sec.yaxis.set_major_locator(MaxNLocator(8))
+        ax2.grid(True, which="major")
+
+        ax3.yaxis.set_label_position("right")
+        ax3.yaxis.tick_right()
+        ax3.set_ylabel("Count", fontsize=15)
+        ax3.tick_params(axis="x", labelsize=14)
+        ax3.tick_params(axis="y", labelsize=12)
+        ax3.set_title("All-in wins, losses and rebuys", fontsize=16, fontweight="bold")
+        ax3.grid(True, which="major")
+
+    def _make_bars(self, names):
+        """(Re)creates the bars and legends of the lower two axes for the given players"""
+
+        for artist in [*self.bars2, self.bars2sec, *self.bars3, *self.legends]:
+            if artist is not None:
+                artist.remove()
+
+        x = np.arange(len(names))
+        zeros = np.zeros(len(names))
+        width = 0.15
+        self.bars2 = [
+            self.ax2.bar(x - width - width / 2, zeros, width, color="g"),
+            self.ax2.bar(x - width / 2, zeros, width, color="yellowgreen"),
+            self.ax2.bar(x + width / 2, zeros, width, color="r"),
+        ]
+        self.bars2sec = self.ax2sec.bar(
+            x + width + width / 2, zeros, width, color="dimgray"
+        )
+        self.bars3 = [
+            self.ax3.bar(x - width, zeros, width, label="Re-buys", color="black"),
+            self.ax3.bar(x, zeros, width, label="All-ins won", color="g"),
+            self.ax3.bar(x + width, zeros, width, label="All-ins lost", color="r"),
+        ]
+        for ax in (self.ax2, self.ax3):
+            ax.set_xticks(x)
+            ax.set_xticklabels(names, rotation=40, fontsize=14)
+
+        handles, labels = self.ax1.get_legend_handles_labels()
+        handles.append(Line2D([], [], color="gray", lw=1.5, dashes=[2, 2]))
+        labels.append("All-in EV")
+        self.legends = [
+            self.ax1.legend(
+                handles, labels, loc="upper left", prop={"size": 14}, frameon=1
+            ),
+            self.ax2.legend(
+                [*self.bars2, self.bars2sec],
+                ["Wins w/ showdown", "Wins w/o showdown", "Losses", "Preflop fold %"],
+                loc="upper left",
+                prop={"size": 10},
+                frameon=True,
+            ),
+            self.ax3.legend(loc="upper right", prop={"size": 10}, frameon=True),
+        ]
+
+    def _add_busts(self, name, player):
+        """Adds a marker for each bust of the player not marked yet
+
+        Returns
+        -------
+        bool
+            Whether a marker was added or changed
+        """
+
+        # The last hand is searched again, it may have been half-written before
+        start = max(self.checked.get(name, 0) - 1, 0)
+        busts = player.busts[start:]
+        hands = player.hands[start:]
+        self.checked[name] = len(player.busts)
+        changed = False
+        for hand, bust in zip(hands, busts):
+            if not bust or name in self.busted.get(hand, []):
+                continue
+            self.busted.setdefault(hand, []).append(name)
+            text = "{0}\nwent bust !".format(", ".join(self.busted[hand]))
+            if hand in self.bust_annotations:
+                self.bust_annotations[hand].set_text(text)
+            else:
+                self.ax1.axvline(
+                    hand, color="black", lw=0.95, dashes=[6, 4], dash_capstyle="round"
+                )
+                # The height is relative to the axes, so growing the axis never moves it
+                self.bust_annotations[hand] = self.ax1.annotate(
+                    text,
+                    xy=(hand, 12 / 14),
+                    xycoords=("data", "axes fraction"),
+                    fontsize=10.5,
+                    fontstyle="normal",
+                    annotation_clip=False,
+                    rotation=33,
+                    ha="right",
+                    color="black",
+                )
+            changed = True
+        return changed
+
+    def _draw_pot(self):
+        """(Re)creates the pot size area, decimated for the current hand axis"""
+
+        animated = True
+        if self.pot is not None:
+            animated = self.pot.get_animated()
+            self.pot.remove()
+        xmin, xmax = self.ax1.get_xlim()
+        hands, potsize = self.pot_series.view(xmin, xmax, self.ax1.bbox.width)
+        self.pot = self.ax1sec.fill_between(
+            hands, 0, potsize, facecolor="black", alpha=0.15
+        )
+        self.pot.set_animated(animated)
+
+    def _on_xlim(self, ax):
+        # The lines decimate themselves, see LodLine
+        if self.pot is not None:
+            self._draw_pot()
+
+    def _grow(self, ax, xmax=None, ymax=None):
+        """Sets the upper axis limits if they differ from the current ones
+
+        Returns
+        -------
+        bool
+            Whether a limit changed
+        """
+
+        changed = False
+        if xmax is not None and ax.get_xlim()[1] != xmax:
+            ax.set_xlim(xmin=0, xmax=xmax)
+            changed = True
+        if ymax is not None and ax.get_ylim()[1] != ymax:
+            ax.set_ylim(ymin=0, ymax=ymax)
+            changed = True
+        return changed
+
+    def animated_artists(self):
+        """Returns everything that is drawn on top of the cached background, in drawing order
+
+        Returns
+        -------
+        list of matplotlib.artist.Artist
+        """
+
+        artists = list(self.lines.values()) + list(self.ev_lines.values())
+        if self.pot is not None:
+            artists.append(self.pot)
+        for container in [*self.bars2, self.bars2sec, *self.bars3]:
+            if container is not None:
+                artists.extend(container.patches)
+        artists.extend(self.legends)
+        artists.append(self.ax1.title)
+        return artists
+
+    def _draw_animated(self):
+        for artist in self.animated_artists():
+            self.fig.draw_artist(artist)
+
+    def _on_draw(self, event):
+        """Stores the background after every full draw and puts the data on top"""
+
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def update(self, session, stats=None):
+        """Shows the current state of the session
+
+        Parameters
+        ----------
+        session : Session
+            see hand_history.data_extract()
+        stats : SessionStats, optional
+            Statistics of session, computed here if not given
+
+        Returns
+        -------
+        list of matplotlib.artist.Artist
+            The artists drawn on top of the background
+        """
+
+        lap = laps("live_plot")
+        if stats is None:
+            stats = SessionStats(session)
+            lap("stats")
+        players = session.players
+        redraw = self.background is None
+        new_players = list(players) != list(self.lines)
+        if new_players:
+            for name in players:
+                if name not in self.lines:
+                    (self.lines[name],) = self.ax1.plot([], [], label=name, lw=2.5)
+                    (self.ev_lines[name],) = self.ax1.plot(
+                        [],
+                        [],
+                        color=self.lines[name].get_color(),
+                        lw=1.5,
+                        dashes=[2, 2],
+                    )
+                    for line in (self.lines[name], self.ev_lines[name]):
+                        self.lods[line] = LodLine(line)
+            self._make_bars(session.names)
+            redraw = True
+            lap("new_players")
+
+        # Chip count, all-in EV chip count and busts
+        ev, in_allin = ev_chips(session, stats)
+        for row, (name, player) in enumerate(players.items()):
+            hands, chips = stats.player_hands(name)
+            self.lods[self.lines[name]].set_data(hands, chips)
+            if in_allin[row]:
+                self.lods[self.ev_lines[name]].set_data(
+                    hands, ev[row, stats.seated[row]]
+                )
+            redraw |= self._add_busts(name, player)
+        self.pot_series.update(stats.pot_hands, stats.potsize)
+        self._draw_pot()
+        max_chips = max(stats.max_chips, ev[stats.seated].max(initial=0))
+        ymax = _round_up(max_chips + self.big_blind, self.chip_step)
+        redraw |= self._grow(
+            self.ax1,
+            xmax=_round_up(stats.hand_count + 1, self.hand_step),
+            ymax=ymax,
+        )
+        redraw |= self._grow(self.ax1sec, ymax=ymax)
+        self.ax1.title.set_text(
+            f"Chip count at hand # {stats.hand_count} ({int(self.big_blind/2)}/{self.big_blind} game) with {stats.family_pot_count} family pots"
+        )
+        lap("chips")
+
+        # Win, lose and preflop fold
+        totals = stats.totals
+        values2 = [
+            totals["showdown_wins"],
+            totals["wins_no_showdown"],
+            totals["losses"],
+        ]
+        for container, values in zip(self.bars2, values2):
+            for rect, value in zip(container.patches, values):
+                rect.set_height(value)
+        for rect, value in zip(self.bars2sec.patches, stats.preflop_fold_rate):
+            rect.set_height(value)
+        redraw |= self._grow(
+            self.ax2, ymax=_round_up(max(v.max(initial=0) for v in values2) + 1, 5)
+        )
+
+        # All-in win & loss, rebuys
+        values3 = [totals["rebuys"], totals["allins_won"], totals["busts"]]
+        for container, values in zip(self.bars3, values3):
+            for rect, value in zip(container.patches, values):
+                rect.set_height(value)
+        redraw |= self._grow(
+            self.ax3, ymax=_round_up(max(v.max(initial=0) for v in values3) + 1, 5)
+        )
+        lap("bars")
+
+        artists = self.animated_artists()
+        for artist in artists:
+            artist.set_animated(True)
+        canvas = self.fig.canvas
+        if redraw or not canvas.supports_blit:
+            if new_players:
+                self.fig.tight_layout()
+            canvas.draw()  # _on_draw stores the new background and draws the data
+            lap("redraw")
+        else:
+            canvas.restore_region(self.background)
+            self._draw_animated()
+            canvas.blit(self.fig.bbox)
+            lap("blit")
+        canvas.flush_events()
+        return artists
+
+    def freeze(self):
+        """Turns the blitted artists into regular ones, e.g. before saving the figure"""
+
+        self.fig.canvas.mpl_disconnect(self.draw_id)
+        self.ax1.callbacks.disconnect(self.xlim_id)
+        for lod in self.lods.values():
+            lod.line.axes.callbacks.disconnect(lod.cid)
+        for artist in self.animated_artists():
+            artist.set_animated(False)
@@ -0,0 +1,168 @@
+"""Level-of-detail decimation of long chip trajectories
+
+A line with more points than the axes has pixels draws many points on top of
+each other. minmax_indices() keeps, for every bucket of x values, only the first,
+the last, the lowest and the highest point (M4 decimation), so the drawn line
+looks the same at that resolution: peaks and busts stay visible and the number of
+vertices is at most four per bucket, whatever the length of the data.
+
+LodSeries picks the bucket width from the zoom: a power of two of x units per
+pixel (a zoom level). Buckets are aligned to multiples of their width, so the
+decimation of a level is the same for every view and is cached; a series that
+grows (a live session) only decimates its new points. LodLine keeps a
+matplotlib line decimated for the current view of its axes, zooming or panning
+picks the cached level of the new view.
+"""
+
+import math
+
+import numpy as np
+
+
+def minmax_indices(x, y, bucket_width):
+    """Returns the indices of the points a line keeps at a bucket width: the first,
+    last, lowest and highest point of each bucket
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x values in ascending order, e.g. hand numbers
+    y : numpy.ndarray
+        y values, e.g. chip counts
+    bucket_width : float
+        Width of a bucket in x units, buckets start at multiples of it
+
+    Returns
+    -------
+    numpy.ndarray of ints
+        Sorted indices into x and y
+    """
+
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.intp)
+    buckets = np.floor_divide(x, bucket_width)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(x)] - 1
+    # Sorted by bucket and within each bucket by y: the first of a bucket is its
+    # minimum, the last its maximum
+    order = np.lexsort((y, buckets))
+    return np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+
+
+class LodSeries:
+    """A series of points decimated for any zoom level, see minmax_indices()
+
+    Attributes
+    ----------
+    x, y : numpy.ndarray
+        All points
+    levels : dict
+        (indices of the points kept in the complete buckets, index of the first
+        point of the last bucket) (dict value) of each zoom level (dict key)
+    """
+
+    def __init__(self):
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.levels = {}
+
+    def update(self, x, y):
+        """Replaces the points. Points are assumed to be appended, the cached
+        levels are only dropped if the series got shorter.
+
+        Parameters
+        ----------
+        x, y : array-like
+            All points, x in ascending order
+        """
+
+        x, y = np.asarray(x), np.asarray(y)
+        if len(x) < len(self.x):
+            self.levels.clear()
+        self.x, self.y = x, y
+
+    def indices(self, level):
+        """Returns the indices of the points kept at a zoom level
+
+        Parameters
+        ----------
+        level : int
+            Buckets are 2 ** level x units wide
+
+        Returns
+        -------
+        numpy.ndarray of ints
+        """
+
+        width = 2**level
+        kept, done = self.levels.get(level, (np.zeros(0, dtype=np.intp), 0))
+        new = minmax_indices(self.x[done:], self.y[done:], width) + done
+        if len(new):
+            # The last bucket can still grow, everything before it is final
+            last_start = done + np.searchsorted(
+                np.floor_divide(self.x[done:], width),
+                np.floor_divide(self.x[-1], width),
+            )
+            kept = np.concatenate([kept, new[new < last_start]])
+            self.levels[level] = (kept, last_start)
+            new = new[new >= last_start]
+        return np.concatenate([kept, new])
+
+    def view(self, xmin, xmax, width_px):
+        """Returns the points to draw for a view
+
+        Parameters
+        ----------
+        xmin, xmax : float
+            x range of the view
+        width_px : float
+            Width of the view in pixels
+
+        Returns
+        -------
+        x, y : numpy.ndarray
+            At most about four points per pixel, plus the first point on either
+            side of the view so the line runs to its edges
+        """
+
+        per_pixel = (xmax - xmin) / max(width_px, 1)
+        if per_pixel <= 1 or len(self.x) <= 4 * width_px:
+            return self.x, self.y
+        indices = self.indices(math.ceil(math.log2(per_pixel)))
+        kept_x = self.x[indices]
+        start = max(np.searchsorted(kept_x, xmin) - 1, 0)
+        end = np.searchsorted(kept_x, xmax, side="right") + 1
+        indices = indices[start:end]
+        return self.x[indices], self.y[indices]
+
+
+class LodLine:
+    """A matplotlib line that only draws the points of its LodSeries that are
+    visible at the current zoom level of its axes
+
+    Parameters
+    ----------
+    line : matplotlib.lines.Line2D
+        The line, already added to its axes
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.series = LodSeries()
+        self.cid = line.axes.callbacks.connect("xlim_changed", self._on_xlim)
+
+    def set_data(self, x, y):
+        """Replaces the points of the line, see LodSeries.update()"""
+
+        self.series.update(x, y)
+        self.apply()
+
+    def apply(self):
+        """Decimates the line for the current view of its axes"""
+
+        axes = self.line.axes
+        xmin, xmax = axes.get_xlim()
+        self.line.set_data(*self.series.view(xmin, xmax, axes.bbox.width))
+
+    def _on_xlim(self, axes):
+        self.apply()
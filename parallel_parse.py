@@ -0,0 +1,245 @@
+"""Parallel parsing of a single large hand history file
+
+Every hand starts with its own header line and no parser state except the hand
+count, the players seen so far and a bust at the very end of a chunk carries over
+from one hand to the next. So a file can be split at hand headers into chunks
+that are parsed independently in worker processes, and the sessions of the
+chunks merged afterwards: hand numbers (also of the recorded all-ins) are shifted
+by the hands of the chunks before, player columns appended in order and a rebuy
+set on the first hand of a chunk after a bust on the last hand of the one before.
+
+Run as a script to parse a file and print how long it took:
+
+    python parallel_parse.py path [--workers N] [--check] [--actions]
+"""
+
+import argparse
+import mmap
+import os
+from array import array
+from time import perf_counter
+
+from hand_history import SessionParser, mapped_lines, parse_file
+
+min_chunk_bytes_default = 1 << 20
+
+
+def _is_hand_header(line):
+    """Same test as tokenize() does for HAND lines, on bytes"""
+
+    return line.startswith(b"PokerStars ") and line.rstrip().endswith(b" ET")
+
+
+def split_hands(filename, n_chunks, min_chunk_bytes=min_chunk_bytes_default):
+    """Splits a hand history file into byte ranges that each start at a hand header
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    n_chunks : int
+        Number of chunks to aim for, fewer if the file is small or has few hands
+    min_chunk_bytes : int, optional
+        Smallest chunk worth sending to a worker, by default 1 MiB
+
+    Returns
+    -------
+    list of tuple
+        (start, end) offsets of each chunk, together covering the whole file
+    """
+
+    size = os.path.getsize(filename)
+    n_chunks = max(1, min(n_chunks, size // max(1, min_chunk_bytes)))
+    if n_chunks == 1:
+        return [(0, size)]
+    bounds = [0]
+    with open(filename, "rb") as raw_file, mmap.mmap(
+        raw_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        for i in range(1, n_chunks):
+            # First hand header after the even split point
+            pos = mapped.find(b"\n", max(i * size // n_chunks, bounds[-1]) - 1) + 1
+            while 0 < pos < size:
+                line_end = mapped.find(b"\n", pos)
+                if line_end < 0:
+                    line_end = size
+                if _is_hand_header(mapped[pos:line_end]):
+                    break
+                pos = line_end + 1
+            else:
+                break  # the loop ran off the end: no hand starts after the split point
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_range(filename, start, end, chip_count_start=10000, actions=False):
+    """Parses the hands in a byte range of a hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    start, end : int
+        Byte range, see split_hands()
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    actions : bool, optional
+        see hand_history.SessionParser
+
+    Returns
+    -------
+    Session
+        The hands of the range as if they were the whole file
+    """
+
+    parser = SessionParser(chip_count_start=chip_count_start, actions=actions)
+    if end > start:
+        with open(filename, "rb") as raw_file, mmap.mmap(
+            raw_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            parser.feed(mapped_lines(mapped, start, end))
+    return parser.session
+
+
+def merge_sessions(sessions):
+    """Merges the sessions of consecutive chunks of a file into one, in place of the
+    first
+
+    Parameters
+    ----------
+    sessions : list of Session
+        Sessions of the chunks in file order, see parse_range()
+
+    Returns
+    -------
+    Session
+        The session of the whole file, as parse_file() returns it
+    """
+
+    merged = sessions[0]
+    for session in sessions[1:]:
+        offset = merged.hand_count
+        for name, player in session.players.items():
+            known = merged.players.get(name)
+            hands = array("i", (hand + offset for hand in player.hands[1:]))
+            if known is None:
+                # Not seated before this chunk, the entry for the start stays
+                player.hands = array("i", [0]) + hands
+                merged.ids[name] = len(merged.roster)
+                merged.roster.append(player)
+                merged.players[name] = player
+                continue
+            # A bust on the last hand of the previous chunk means a rebuy now
+            if known.busts[-1] and len(player.rebuys) > 1:
+                player.rebuys[1] = 1
+            # Without the entry for the start of the session
+            known.hands.extend(hands)
+            known.chips.extend(player.chips[1:])
+            for column, values in zip(known.flags, player.flags):
+                column.extend(values[1:])
+            for counters, chunk_counters in zip(known.hud, player.hud):
+                for i, count in enumerate(chunk_counters):
+                    counters[i] += count
+        for record in session.allin_hands:
+            record.hand += offset
+        merged.allin_hands.extend(session.allin_hands)
+        merged.hand_count += session.hand_count
+        merged.hand_ids.extend(session.hand_ids[1:])
+        merged.rake.extend(session.rake[1:])
+        merged.potsize.extend(session.potsize[1:])
+        merged.family_pots.extend(session.family_pots[1:])
+    return merged
+
+
+def parse_file_parallel(
+    filename,
+    workers=None,
+    chip_count_start=10000,
+    min_chunk_bytes=min_chunk_bytes_default,
+    actions=False,
+):
+    """Parses a hand history file in chunks in parallel worker processes
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    workers : int, optional
+        Number of worker processes, by default one per core. With 1 (or a file
+        smaller than two chunks) the file is parsed in this process
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    min_chunk_bytes : int, optional
+        see split_hands()
+    actions : bool, optional
+        see hand_history.SessionParser
+
+    Returns
+    -------
+    Session
+        see hand_history.data_extract()
+    """
+
+    workers = workers or os.cpu_count() or 1
+    ranges = split_hands(filename, workers, min_chunk_bytes) if workers > 1 else []
+    if len(ranges) < 2:
+        return parse_file(filename, chip_count_start=chip_count_start, actions=actions)
+
+    # Imported here as it is slow to import and only needed with several workers
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        sessions = list(
+            executor.map(
+                parse_range,
+                [filename] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
+                [chip_count_start] * len(ranges),
+                [actions] * len(ranges),
+            )
+        )
+    return merge_sessions(sessions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--check", action="store_true", help="compare with a sequential parse"
+    )
+    parser.add_argument(
+        "--actions", action="store_true", help="also parse the HUD and all-ins"
+    )
+    args = parser.parse_args()
+
+    before = perf_counter()
+    session = parse_file_parallel(args.path, workers=args.workers, actions=args.actions)
+    elapsed = perf_counter() - before
+    n_bytes = os.path.getsize(args.path)
+    print(
+        f"Parsed {session.hand_count} hands ({n_bytes / 1e6:.1f} MB) in {elapsed:.2f} s: "
+        + f"{session.hand_count / elapsed:.0f} hands/s, {n_bytes / 1e6 / elapsed:.1f} MB/s"
+    )
+    if args.check:
+        from session_stats import SessionStats
+
+        parallel, sequential = SessionStats(session), SessionStats(
+            parse_file(args.path, actions=args.actions)
+        )
+        same = (
+            parallel.names == sequential.names
+            and (parallel.chips == sequential.chips).all()
+            and (parallel.hud_counters == sequential.hud_counters).all()
+            and all(
+                (parallel.flags[column] == sequential.flags[column]).all()
+                for column in parallel.flags
+            )
+            and (parallel.potsize == sequential.potsize).all()
+        )
+        print(
+            "Same as a sequential parse" if same else "Differs from a sequential parse"
+        )
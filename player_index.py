@@ -0,0 +1,430 @@
+"""Index of every player over all sessions of the archive
+
+Aliases are resolved through aliases.name_index, so all accounts of a player end
+up in one record. For each player the index holds the summary of every session
+(merged over the aliases played that night), the sums of the flag columns per
+session as one matrix and the lifetime chip trajectory. Queries over any range of
+dates are sums over rows of that matrix and never touch a hand history.
+
+The index is stored in poker_session/cache and only rebuilt if a hand history,
+the parser or the aliases changed. Run as a script to print the lifetime totals
+of all players or of one player, or to plot their lifetime chip trajectories:
+
+    python player_index.py [player] [--year YEAR] [--rebuild] [--plot]
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from aliases import alias_lookup, name_index as name_index_default
+from archive import find_hand_histories, parse_archive, path_hand_default, session_date
+from hand_history import PlayerStats
+from session_cache import cache_key, path_cache_default
+
+# Bump whenever the index changes what it holds, this invalidates stored indexes
+INDEX_VERSION = 3
+
+summary_columns = ("hands", "chips", "buyins") + PlayerStats.flag_columns
+
+
+class PlayerRecord:
+    """Everything the index knows about one player
+
+    Attributes
+    ----------
+    name : str
+        Name of the player, a key of name_index or an alias not in name_index
+    aliases : list of str
+        The aliases the player played as
+    sessions : list of dict
+        Summary of each session (night) the player took part in, oldest first:
+        files, date, aliases and the summary_columns (hands seated, chips at the
+        end, buy-ins and the sums of the flag columns)
+    dates : numpy.ndarray of str
+        Date of each session as YYYY-MM-DD
+    counts : numpy.ndarray of ints
+        summary_columns (columns) of each session (rows)
+    chips : numpy.ndarray of ints
+        Lifetime chip trajectory: the chip count of every hand of every session,
+        oldest first
+    session_starts : numpy.ndarray of ints
+        Index in chips of the first hand of each session
+    """
+
+    __slots__ = (
+        "name",
+        "aliases",
+        "sessions",
+        "dates",
+        "counts",
+        "chips",
+        "session_starts",
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.aliases = []
+        self.sessions = []
+
+    def _freeze(self, chips):
+        """Turns the collected sessions into the arrays queries work on"""
+
+        self.dates = np.array(
+            [session["date"] for session in self.sessions], dtype="U10"
+        )
+        self.counts = np.array(
+            [
+                [session[column] for column in summary_columns]
+                for session in self.sessions
+            ],
+            dtype=np.int64,
+        ).reshape(len(self.sessions), len(summary_columns))
+        self.session_starts = np.cumsum([0] + [len(c) for c in chips[:-1]])
+        self.chips = np.concatenate(chips) if chips else np.zeros(0, dtype=int)
+
+    def _mask(self, start=None, end=None, year=None):
+        if year is not None:
+            start, end = f"{year}-01-01", f"{year + 1}-01-01"
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start is not None:
+            mask &= self.dates >= start
+        if end is not None:
+            mask &= self.dates < end
+        return mask
+
+    def totals(self, start=None, end=None, year=None):
+        """Returns the sum of each summary column over the sessions in a range of dates
+
+        Parameters
+        ----------
+        start : str, optional
+            First date (YYYY-MM-DD) to include, by default the first session
+        end : str, optional
+            First date (YYYY-MM-DD) to exclude, by default after the last session
+        year : int, optional
+            Only sessions of this year, instead of start and end
+
+        Returns
+        -------
+        dict
+            Sum (dict value) for each summary column (dict key), plus the number
+            of sessions
+        """
+
+        mask = self._mask(start, end, year)
+        sums = self.counts[mask].sum(axis=0)
+        totals = {"sessions": int(mask.sum())}
+        totals.update(zip(summary_columns, (int(value) for value in sums)))
+        return totals
+
+    def rate(self, numerator, denominator, start=None, end=None, year=None):
+        """Returns the ratio of two summary columns over a range of dates, e.g. the
+        all-in win rate as rate("allins_won", "allins")
+
+        Parameters
+        ----------
+        numerator, denominator : str
+            Names of summary columns
+        start, end, year : optional
+            see totals()
+
+        Returns
+        -------
+        float
+            NaN if the denominator is 0
+        """
+
+        totals = self.totals(start, end, year)
+        if not totals[denominator]:
+            return float("nan")
+        return totals[numerator] / totals[denominator]
+
+
+class PlayerIndex:
+    """Records of all players over all sessions of an archive
+
+    Parameters
+    ----------
+    players : dict
+        PlayerRecord (dict value) for each player name (dict key)
+    key : tuple, optional
+        What the index was built from, see index_key()
+    """
+
+    def __init__(self, players, key=None):
+        self.players = players
+        self.key = key
+
+    def __getitem__(self, name):
+        return self.players[name]
+
+    def __contains__(self, name):
+        return name in self.players
+
+    @property
+    def names(self):
+        """list of str : player names in order of their first session"""
+
+        return list(self.players)
+
+    @classmethod
+    def from_archive(cls, archive, name_index=name_index_default, key=None):
+        """Builds the index from parsed sessions
+
+        Parameters
+        ----------
+        archive : archive.Archive
+            The parsed sessions
+        name_index : dict, optional
+            PokerStars aliases (dict value) of each player (dict key), by default
+            aliases.name_index
+        key : tuple, optional
+            see index_key()
+
+        Returns
+        -------
+        PlayerIndex
+        """
+
+        lookup = alias_lookup(name_index)
+        players = {}
+        chips = {}
+        # Summary and index in chips[name] (dict value) of each (night, name) (dict
+        # key), a night being a date, or a file if its name has no date
+        merged = {}
+        for filename, session in archive.sessions.items():
+            night = session_date(filename) or str(filename)
+            for alias, stats in session.players.items():
+                name = lookup.get(alias, alias)
+                record = players.get(name)
+                if record is None:
+                    record = players[name] = PlayerRecord(name)
+                    chips[name] = []
+                if alias not in record.aliases:
+                    record.aliases.append(alias)
+                summary, i = merged.get((night, name), (None, None))
+                if summary is None:
+                    summary = {
+                        "files": [],
+                        "date": session_date(filename),
+                        "aliases": [],
+                        **dict.fromkeys(summary_columns, 0),
+                    }
+                    i = len(chips[name])
+                    merged[night, name] = summary, i
+                    record.sessions.append(summary)
+                    chips[name].append(stats.column("chips")[1:])
+                else:
+                    # Another account of the same player the same night, at the
+                    # same table or in the file of another alias folder
+                    chips[name][i] = np.concatenate(
+                        [chips[name][i], stats.column("chips")[1:]]
+                    )
+                if Path(filename).name not in summary["files"]:
+                    summary["files"].append(Path(filename).name)
+                rebuys = stats.total("rebuys")
+                summary["aliases"].append(alias)
+                summary["hands"] += len(stats.hands) - 1
+                summary["chips"] += stats.chips[-1]
+                summary["buyins"] += rebuys + 1
+                for column in PlayerStats.flag_columns:
+                    summary[column] += stats.total(column)
+        for name, record in players.items():
+            record._freeze(chips[name])
+        return cls(players, key=key)
+
+    def totals(self, start=None, end=None, year=None):
+        """Returns the totals of every player over a range of dates
+
+        Parameters
+        ----------
+        start, end, year : optional
+            see PlayerRecord.totals()
+
+        Returns
+        -------
+        dict
+            PlayerRecord.totals() (dict value) for each player name (dict key), only
+            players with a session in the range
+        """
+
+        totals = {}
+        for name, record in self.players.items():
+            player_totals = record.totals(start, end, year)
+            if player_totals["sessions"]:
+                totals[name] = player_totals
+        return totals
+
+
+def index_key(filenames, name_index=name_index_default, chip_count_start=10000):
+    """Returns what a stored index has to match to be valid
+
+    Parameters
+    ----------
+    filenames : list of Path
+        The hand history files of the archive
+    name_index : dict, optional
+        see PlayerIndex.from_archive()
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+
+    Returns
+    -------
+    tuple
+        Index version, the summary columns, the aliases and the cache key of each
+        file
+    """
+
+    return (
+        INDEX_VERSION,
+        summary_columns,
+        tuple((name, tuple(aliases)) for name, aliases in name_index.items()),
+        tuple(cache_key(filename, chip_count_start) for filename in filenames),
+    )
+
+
+def load_player_index(
+    path=path_hand_default,
+    name_index=name_index_default,
+    chip_count_start=10000,
+    cache_dir=path_cache_default,
+    rebuild=False,
+    workers=None,
+):
+    """Returns the player index of an archive, the stored one if it is still valid.
+    Otherwise the index is built (parsing only the files not in the session cache)
+    and stored.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Folder of the archive, by default poker_session/hand_history
+    name_index : dict, optional
+        see PlayerIndex.from_archive()
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    cache_dir : str or Path, optional
+        Folder of the session cache and of the stored index, by default
+        poker_session/cache. None disables both
+    rebuild : bool, optional
+        Build the index even if the stored one is valid, by default False
+    workers : int, optional
+        Number of worker processes to parse with, see archive.parse_archive()
+
+    Returns
+    -------
+    PlayerIndex
+    """
+
+    key = index_key(find_hand_histories(path), name_index, chip_count_start)
+    entry = None
+    if cache_dir is not None:
+        name = hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()
+        entry = Path(cache_dir) / f"player_index_{name}.pkl"
+        if not rebuild:
+            try:
+                with open(entry, "rb") as index_file:
+                    index = pickle.load(index_file)
+                if index.key == key:
+                    return index
+            except (
+                OSError,
+                pickle.UnpicklingError,
+                EOFError,
+                AttributeError,
+                ValueError,
+            ):
+                pass  # missing or unreadable index, build it again
+
+    archive = parse_archive(
+        path, workers=workers, chip_count_start=chip_count_start, cache_dir=cache_dir
+    )
+    index = PlayerIndex.from_archive(archive, name_index, key=key)
+    if entry is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_entry = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_entry, "wb") as index_file:
+            pickle.dump(index, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_entry, entry)
+    return index
+
+
+def plot_trajectories(index, names, ax):
+    """Draws the lifetime chip trajectory of players, decimated for the zoom of the
+    axes (see lod.py) so thousands of hands stay responsive
+
+    Parameters
+    ----------
+    index : PlayerIndex
+        see load_player_index()
+    names : list of str
+        Players to draw
+    ax : matplotlib.axes.Axes
+        Axes to draw into
+
+    Returns
+    -------
+    list of LodLine
+        One per player, they must be kept as long as the axes are zoomed
+    """
+
+    from lod import LodLine
+
+    lods = []
+    for name in names:
+        chips = index[name].chips
+        (line,) = ax.plot([], [], label=name, lw=1.5)
+        lods.append(LodLine(line))
+        lods[-1].set_data(np.arange(len(chips)), chips)
+    longest = max((len(index[name].chips) for name in names), default=0)
+    highest = max((index[name].chips.max(initial=0) for name in names), default=0)
+    ax.set_xlim(0, max(longest, 1))
+    ax.set_ylim(0, max(highest, 1) * 1.05)
+    ax.set_xlabel("Hand #")
+    ax.set_ylabel("Chip count")
+    ax.legend(loc="upper left")
+    return lods
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("player", nargs="?", default=None)
+    parser.add_argument("--path", default=path_hand_default)
+    parser.add_argument("--year", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="build the index anew")
+    parser.add_argument(
+        "--plot", action="store_true", help="plot the lifetime chip trajectories"
+    )
+    args = parser.parse_args()
+
+    index = load_player_index(args.path, rebuild=args.rebuild)
+    if args.player and args.player not in index:
+        print(f"No such player: {args.player} (players: {', '.join(index.names)})")
+        raise SystemExit(1)
+    names = [args.player] if args.player else index.names
+    for name in names:
+        record = index[name]
+        totals = record.totals(year=args.year)
+        if not totals["sessions"]:
+            continue
+        print(
+            f"{name} ({', '.join(record.aliases)}): {totals['sessions']} sessions, "
+            + f"{totals['hands']} hands, {totals['buyins']} buy-ins, "
+            + f"{totals['showdown_wins']} wins w/ showdown, "
+            + f"{totals['wins_no_showdown']} wins w/o showdown, {totals['losses']} losses, "
+            + f"{totals['preflop_folds']} preflop folds, "
+            + f"all-ins won {totals['allins_won']}/{totals['allins']} "
+            + f"({record.rate('allins_won', 'allins', year=args.year):.0%})"
+        )
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=[19, 8])
+        lods = plot_trajectories(index, names, ax)
+        plt.show()
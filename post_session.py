@@ -0,0 +1,226 @@
+"""Everything that happens after the plot window of a poker night is closed
+
+Uploading to the spreadsheet, exporting the images and sending the email do not
+depend on each other, except that the email attaches the PNG. run_pipeline()
+runs the network tasks in threads at the same time (each one waits only for the
+tasks it needs), so the post-session step takes as long as its slowest chain of
+tasks instead of the sum of all of them. The image exports run one after the
+other on the calling thread meanwhile, matplotlib is not thread-safe. Network
+errors are retried with exponential backoff. All questions are asked before the
+pipeline starts, nothing in it waits for input.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import instrument
+
+# Network errors worth another attempt, smtplib.SMTPException is an OSError too
+transient_errors_default = (OSError,)
+
+
+def retry(func, attempts=4, backoff=1.0, retry_on=transient_errors_default):
+    """Calls a function until it succeeds, waiting backoff, 2 x backoff, 4 x backoff
+    ... seconds between the attempts
+
+    Parameters
+    ----------
+    func : function
+        Called without arguments
+    attempts : int, optional
+        Number of attempts, by default 4
+    backoff : float, optional
+        Seconds to wait after the first failed attempt, by default 1.0
+    retry_on : tuple of exception classes, optional
+        Errors that are retried, any other error is raised right away, by default
+        OSError
+
+    Returns
+    -------
+    result : object
+        What func returned
+    n_attempts : int
+        Number of attempts it took
+    """
+
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(), attempt
+        except retry_on as err:
+            if attempt == attempts:
+                raise
+            wait = backoff * 2 ** (attempt - 1)
+            print(f"{err!r}, trying again in {wait:.1f} s ({attempt}/{attempts})")
+            time.sleep(wait)
+
+
+class TaskResult:
+    """Outcome of a task of the pipeline
+
+    Attributes
+    ----------
+    value : object
+        What the task returned, None if it failed
+    error : Exception or None
+        Why the task failed (or was skipped because a task it needs failed)
+    attempts : int
+        Number of attempts, 0 if it was skipped
+    seconds : float
+        Time from the start of the pipeline to the end of the task
+    """
+
+    __slots__ = ("value", "error", "attempts", "seconds")
+
+    def __init__(self, value=None, error=None, attempts=0, seconds=0.0):
+        self.value = value
+        self.error = error
+        self.attempts = attempts
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        """bool : whether the task succeeded"""
+
+        return self.error is None
+
+
+def run_pipeline(
+    tasks,
+    attempts=4,
+    backoff=1.0,
+    retry_on=transient_errors_default,
+    main_thread=(),
+):
+    """Runs tasks concurrently, each one as soon as the tasks it needs are done
+
+    Parameters
+    ----------
+    tasks : dict
+        (function, names of the tasks it needs) (dict value) for each task name
+        (dict key). Functions are called without arguments.
+    attempts, backoff, retry_on : optional
+        see retry()
+    main_thread : collection of str, optional
+        Tasks run on the calling thread instead of a thread of their own, one after
+        the other in the order of tasks, e.g. saving matplotlib figures. They may
+        only need tasks run on the calling thread before them. By default none
+
+    Returns
+    -------
+    dict
+        TaskResult (dict value) for each task name (dict key)
+    """
+
+    done = {name: threading.Event() for name in tasks}
+    results = {name: TaskResult() for name in tasks}
+    start = time.perf_counter()
+
+    def run(name):
+        func, needs = tasks[name]
+        result = results[name]
+        try:
+            for need in needs:
+                done[need].wait()
+                if not results[need].ok:
+                    raise RuntimeError(f"skipped, {need} failed")
+            result.value, result.attempts = retry(func, attempts, backoff, retry_on)
+        except Exception as err:
+            result.error = err
+        finally:
+            result.seconds = time.perf_counter() - start
+            if instrument.enabled:
+                instrument.record(f"post_session.{name}", result.seconds)
+            done[name].set()
+
+    threads = [
+        threading.Thread(target=run, args=(name,), name=f"post_session.{name}")
+        for name in tasks
+        if name not in main_thread
+    ]
+    for thread in threads:
+        thread.start()
+    for name in tasks:
+        if name in main_thread:
+            run(name)
+    for thread in threads:
+        thread.join()
+    for name, result in results.items():
+        status = "done" if result.ok else f"FAILED ({result.error!r})"
+        print(f"{name}: {status} after {result.seconds:.1f} s")
+    return results
+
+
+def send_email(
+    sender,
+    recipients,
+    subject,
+    message,
+    password,
+    path_image=False,
+    date="",
+    smtp_server="smtp.gmail.com",
+    smtp_port=465,
+    smtp=None,
+):
+    """Sends an email to all players after the game containing a summary of the poker night and the statistics image attached.
+
+    Parameters
+    ----------
+    sender : str
+        Email of the sender
+    recipients : list of strings
+        Emails of the recipients
+    subject : str
+        Subject of the email
+    message : str
+        Body of the email message
+    password : str
+        Password to email account
+    path_image : str, optional
+        Path to the image that ought to be attached, by default False
+    date : str, optional
+        Date of the poker night, by default ""
+    smtp_server : str, optional
+        Email server url, by default "smtp.gmail.com"
+    smtp_port : int, optional
+        Email server port, by default 465
+    smtp : class, optional
+        Opens the connection to the server, by default smtplib.SMTP_SSL
+    """
+
+    # Only needed to send the email, so they are not imported at startup
+    import smtplib
+    from email.message import EmailMessage
+
+    if smtp is None:
+        smtp = smtplib.SMTP_SSL
+
+    # Subject, body and recipients
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = sender
+    if type(recipients) is not list:
+        recipients = [recipients]
+    msg["To"] = ", ".join(recipients)
+    msg.set_content(message)
+
+    # Attachment
+    if path_image:
+        if type(path_image) is not list:
+            path_image = [path_image]
+        for c_file in path_image:
+            file_type = Path(c_file).suffix.lstrip(".").lower()
+            with open(c_file, "rb") as f:
+                file_data = f.read()
+            msg.add_attachment(
+                file_data,
+                maintype="image",
+                subtype="svg+xml" if file_type == "svg" else file_type,
+                filename=f"Statistics_poker_{date}.{file_type}",
+            )
+
+    # Send
+    with smtp(smtp_server, smtp_port) as connection:
+        connection.login(sender, password)
+        connection.send_message(msg)
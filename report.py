@@ -0,0 +1,369 @@
+"""Statistics images of finished sessions, rendered from the parsed data
+
+Every image is drawn by LivePlot from the cached session (see session_cache.py)
+into a figure without a window, in worker processes: each session is rendered
+once by a process of its own, which saves it in every format (e.g. the PNG and
+the SVG of one night). An output is skipped if it exists and neither its hand
+history (size, modification time, head and parser version, see
+session_cache.cache_key()) nor any rendering parameter changed since it was
+written. What each output was written from is kept in a manifest in
+poker_session/cache.
+
+Images are named like the ones the live plot saves, by day and month ("18-Jun"),
+see report_stems().
+
+Run as a script to (re)generate the images of all hand histories below a folder:
+
+    python report.py [path] [--output DIR] [--formats FORMAT [FORMAT ...]]
+                     [--dpi N] [--workers N] [--force]
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from archive import find_hand_histories, path_hand_default, session_date
+from session_cache import cache_key, load_session, path_cache_default
+from table_monitor import table_name
+
+# Bump whenever the images change without a parameter changing, this invalidates
+# all outputs of the manifest
+REPORT_VERSION = 3
+
+path_stats_default = Path(__file__).resolve().parent / "poker_session" / "stats"
+formats_default = ("png", "svg")
+month_names = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+figsize_default = (19, 10)
+
+
+def style_default():
+    """Returns the matplotlib style of the live plot ("seaborn-dark", renamed in
+    matplotlib 3.6)"""
+
+    import matplotlib.style
+
+    if "seaborn-v0_8-dark" in matplotlib.style.available:
+        return "seaborn-v0_8-dark"
+    return "seaborn-dark"
+
+
+def make_figure(figsize=figsize_default):
+    """Creates the statistics figure of the live plot without a window
+
+    Parameters
+    ----------
+    figsize : tuple of float, optional
+        Width and height in inches, by default (19, 10)
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+    axes : tuple of matplotlib.axes.Axes
+        ax1, ax1sec, ax2, ax2sec, ax3 as expected by LivePlot
+    """
+
+    # Not pyplot, so no GUI backend is loaded and the figure is never shown
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=list(figsize))
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(6, 6)
+    ax1 = fig.add_subplot(grid[0:4, :])
+    ax2 = fig.add_subplot(grid[4:6, 0:3])
+    ax3 = fig.add_subplot(grid[4:6, 3:6])
+    return fig, (ax1, ax1.twinx(), ax2, ax2.twinx(), ax3)
+
+
+def render_session(
+    session,
+    chip_count_start=10000,
+    big_blind=100,
+    figsize=figsize_default,
+    style=None,
+):
+    """Draws the statistics figure of a whole session
+
+    Parameters
+    ----------
+    session : Session
+        see hand_history.data_extract()
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    big_blind : int, optional
+        Size of the big blind, by default 100
+    figsize : tuple of float, optional
+        see make_figure()
+    style : str, optional
+        matplotlib style, by default style_default()
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+    """
+
+    import matplotlib.style
+
+    from live_plot import LivePlot
+
+    # The style is read when the artists are created, so it covers the whole drawing
+    with matplotlib.style.context(style or style_default()):
+        fig, axes = make_figure(figsize)
+        live_plot = LivePlot(
+            fig, *axes, chip_count_start=chip_count_start, big_blind=big_blind
+        )
+        live_plot.update(session)
+        live_plot.freeze()
+    return fig
+
+
+def report_stems(filenames, output_dir=None):
+    """Returns the name of the images of each hand history file, the way the live
+    plot names them: day and month of the night ("18-Jun"), the first file of a
+    night alone and every other table of that night with its name ("18-Jun
+    <table>"), or with its alias folder if it is the same table. A night in a later
+    year than another one of the same day also gets its year ("18-Jun-2021").
+
+    Parameters
+    ----------
+    filenames : list of str or Path
+        Paths to the hand history files, oldest night first
+    output_dir : str or Path, optional
+        Folder of the images. Images of the first nights were saved without the
+        leading zero of the day ("5-Nov"), those names are kept if such an image
+        exists there. By default None
+
+    Returns
+    -------
+    dict
+        File name without extension (dict value) for each file (dict key)
+    """
+
+    existing = set()
+    if output_dir is not None and os.path.isdir(output_dir):
+        existing = {Path(name).stem for name in os.listdir(output_dir)}
+    years = {}  # first year (dict value) of each day and month (dict key)
+    nights = {}  # table of the first file (dict value) of each night (dict key)
+    stems = {}
+    for filename in filenames:
+        date = session_date(filename)
+        if not date:
+            stems[filename] = Path(filename).stem
+            continue
+        year, month, day = date.split("-")
+        night = f"{day}-{month_names[int(month) - 1]}"
+        if years.setdefault(night, year) != year:
+            night = f"{night}-{year}"
+        elif night[0] == "0" and night[1:] in existing and night not in existing:
+            night = night[1:]
+        table = table_name(filename)
+        first_table = nights.get(night)
+        if first_table is None:
+            nights[night] = table
+            stems[filename] = night
+        elif table != first_table:
+            stems[filename] = f"{night} {table}"
+        else:
+            stems[filename] = f"{night} ({Path(filename).parent.name})"
+    return stems
+
+
+def export_report(filename, outputs, params, cache_dir=path_cache_default):
+    """Renders the figure of a hand history file once and saves it in every format
+    asked for, run in a worker process
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    outputs : dict
+        Format, e.g. "png" or "svg" (dict value) of each image path (dict key)
+    params : dict
+        chip_count_start, big_blind, dpi, figsize and style, see export_reports()
+    cache_dir : str or Path, optional
+        Folder of the session cache, by default poker_session/cache
+
+    Returns
+    -------
+    list of str
+        The image paths
+    """
+
+    session = load_session(
+        filename, cache_dir=cache_dir, chip_count_start=params["chip_count_start"]
+    )
+    fig = render_session(
+        session,
+        chip_count_start=params["chip_count_start"],
+        big_blind=params["big_blind"],
+        figsize=params["figsize"],
+        style=params["style"],
+    )
+    for output, file_format in outputs.items():
+        # Written next to the output first, so a crash never leaves half an image
+        # behind
+        tmp_output = f"{output}.{os.getpid()}.tmp"
+        fig.savefig(
+            tmp_output, format=file_format, dpi=params["dpi"], bbox_inches="tight"
+        )
+        os.replace(tmp_output, output)
+    return [str(output) for output in outputs]
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(path, manifest):
+    os.makedirs(Path(path).parent, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(tmp_path, path)
+
+
+def export_reports(
+    sources,
+    output_dir=path_stats_default,
+    formats=formats_default,
+    workers=None,
+    dpi=400,
+    chip_count_start=10000,
+    big_blind=100,
+    figsize=figsize_default,
+    style=None,
+    cache_dir=path_cache_default,
+    force=False,
+):
+    """Renders and saves the images of hand history files in parallel worker
+    processes, skipping every image that is up to date
+
+    Parameters
+    ----------
+    sources : list or dict
+        Paths to the hand history files, or the file name of the images without
+        extension (dict value) for each file (dict key), by default the names of
+        report_stems() in output_dir
+    output_dir : str or Path, optional
+        Folder of the images, by default poker_session/stats
+    formats : sequence of str, optional
+        One image per format, by default ("png", "svg")
+    workers : int, optional
+        Number of worker processes, by default one per core. With 1 everything is
+        rendered in this process
+    dpi : int, optional
+        Resolution of raster formats, by default 400
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    big_blind : int, optional
+        Size of the big blind, by default 100
+    figsize : tuple of float, optional
+        see make_figure()
+    style : str, optional
+        matplotlib style, by default style_default()
+    cache_dir : str or Path, optional
+        Folder of the session cache and the manifest, by default
+        poker_session/cache. None renders everything without cache or manifest
+    force : bool, optional
+        Render every image even if it is up to date, by default False
+
+    Returns
+    -------
+    dict
+        "written" or "skipped" (dict value) for each image path (dict key)
+    """
+
+    if not isinstance(sources, dict):
+        sources = report_stems(sources, output_dir)
+    params = {
+        "chip_count_start": chip_count_start,
+        "big_blind": big_blind,
+        "dpi": dpi,
+        "figsize": list(figsize),
+        "style": style or style_default(),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    path_manifest = None
+    manifest = {}
+    if cache_dir is not None:
+        path_manifest = Path(cache_dir) / "report_manifest.json"
+        manifest = _read_manifest(path_manifest)
+
+    # Everything an image depends on, as stored in the manifest
+    status, keys = {}, {}
+    jobs = {}  # format of each image to write (dict value) of each file (dict key)
+    for filename, stem in sources.items():
+        source_key = list(cache_key(filename, chip_count_start=chip_count_start))
+        for file_format in formats:
+            output = str(Path(output_dir).resolve() / f"{stem}.{file_format}")
+            key = [REPORT_VERSION, source_key, file_format, params]
+            if not force and manifest.get(output) == key and os.path.exists(output):
+                status[output] = "skipped"
+            else:
+                jobs.setdefault(filename, {})[output] = file_format
+                keys[output] = key
+
+    try:
+        if workers == 1 or len(jobs) < 2:
+            for filename, outputs in jobs.items():
+                for output in export_report(filename, outputs, params, cache_dir):
+                    manifest[output] = keys[output]
+                    status[output] = "written"
+        else:
+            # Imported here as it is slow to import and only needed with several workers
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(export_report, filename, outputs, params, cache_dir)
+                    for filename, outputs in jobs.items()
+                ]
+                for future in as_completed(futures):
+                    for output in future.result():
+                        manifest[output] = keys[output]
+                        status[output] = "written"
+    finally:
+        # Images written before an error stay up to date
+        if path_manifest is not None:
+            _write_manifest(path_manifest, manifest)
+    return status
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=path_hand_default)
+    parser.add_argument("--output", default=path_stats_default)
+    parser.add_argument("--formats", nargs="+", default=list(formats_default))
+    parser.add_argument("--dpi", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="render every image")
+    args = parser.parse_args()
+
+    if Path(args.path).is_file():
+        filenames = [Path(args.path)]
+    else:
+        filenames = find_hand_histories(args.path)
+    before = perf_counter()
+    status = export_reports(
+        filenames,
+        output_dir=args.output,
+        formats=args.formats,
+        workers=args.workers,
+        dpi=args.dpi,
+        force=args.force,
+    )
+    elapsed = perf_counter() - before
+    written = [output for output, state in status.items() if state == "written"]
+    for output in written:
+        print(f"written {output}")
+    print(
+        f"{len(written)} images written, {len(status) - len(written)} up to date, "
+        + f"in {elapsed:.1f} s"
+    )
@@ -0,0 +1,196 @@
+"""On-disk cache of parsed sessions
+
+Parsed sessions are pickled (their columns are compact arrays) into one file per
+hand history. An entry is only used if the path, size, modification time and a
+hash of the first bytes of the hand history still match, and if it was written
+by the same PARSER_VERSION with the same starting chip count. A session parsed
+without some of its hands (see dedup.py) is cached in an entry of its own, keyed
+on the ids of the hands it leaves out. Sessions are cached with their actions
+parsed (HUD counters and all-ins), the images and the database read them.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+from hand_history import PARSER_VERSION, parse_file
+
+path_cache_default = Path(__file__).resolve().parent / "poker_session" / "cache"
+head_size = 64 * 1024
+
+
+def cache_key(filename, chip_count_start=10000, skip=None):
+    """Returns what a cache entry has to match to be valid for a hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        Ids of the hands left out, see hand_history.SessionParser
+
+    Returns
+    -------
+    tuple
+        path, size, mtime, hash of the head, parser version and starting chip count,
+        plus a hash of the hands left out if any
+    """
+
+    filename = Path(filename).resolve()
+    stat = filename.stat()
+    with open(filename, "rb") as raw_file:
+        head_hash = hashlib.sha1(raw_file.read(head_size)).hexdigest()
+    return (
+        str(filename),
+        stat.st_size,
+        stat.st_mtime_ns,
+        head_hash,
+        PARSER_VERSION,
+        chip_count_start,
+    ) + ((skip_digest(skip),) if skip else ())
+
+
+def skip_digest(skip):
+    """Returns a hash of a set of hand ids, the same whatever their order
+
+    Parameters
+    ----------
+    skip : set of int
+        Ids of the hands left out
+
+    Returns
+    -------
+    str
+    """
+
+    return hashlib.sha1(
+        b"".join(hand_id.to_bytes(8, "little") for hand_id in sorted(skip))
+    ).hexdigest()
+
+
+def cache_path(filename, cache_dir=path_cache_default, skip=None):
+    """Returns the path of the cache entry of a hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    cache_dir : str or Path, optional
+        Folder of the cache, by default poker_session/cache
+    skip : set of int, optional
+        Ids of the hands left out, their entry does not replace the complete one
+
+    Returns
+    -------
+    Path
+    """
+
+    name = hashlib.sha1(str(Path(filename).resolve()).encode()).hexdigest()
+    if skip:
+        name += "-dedup"
+    return Path(cache_dir) / f"{name}.pkl"
+
+
+def load_session(
+    filename, cache_dir=path_cache_default, chip_count_start=10000, skip=None
+):
+    """Returns the parsed session of a hand history file, from the cache if possible.
+    Otherwise the file is parsed and the cache entry (re)written.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    cache_dir : str or Path, optional
+        Folder of the cache, by default poker_session/cache. None disables the cache
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        PokerStars hand ids of hands to leave out, see hand_history.SessionParser
+
+    Returns
+    -------
+    Session
+        see hand_history.data_extract()
+    """
+
+    if cache_dir is None:
+        return parse_file(
+            filename, chip_count_start=chip_count_start, skip=skip, actions=True
+        )
+
+    key, session = read_entry(
+        filename, cache_dir=cache_dir, chip_count_start=chip_count_start, skip=skip
+    )
+    if session is None:
+        session = parse_file(
+            filename, chip_count_start=chip_count_start, skip=skip, actions=True
+        )
+        write_entry(filename, key, session, cache_dir=cache_dir, skip=skip)
+    return session
+
+
+def read_entry(
+    filename, cache_dir=path_cache_default, chip_count_start=10000, skip=None
+):
+    """Reads the cache entry of a hand history file, for callers that parse the file
+    themselves on a miss, see load_session()
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    cache_dir : str or Path, optional
+        Folder of the cache, by default poker_session/cache
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    skip : set of int, optional
+        PokerStars hand ids of hands to leave out, see hand_history.SessionParser
+
+    Returns
+    -------
+    key : tuple
+        see cache_key(), taken before the file is parsed
+    session : Session or None
+        The cached session, None if the entry is missing or out of date
+    """
+
+    key = cache_key(filename, chip_count_start=chip_count_start, skip=skip)
+    entry = cache_path(filename, cache_dir=cache_dir, skip=skip)
+    try:
+        with open(entry, "rb") as cache_file:
+            cached_key, session = pickle.load(cache_file)
+        if cached_key == key:
+            return key, session
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        pass  # missing or unreadable entry, parse again
+    return key, None
+
+
+def write_entry(filename, key, session, cache_dir=path_cache_default, skip=None):
+    """(Re)writes the cache entry of a hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    key : tuple
+        see read_entry()
+    session : Session
+        The session parsed with its actions, see hand_history.SessionParser
+    cache_dir : str or Path, optional
+        Folder of the cache, by default poker_session/cache
+    skip : set of int, optional
+        PokerStars hand ids of the hands left out of the session
+    """
+
+    entry = cache_path(filename, cache_dir=cache_dir, skip=skip)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so a crash never leaves half an entry behind
+    tmp_entry = entry.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_entry, "wb") as cache_file:
+        pickle.dump((key, session), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_entry, entry)
@@ -0,0 +1,123 @@
+"""Statistics of a session as NumPy arrays
+
+SessionStats turns the per-player columns of a parsed session into players x
+hands matrices (one row per player, one column per hand number) and computes all
+numbers the live plot, the spreadsheet upload and the email summary need in one
+vectorized pass. Build it once per tick or upload and hand it to all of them.
+"""
+
+import numpy as np
+
+import hud
+from hand_history import PlayerStats
+
+
+class SessionStats:
+    """Players x hands matrices and derived statistics of a session
+
+    Parameters
+    ----------
+    session : Session
+        see hand_history.data_extract()
+
+    Attributes
+    ----------
+    names : list of str
+        Player names, the order of the rows of all matrices and per-player arrays
+    index : dict
+        Row (dict value) of each player name (dict key)
+    hand_count : int
+        Number of hands played
+    hands : numpy.ndarray
+        Hand numbers 0 (start of the session) to hand_count, the columns of the
+        matrices
+    seated : numpy.ndarray of bools
+        Players x hands, whether the player was seated at the hand
+    chips : numpy.ndarray of ints
+        Players x hands, chip count at the start of the hand (0 if not seated)
+    flags : dict
+        Players x hands matrix of 0/1 (dict value) for each flag column of
+        PlayerStats (dict key), e.g. "busts"
+    potsize, rake : numpy.ndarray of floats
+        Pot size and rake of each hand whose summary was parsed
+    pot_hands : numpy.ndarray
+        Hand numbers of potsize and rake
+    totals : dict
+        Sum over all hands for each player (dict value) of each flag column (dict key)
+    seated_count : numpy.ndarray of ints
+        Number of hands (plus the start) each player was seated at
+    preflop_fold_rate : numpy.ndarray of floats
+        Share of these hands each player folded preflop
+    final_chips : numpy.ndarray of ints
+        Chip count of each player at the last hand the player was seated at
+    buyins : numpy.ndarray of ints
+        Buy-ins of each player, the first one plus the rebuys
+    max_chips : int
+        Highest chip count any player had during the session
+    family_pot_count : int
+        Number of family pots
+    hud_counters : numpy.ndarray of ints
+        Players x positions x counters, the HUD counters (see hud.counter_columns)
+        of each player in each of hud.positions
+    hud : dict
+        Each HUD metric of each player over all positions (dict value, an array),
+        see hud.rates()
+    """
+
+    def __init__(self, session):
+        players = list(session.players.values())
+        self.names = [player.name for player in players]
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.hand_count = session.hand_count
+        n_players, n_hands = len(players), session.hand_count + 1
+        self.hands = np.arange(n_hands)
+
+        columns = PlayerStats.flag_columns
+        self.seated = np.zeros((n_players, n_hands), dtype=bool)
+        self.chips = np.zeros((n_players, n_hands), dtype=np.int64)
+        flags = np.zeros((len(columns), n_players, n_hands), dtype=np.int8)
+        for row, player in enumerate(players):
+            hands = np.frombuffer(player.hands, dtype="i")
+            self.seated[row, hands] = True
+            self.chips[row, hands] = np.frombuffer(player.chips, dtype="i")
+            for flag, column in zip(flags, player.flags):
+                flag[row, hands] = np.frombuffer(column, dtype="b")
+        self.flags = dict(zip(columns, flags))
+
+        self.potsize = np.frombuffer(session.potsize, dtype="d").copy()
+        self.rake = np.frombuffer(session.rake, dtype="d").copy()
+        self.pot_hands = np.arange(len(self.potsize))
+        self.family_pot_count = int(np.frombuffer(session.family_pots, dtype="b").sum())
+
+        # Everything derived in one pass over the matrices
+        sums = flags.sum(axis=2, dtype=np.int64)
+        self.totals = dict(zip(columns, sums))
+        self.seated_count = self.seated.sum(axis=1)
+        self.preflop_fold_rate = self.totals["preflop_folds"] / np.maximum(
+            self.seated_count, 1
+        )
+        last_hand = n_hands - 1 - np.argmax(self.seated[:, ::-1], axis=1)
+        self.final_chips = self.chips[np.arange(n_players), last_hand]
+        self.buyins = self.totals["rebuys"] + 1
+        self.max_chips = int(self.chips.max(initial=session.chip_count_start))
+        self.hud_counters = np.array(
+            [player.hud for player in players], dtype=np.int64
+        ).reshape(n_players, len(hud.positions), len(hud.counter_columns))
+        self.hud = hud.rates(self.hud_counters.sum(axis=1))
+
+    def player_hands(self, name):
+        """Returns the hand numbers a player was seated at and the chip counts
+
+        Parameters
+        ----------
+        name : str
+            Player name
+
+        Returns
+        -------
+        hands : numpy.ndarray
+        chips : numpy.ndarray
+        """
+
+        seated = self.seated[self.index[name]]
+        return self.hands[seated], self.chips[self.index[name], seated]
@@ -0,0 +1,702 @@
+"""Local SQLite store of every hand, seat, action and session result
+
+The hand histories are ingested into one indexed database: a row per hand (keyed
+by the PokerStars hand id, "Hand #215486308040"), per seat, per action, per all-in
+that went to showdown (with its expected value, see equity.py) and per player and
+session (the totals of SessionStats). Queries over years of play are then plain
+SQL and never touch a hand history.
+
+Every row is written with an upsert keyed by the hand id (and seat, action number
+or player), so ingesting a file again updates the rows instead of adding new ones.
+The results of a session are replaced as a whole, so a player who is no longer in
+the session (e.g. whose hands another session keeps now) loses its row.
+A hand recorded by several aliases at the same table belongs to the session that
+was ingested first: the other files leave it out of their rows and results (see
+dedup.py) and only add the hole cards their alias was dealt to its seats, so the
+hand's rows are the one canonical record of what all aliases saw. A file is
+written in one transaction with executemany() in WAL mode, and skipped if it did
+not change since it was ingested. It is tokenized once for its rows and, unless the
+session cache has it, for its session.
+
+Run as a script to ingest all hand histories below a folder and optionally run a
+query:
+
+    python store.py [path] [--db FILE] [--workers N] [--force] [--sql QUERY]
+"""
+
+import argparse
+import json
+import sqlite3
+from pathlib import Path
+from time import perf_counter
+
+from archive import find_hand_histories, path_hand_default, session_date
+from dedup import HandIdSet, scan_hand_ids
+from equity import action_amount, expected_winnings
+from hand_history import (
+    ACTION,
+    ALLIN,
+    BOARD,
+    BUTTON,
+    COLLECTED,
+    HAND,
+    HOLE_CARDS,
+    LOSS,
+    POT,
+    PREFLOP_FOLD,
+    SEAT,
+    SHOWDOWN_WIN,
+    STREET,
+    UNCALLED,
+    SessionParser,
+    tokenize,
+)
+from hud import (
+    BET,
+    CALL,
+    CHECK,
+    FOLD,
+    POST_BIG_BLIND,
+    POST_BOTH_BLINDS,
+    POST_SMALL_BLIND,
+    PREFLOP,
+    RAISE,
+)
+from session_cache import cache_key, path_cache_default, read_entry, write_entry
+from session_stats import SessionStats
+from table_monitor import table_name
+
+# Bump whenever the schema or what is ingested changes, this re-ingests every file
+STORE_VERSION = 2
+
+path_db_default = Path(path_cache_default) / "hands.sqlite"
+
+street_names = ("preflop", "flop", "turn", "river")
+action_names = {
+    FOLD: "fold",
+    CHECK: "check",
+    CALL: "call",
+    BET: "bet",
+    RAISE: "raise",
+    POST_SMALL_BLIND: "small blind",
+    POST_BIG_BLIND: "big blind",
+    POST_BOTH_BLINDS: "small & big blind",
+}
+result_columns = (
+    "showdown_wins",
+    "wins_no_showdown",
+    "losses",
+    "preflop_folds",
+    "allins",
+    "allins_won",
+    "busts",
+    "rebuys",
+)
+
+schema = f"""
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL UNIQUE,
+    date TEXT,
+    table_name TEXT,
+    folder TEXT,
+    hands INTEGER,
+    key TEXT
+);
+CREATE TABLE IF NOT EXISTS hands (
+    hand_id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    hand INTEGER NOT NULL,
+    started TEXT,
+    button INTEGER,
+    pot REAL,
+    rake REAL,
+    board TEXT,
+    family_pot INTEGER
+);
+CREATE TABLE IF NOT EXISTS seats (
+    hand_id INTEGER NOT NULL,
+    seat INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    chips INTEGER,
+    cards TEXT,
+    won INTEGER,
+    showdown INTEGER,
+    preflop_fold INTEGER,
+    PRIMARY KEY (hand_id, seat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS actions (
+    hand_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    street TEXT,
+    player TEXT NOT NULL,
+    action TEXT,
+    amount INTEGER,
+    allin INTEGER,
+    PRIMARY KEY (hand_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS allins (
+    hand_id INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    cards TEXT,
+    contribution INTEGER,
+    won INTEGER,
+    ev REAL,
+    known INTEGER,
+    PRIMARY KEY (hand_id, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS results (
+    session_id INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    hands INTEGER,
+    chips INTEGER,
+    buyins INTEGER,
+    {", ".join(f"{column} INTEGER" for column in result_columns)},
+    PRIMARY KEY (session_id, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hands_session ON hands (session_id, hand);
+CREATE INDEX IF NOT EXISTS hands_started ON hands (started);
+CREATE INDEX IF NOT EXISTS seats_player ON seats (player, hand_id);
+CREATE INDEX IF NOT EXISTS actions_player ON actions (player, street, action);
+CREATE INDEX IF NOT EXISTS allins_player ON allins (player);
+CREATE INDEX IF NOT EXISTS results_player ON results (player);
+"""
+
+_upsert_hand = """
+INSERT INTO hands VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hand_id) DO UPDATE SET
+    session_id = excluded.session_id, hand = excluded.hand,
+    started = excluded.started, button = excluded.button, pot = excluded.pot,
+    rake = excluded.rake, board = excluded.board, family_pot = excluded.family_pot
+"""
+# Each alias only sees its own hole cards, the cards another alias saw are kept
+_merge_cards = "UPDATE seats SET cards = ? WHERE hand_id = ? AND seat = ?"
+_upsert_seat = """
+INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hand_id, seat) DO UPDATE SET
+    player = excluded.player, chips = excluded.chips,
+    cards = coalesce(excluded.cards, seats.cards), won = excluded.won,
+    showdown = excluded.showdown, preflop_fold = excluded.preflop_fold
+"""
+_upsert_action = """
+INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hand_id, seq) DO UPDATE SET
+    street = excluded.street, player = excluded.player, action = excluded.action,
+    amount = excluded.amount, allin = excluded.allin
+"""
+_upsert_allin = """
+INSERT INTO allins VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hand_id, player) DO UPDATE SET
+    cards = coalesce(excluded.cards, allins.cards),
+    contribution = excluded.contribution, won = excluded.won, ev = excluded.ev,
+    known = excluded.known
+"""
+_upsert_result = f"""
+INSERT INTO results VALUES ({", ".join(["?"] * (5 + len(result_columns)))})
+ON CONFLICT (session_id, player) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}"
+               for column in ("hands", "chips", "buyins") + result_columns)}
+"""
+
+
+def connect(path=path_db_default):
+    """Opens the store and creates its tables if needed
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Database file, by default poker_session/cache/hands.sqlite
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    # Readers do not block the writer and a commit needs no fsync of the database
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    return connection
+
+
+def hand_rows(rawlines, parser=None):
+    """Reads the rows of the hands, seats and actions of a hand history
+
+    Parameters
+    ----------
+    rawlines : iterable of str
+        Lines of the hand history file
+    parser : SessionParser, optional
+        Parser with actions that is fed the same tokens, by default None
+
+    Returns
+    -------
+    hands : list of list
+        hand_id, hand (number in the session, from 1), started, button, pot, rake,
+        board and family_pot of each hand, session_id left None
+    seats : list of list
+        hand_id, seat, player, chips, cards, won, showdown and preflop_fold of each
+        seat of each hand
+    actions : list of list
+        hand_id, seq, street, player, action, amount and allin of each action
+    """
+
+    hands, seats, actions = [], [], []
+    tokens = _row_tokens(tokenize(rawlines, actions=True), hands, seats, actions)
+    if parser is None:
+        for _ in tokens:
+            pass
+    else:
+        parser.feed_tokens(tokens)
+    return hands, seats, actions
+
+
+def _row_tokens(tokens, hands, seats, actions):
+    """Appends the rows of each token to hands, seats and actions and yields the
+    token on, see hand_rows()"""
+
+    hand = None
+    first_action = 0  # index in actions of the first action of the current hand
+    seat_rows = {}  # row of each seat number of the current hand
+    name_rows = {}  # row of each player name of the current hand
+    street = street_names[PREFLOP]
+    for line_type, fields in tokens:
+        yield line_type, fields
+        if line_type == HAND:
+            hand_id, started = fields
+            hand = [hand_id, None, len(hands) + 1, started.replace("/", "-")]
+            hand += [None, 0.0, 0.0, None, 1]  # button, pot, rake, board, family pot
+            hands.append(hand)
+            first_action = len(actions)
+            seat_rows.clear()
+            name_rows.clear()
+            street = street_names[PREFLOP]
+        elif hand is None:
+            continue  # nothing before the first hand header belongs to a hand
+        elif line_type == ACTION:
+            name, action_type, text = fields
+            actions.append(
+                [
+                    hand[0],
+                    len(actions) - first_action,
+                    street,
+                    name,
+                    action_names[action_type],
+                    action_amount(action_type, text),
+                    0,
+                ]
+            )
+        elif line_type == SEAT:
+            seat, name, chips = fields
+            row = [hand[0], seat, name, chips, None, 0, 0, 0]
+            seat_rows[seat] = name_rows[name] = row
+            seats.append(row)
+        elif line_type == STREET:
+            street = street_names[fields]
+        elif line_type == BUTTON:
+            hand[4] = fields
+        elif line_type == ALLIN:
+            if len(actions) > first_action:
+                actions[-1][6] = 1
+        elif line_type == UNCALLED:
+            name, amount = fields
+            actions.append(
+                [
+                    hand[0],
+                    len(actions) - first_action,
+                    street,
+                    name,
+                    "uncalled",
+                    amount,
+                    0,
+                ]
+            )
+        # A summary line can name a seat without a seat line, e.g. in a cut-off hand
+        elif line_type == SHOWDOWN_WIN or line_type == COLLECTED:
+            row = seat_rows.get(fields[0])
+            if row is not None:
+                row[5] += fields[1]
+                row[6] |= line_type == SHOWDOWN_WIN
+        elif line_type == LOSS:
+            row = seat_rows.get(fields)
+            if row is not None:
+                row[6] = 1
+        elif line_type == PREFLOP_FOLD:
+            row = seat_rows.get(fields)
+            if row is not None:
+                row[7] = 1
+            hand[8] = 0
+        elif line_type == POT:
+            hand[5], hand[6] = fields
+        elif line_type == HOLE_CARDS:
+            row = name_rows.get(fields[0])
+            if row is not None:
+                row[4] = fields[1]
+        elif line_type == BOARD:
+            hand[7] = fields
+
+
+def store_key(filename, chip_count_start=10000):
+    """Returns what the stored rows of a file have to match to be up to date
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+
+    Returns
+    -------
+    str
+        JSON of the store version and session_cache.cache_key() without the path
+    """
+
+    key = cache_key(filename, chip_count_start=chip_count_start)
+    return json.dumps([STORE_VERSION, *key[1:]])
+
+
+def _stored_allins(connection, hand_ids):
+    """Returns (cards, contribution, ev) (dict value) of the stored all-ins of the
+    given hands for each (hand_id, player) (dict key)"""
+
+    if not len(hand_ids):
+        return {}
+    return {
+        (hand_id, player): (cards, contribution, ev)
+        for hand_id, player, cards, contribution, ev in connection.execute(
+            "SELECT hand_id, player, cards, contribution, ev FROM allins "
+            + f"WHERE hand_id IN ({', '.join(map(str, hand_ids))})"
+        )
+    }
+
+
+def _stored_ev(stored, records, hand_ids):
+    """Sets the ev of the all-ins already in the store with the same cards and
+    contributions, so they are not sampled again"""
+
+    if not stored:
+        return
+    for record in records:
+        hand_id = hand_ids[record.hand]
+        known = [
+            stored.get((hand_id, name), (None, None, None)) for name in record.names
+        ]
+        if all(
+            (cards, contribution) == stored_row[:2] and stored_row[2] is not None
+            for cards, contribution, stored_row in zip(
+                record.cards, record.contributions, known
+            )
+        ):
+            record.ev = [stored_row[2] for stored_row in known]
+
+
+def read_file(
+    filename,
+    chip_count_start=10000,
+    stored=None,
+    skip=None,
+    cache_dir=path_cache_default,
+):
+    """Reads the rows the store keeps of a hand history file, run in a worker process
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    stored : dict, optional
+        All-ins already in the store whose equities are reused, see
+        _stored_allins(), by default none
+    skip : set of int, optional
+        Ids of the hands another session already stored, only their hole cards are
+        read
+    cache_dir : str or Path, optional
+        Folder of the session cache, by default poker_session/cache. None parses
+        the session without the cache
+
+    Returns
+    -------
+    hands, seats, actions : list of list
+        see hand_rows(), without the hands in skip
+    allins : list of tuple
+        hand_id, player, cards, contribution, won, ev and known of each player of
+        each all-in
+    results : list of tuple
+        player, hands, chips, buyins and the result_columns of each player
+    cards : list of tuple
+        cards, hand_id and seat of the seats of the hands in skip the alias was
+        dealt cards in
+    """
+
+    # The parsed session has the totals and the all-ins, from the session cache if
+    # possible and otherwise from the same pass over the file as the rows
+    key, session = None, None
+    if cache_dir is not None:
+        key, session = read_entry(
+            filename, cache_dir=cache_dir, chip_count_start=chip_count_start, skip=skip
+        )
+    parser = None
+    if session is None:
+        parser = SessionParser(
+            chip_count_start=chip_count_start, skip=skip, actions=True
+        )
+    with open(filename, encoding="utf-8-sig", errors="replace") as raw_file:
+        hands, seats, actions = hand_rows(raw_file, parser)
+    if parser is not None:
+        session = parser.session
+        if cache_dir is not None:
+            write_entry(filename, key, session, cache_dir=cache_dir, skip=skip)
+    cards = []
+    if skip:
+        hands = [hand for hand in hands if hand[0] not in skip]
+        actions = [action for action in actions if action[0] not in skip]
+        cards = [(seat[4], seat[0], seat[1]) for seat in seats if seat[0] in skip]
+        cards = [row for row in cards if row[0] is not None]
+        seats = [seat for seat in seats if seat[0] not in skip]
+        for number, hand in enumerate(hands, 1):
+            hand[2] = number  # numbered like the session, without the skipped hands
+    stats = SessionStats(session)
+    hand_ids = session.hand_ids
+    _stored_ev(stored, session.allin_hands, hand_ids)
+    allins = [
+        (hand_ids[record.hand], name, cards, contribution, won, ev, record.known)
+        for record in session.allin_hands
+        for name, cards, contribution, won, ev in zip(
+            record.names,
+            record.cards,
+            record.contributions,
+            record.won,
+            expected_winnings(record),
+        )
+    ]
+    results = [
+        (
+            name,
+            int(stats.seated_count[row]) - 1,
+            int(stats.final_chips[row]),
+            int(stats.buyins[row]),
+            *(int(stats.totals[column][row]) for column in result_columns),
+        )
+        for row, name in enumerate(stats.names)
+    ]
+    return hands, seats, actions, allins, results, cards
+
+
+def write_file(connection, filename, key, rows):
+    """Upserts the rows of a hand history file in one transaction
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        see connect()
+    filename : Path
+        Resolved path to the hand history file
+    key : str
+        see store_key()
+    rows : tuple
+        see read_file()
+    """
+
+    hands, seats, actions, allins, results, cards = rows
+    with connection:  # one transaction, rolled back on any error
+        connection.execute(
+            """
+            INSERT INTO sessions (file, date, table_name, folder, hands, key)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (file) DO UPDATE SET
+                date = excluded.date, table_name = excluded.table_name,
+                folder = excluded.folder, hands = excluded.hands, key = excluded.key
+            """,
+            (
+                str(filename),
+                session_date(filename),
+                table_name(filename),
+                filename.parent.name,
+                len(hands),
+                key,
+            ),
+        )
+        session_id = connection.execute(
+            "SELECT session_id FROM sessions WHERE file = ?", (str(filename),)
+        ).fetchone()[0]
+        for hand in hands:
+            hand[1] = session_id
+        connection.executemany(_upsert_hand, hands)
+        connection.executemany(_upsert_seat, seats)
+        connection.executemany(_merge_cards, cards)
+        connection.executemany(_upsert_action, actions)
+        connection.executemany(_upsert_allin, allins)
+        connection.execute("DELETE FROM results WHERE session_id = ?", (session_id,))
+        connection.executemany(
+            _upsert_result, [(session_id, *result) for result in results]
+        )
+
+
+def ingest_file(connection, filename, chip_count_start=10000, force=False):
+    """Writes the hands of a hand history file into the store
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        see connect()
+    filename : str or Path
+        Path to the hand history file
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    force : bool, optional
+        Ingest the file even if it did not change, by default False
+
+    Returns
+    -------
+    int
+        Number of hands written, 0 if the file was skipped
+    """
+
+    return ingest_archive(
+        [filename], connection, chip_count_start=chip_count_start, force=force
+    )[filename]
+
+
+def ingest_archive(
+    filenames,
+    connection=None,
+    chip_count_start=10000,
+    force=False,
+    workers=None,
+    cache_dir=path_cache_default,
+):
+    """Writes the hands of hand history files into the store. Files are read in
+    parallel worker processes and written one after the other in file order. A
+    hand already stored by another session, or in an earlier file, is left out
+    but for the hole cards the file adds to it.
+
+    Parameters
+    ----------
+    filenames : list of str or Path
+        Paths to the hand history files, see archive.find_hand_histories()
+    connection : sqlite3.Connection, optional
+        see connect(), by default the store in poker_session/cache
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    force : bool, optional
+        Ingest every file even if it did not change, by default False
+    workers : int, optional
+        Number of worker processes reading the files, by default one per core. With
+        1 everything is read in this process
+    cache_dir : str or Path, optional
+        Folder of the session cache, see read_file()
+
+    Returns
+    -------
+    dict
+        Number of hands written (dict value) for each file (dict key), 0 for the
+        files that were skipped
+    """
+
+    own_connection = connection is None
+    if own_connection:
+        connection = connect()
+    try:
+        stored = {
+            file: (key, session_id)
+            for file, key, session_id in connection.execute(
+                "SELECT file, key, session_id FROM sessions"
+            )
+        }
+        written = {filename: 0 for filename in filenames}
+        jobs = {}
+        skips = []
+        stored_allins = []  # all-ins of each file already stored, see read_file()
+        seen = HandIdSet()  # hands kept by the files ingested before
+        for filename in filenames:
+            path = Path(filename).resolve()
+            key = store_key(path, chip_count_start=chip_count_start)
+            stored_key, session_id = stored.get(str(path), (None, None))
+            if not force and stored_key == key:
+                continue
+            jobs[filename] = (path, key)
+            hand_ids = scan_hand_ids(path)
+            skip = set(hand_ids[seen.contains(hand_ids)].tolist())
+            if len(hand_ids):
+                skip.update(
+                    hand_id
+                    for (hand_id,) in connection.execute(
+                        "SELECT hand_id FROM hands WHERE session_id IS NOT ? AND "
+                        + f"hand_id IN ({', '.join(map(str, hand_ids.tolist()))})",
+                        (session_id,),
+                    )
+                )
+            seen.add([hand_id for hand_id in hand_ids.tolist() if hand_id not in skip])
+            skips.append(skip)
+            # Read here, a database in memory is only open in this process
+            stored_allins.append(_stored_allins(connection, hand_ids.tolist()))
+
+        if workers == 1 or len(jobs) < 2:
+            rows = (
+                read_file(path, chip_count_start, stored, skip, cache_dir)
+                for (path, _), stored, skip in zip(jobs.values(), stored_allins, skips)
+            )
+            for filename, file_rows in zip(jobs, rows):
+                write_file(connection, *jobs[filename], file_rows)
+                written[filename] = len(file_rows[0])
+        else:
+            # Imported here as it is slow to import and only needed with several workers
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rows = executor.map(
+                    read_file,
+                    [path for path, _ in jobs.values()],
+                    [chip_count_start] * len(jobs),
+                    stored_allins,
+                    skips,
+                    [cache_dir] * len(jobs),
+                )
+                for filename, file_rows in zip(jobs, rows):
+                    write_file(connection, *jobs[filename], file_rows)
+                    written[filename] = len(file_rows[0])
+        return written
+    finally:
+        if own_connection:
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=path_hand_default)
+    parser.add_argument("--db", default=path_db_default)
+    parser.add_argument("--force", action="store_true", help="ingest every file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sql", help="query to run after ingesting")
+    args = parser.parse_args()
+
+    if Path(args.path).is_file():
+        filenames = [Path(args.path)]
+    else:
+        filenames = find_hand_histories(args.path)
+    before = perf_counter()
+    connection = connect(args.db)
+    written = ingest_archive(
+        filenames, connection, force=args.force, workers=args.workers
+    )
+    elapsed = perf_counter() - before
+    n_hands = sum(written.values())
+    print(
+        f"{n_hands} hands of {sum(map(bool, written.values()))} files ingested, "
+        + f"{len(written) - sum(map(bool, written.values()))} up to date, "
+        + f"in {elapsed:.2f} s ({n_hands / elapsed:.0f} hands/s)"
+    )
+    if args.sql:
+        before = perf_counter()
+        cursor = connection.execute(args.sql)
+        rows = cursor.fetchall()
+        elapsed = perf_counter() - before
+        print(" | ".join(column[0] for column in cursor.description or []))
+        for row in rows:
+            print(" | ".join(str(value) for value in row))
+        print(f"{len(rows)} rows in {elapsed * 1e3:.1f} ms")
+    connection.close()
@@ -0,0 +1,338 @@
+"""Synthetic PokerStars home game hand histories
+
+Writes hand histories in the format of the HH*.txt files PokerStars writes, with
+random but consistent hands: blinds, preflop and postflop betting, all-ins,
+uncalled bets, showdowns, rake, busts and rebuys. Chip counts carry over from
+hand to hand, a player who goes bust rebuys for the starting chip count.
+
+Run as a script to write a single file:
+
+    python synthetic.py path [--hands N] [--players N] [--seed N]
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+player_names_default = [
+    "HighCardJasper",
+    "Duke Croix",
+    "color_singleton",
+    "dockstarr",
+    "JeBoyDirk",
+    "Klemtonius",
+    "Manon947",
+    "yairpinto",
+    "RichRick1337",
+]
+ranks = "23456789TJQKA"
+suits = "cdhs"
+hand_values = [
+    "high card Ace",
+    "a pair of Kings",
+    "a pair of Sevens",
+    "two pair, Aces and Jacks",
+    "three of a kind, Tens",
+    "a straight, Five to Nine",
+    "a flush, King high",
+    "a full house, Queens full of Deuces",
+]
+
+
+def _bet(stacks, contributions, seat, amount):
+    """Moves up to amount chips of a seat into the pot
+
+    Returns
+    -------
+    amount : int
+        The chips actually put in
+    allin : bool
+        Whether these were all chips of the seat
+    """
+
+    amount = min(amount, stacks[seat])
+    stacks[seat] -= amount
+    contributions[seat] += amount
+    return amount, stacks[seat] == 0
+
+
+def write_hand_history(
+    path,
+    n_hands=1000,
+    n_players=6,
+    seed=0,
+    chip_count_start=10000,
+    big_blind=100,
+    hero=0,
+):
+    """Writes a synthetic hand history file
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the file to write
+    n_hands : int, optional
+        Number of hands, by default 1000
+    n_players : int, optional
+        Number of players at the table (2 to 9), by default 6
+    seed : int, optional
+        Seed of the random hands, by default 0
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    big_blind : int, optional
+        Size of the big blind, by default 100
+    hero : int, optional
+        Index of the player whose hole cards are dealt face up, by default 0
+
+    Returns
+    -------
+    int
+        Number of bytes written
+    """
+
+    if not 2 <= n_players <= len(player_names_default):
+        raise ValueError(f"n_players must be between 2 and {len(player_names_default)}")
+
+    rng = random.Random(seed)
+    names = player_names_default[:n_players]
+    seat_numbers = list(range(1, n_players + 1))
+    stacks = [chip_count_start] * n_players
+    deck = [rank + suit for rank in ranks for suit in suits]
+    small_blind = big_blind // 2
+    hand_id = 229539307198
+    start = datetime(2021, 9, 2, 20, 0, 0)
+    button = 0
+
+    with open(path, "w", encoding="utf-8-sig", newline="\n") as hh_file:
+        for i in range(n_hands):
+            lines = []
+            add = lines.append
+            # A player that went bust rebuys
+            for seat in range(n_players):
+                if stacks[seat] == 0:
+                    stacks[seat] = chip_count_start
+            button = (button + 1) % n_players
+            if n_players == 2:
+                sb, bb = button, 1 - button
+            else:
+                sb, bb = (button + 1) % n_players, (button + 2) % n_players
+            hand_id += rng.randint(20000, 60000)
+            played_at = start + timedelta(seconds=55 * i)
+            add(
+                f"PokerStars Home Game Hand #{hand_id}: {{DaPokaStars}}  Hold'em No Limit "
+                + f"({small_blind}/{big_blind}) - {played_at:%Y/%m/%d %H:%M:%S} ET"
+            )
+            add(
+                f"Table 'synthetic' 9-max (Play Money) Seat #{seat_numbers[button]} is the button"
+            )
+            for seat in range(n_players):
+                add(
+                    f"Seat {seat_numbers[seat]}: {names[seat]} ({stacks[seat]} in chips) "
+                )
+
+            cards = rng.sample(deck, 2 * n_players + 5)
+            hole = [
+                f"{cards[2 * seat]} {cards[2 * seat + 1]}" for seat in range(n_players)
+            ]
+            board = cards[2 * n_players :]
+            contributions = [0] * n_players
+            active = [True] * n_players
+            allin = [False] * n_players
+            folded = [None] * n_players  # street each player folded on
+
+            amount, allin[sb] = _bet(stacks, contributions, sb, small_blind)
+            add(f"{names[sb]}: posts small blind {amount}")
+            amount, allin[bb] = _bet(stacks, contributions, bb, big_blind)
+            add(f"{names[bb]}: posts big blind {amount}")
+            add("*** HOLE CARDS ***")
+            add(f"Dealt to {names[hero]} [{hole[hero]}]")
+
+            streets = ["preflop", "FLOP", "TURN", "RIVER"]
+            n_board = [0, 3, 4, 5]
+            winner = None
+            for street, n_cards in zip(streets, n_board):
+                if street != "preflop":
+                    if n_cards == 3:
+                        add(f"*** FLOP *** [{' '.join(board[:3])}]")
+                    else:
+                        add(
+                            f"*** {street} *** [{' '.join(board[:n_cards - 1])}] "
+                            + f"[{board[n_cards - 1]}]"
+                        )
+                street_bets = [0] * n_players
+                if street == "preflop":
+                    street_bets[sb], street_bets[bb] = (
+                        contributions[sb],
+                        contributions[bb],
+                    )
+                    order = [(bb + 1 + k) % n_players for k in range(n_players)]
+                else:
+                    order = [(button + 1 + k) % n_players for k in range(n_players)]
+                to_call = max(street_bets)
+                aggressor = bb if street == "preflop" else None
+                acted = set()
+                # After a raise the others act again, but only once more (call or fold)
+                queue = [seat for seat in order if active[seat] and not allin[seat]]
+                while queue:
+                    seat = queue.pop(0)
+                    if not active[seat] or allin[seat]:
+                        continue
+                    if sum(active) == 1:
+                        break
+                    owed = to_call - street_bets[seat]
+                    # Nobody bets more than the biggest stack of the others covers
+                    cover = max(
+                        stacks[other] + street_bets[other]
+                        for other in range(n_players)
+                        if active[other] and other != seat
+                    )
+                    roll = rng.random()
+                    if owed > 0 and roll < 0.45:
+                        active[seat] = False
+                        folded[seat] = street
+                        add(f"{names[seat]}: folds ")
+                    elif owed > 0 and (roll < 0.9 or seat in acted):
+                        amount, allin[seat] = _bet(stacks, contributions, seat, owed)
+                        street_bets[seat] += amount
+                        add(
+                            f"{names[seat]}: calls {amount}"
+                            + (" and is all-in" if allin[seat] else "")
+                        )
+                    elif owed == 0 and (roll < 0.55 or cover <= to_call):
+                        add(f"{names[seat]}: checks ")
+                    else:
+                        # Bet or raise, now and then all chips
+                        pot = sum(contributions)
+                        if rng.random() < 0.01:
+                            target = street_bets[seat] + stacks[seat]
+                        else:
+                            target = to_call + max(
+                                big_blind, rng.randint(1, 4) * pot // 4
+                            )
+                        target = min(target, cover, street_bets[seat] + stacks[seat])
+                        if target <= to_call:
+                            amount, allin[seat] = _bet(
+                                stacks, contributions, seat, owed
+                            )
+                            street_bets[seat] += amount
+                            add(
+                                f"{names[seat]}: calls {amount}"
+                                + (" and is all-in" if allin[seat] else "")
+                            )
+                        else:
+                            amount, allin[seat] = _bet(
+                                stacks, contributions, seat, target - street_bets[seat]
+                            )
+                            street_bets[seat] += amount
+                            suffix = " and is all-in" if allin[seat] else ""
+                            if to_call == 0:
+                                add(f"{names[seat]}: bets {amount}{suffix}")
+                            else:
+                                add(
+                                    f"{names[seat]}: raises {target - to_call} to {target}{suffix}"
+                                )
+                            to_call = target
+                            aggressor = seat
+                            # Everyone else has to act again
+                            queue = [
+                                (seat + 1 + k) % n_players for k in range(n_players - 1)
+                            ]
+                    acted.add(seat)
+
+                if sum(active) == 1:
+                    winner = active.index(True)
+                    # The part of the last bet nobody called goes back
+                    others = max(
+                        street_bets[other]
+                        for other in range(n_players)
+                        if other != winner
+                    )
+                    uncalled = street_bets[winner] - others
+                    if uncalled > 0 and winner == aggressor:
+                        stacks[winner] += uncalled
+                        contributions[winner] -= uncalled
+                        allin[winner] = False
+                        add(f"Uncalled bet ({uncalled}) returned to {names[winner]}")
+                    break
+
+            if winner is None:
+                # Only what the winner covers is at stake, the rest goes back
+                winner = rng.choice([seat for seat in range(n_players) if active[seat]])
+                for seat in range(n_players):
+                    excess = contributions[seat] - contributions[winner]
+                    if active[seat] and excess > 0:
+                        stacks[seat] += excess
+                        contributions[seat] -= excess
+                showdown = True
+            else:
+                showdown = False
+            pot = sum(contributions)
+            rake = min(pot * 5 // 100, 3 * big_blind) if n_cards > 0 else 0
+            won = pot - rake
+            summary = {}
+            if not showdown:
+                add(f"{names[winner]} collected {won} from pot")
+                add(f"{names[winner]}: doesn't show hand ")
+                summary[winner] = f"collected ({won})"
+                stacks[winner] += won
+            else:
+                add("*** SHOW DOWN ***")
+                value = rng.choice(hand_values)
+                add(f"{names[winner]}: shows [{hole[winner]}] ({value})")
+                for seat in range(n_players):
+                    if seat == winner or not active[seat]:
+                        continue
+                    if allin[seat] or rng.random() < 0.5:
+                        loser_value = rng.choice(hand_values)
+                        add(f"{names[seat]}: shows [{hole[seat]}] ({loser_value})")
+                        summary[seat] = (
+                            f"showed [{hole[seat]}] and lost with {loser_value}"
+                        )
+                    else:
+                        add(f"{names[seat]}: mucks hand ")
+                        summary[seat] = f"mucked [{hole[seat]}]"
+                add(f"{names[winner]} collected {won} from pot")
+                summary[winner] = (
+                    f"showed [{hole[winner]}] and won ({won}) with {value}"
+                )
+                stacks[winner] += won
+
+            add("*** SUMMARY ***")
+            add(f"Total pot {pot} | Rake {rake} ")
+            if n_cards:
+                add(f"Board [{' '.join(board[:n_cards])}]")
+            for seat in range(n_players):
+                position = ""
+                if seat == button:
+                    position += " (button)"
+                if seat == sb:
+                    position += " (small blind)"
+                elif seat == bb:
+                    position += " (big blind)"
+                if seat in summary:
+                    result = summary[seat]
+                elif folded[seat] == "preflop":
+                    didnt_bet = "" if contributions[seat] else " (didn't bet)"
+                    result = f"folded before Flop{didnt_bet}"
+                else:
+                    result = f"folded on the {folded[seat].title()}"
+                add(f"Seat {seat_numbers[seat]}: {names[seat]}{position} {result}")
+            add("\n\n")
+            hh_file.write("\n".join(lines) + "\n")
+        return hh_file.tell()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--hands", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    n_bytes = write_hand_history(
+        args.path, n_hands=args.hands, n_players=args.players, seed=args.seed
+    )
+    print(
+        f"Wrote {args.hands} hands of {args.players} players ({n_bytes / 1e6:.1f} MB)"
+    )
@@ -0,0 +1,225 @@
+"""Live monitoring of every table of a hand history folder at once
+
+PokerStars writes one hand history file per table, so two tables running at the
+same time means two files growing side by side. TableMonitor follows all of them
+with one HandHistoryFollower each and only reads a file when it changed.
+
+Changes are reported by the file system through watchdog (inotify on Linux,
+ReadDirectoryChangesW on Windows, FSEvents on macOS) if it is installed. Without
+it the folder is scanned on every poll, which only compares the size and the
+modification time of each file and never opens an idle one.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from hand_history import HandHistoryFollower
+
+
+def table_name(filename):
+    """Returns the table name in the name of a hand history file
+
+    Parameters
+    ----------
+    filename : str or Path
+        e.g. "HH20200618 lets gooooo - 50-100 - Play Money No Limit Hold'em.txt"
+
+    Returns
+    -------
+    str
+        e.g. "lets gooooo", the file name without extension if it has no table name
+    """
+
+    stem = Path(filename).stem
+    head, _, table = stem.partition(" ")
+    if not (head.startswith("HH") and head[2:].isdigit() and table):
+        return stem
+    return table.partition(" - ")[0]
+
+
+def _is_hand_history(path):
+    name = os.path.basename(path)
+    return name.startswith("HH") and name.endswith(".txt")
+
+
+class TableMonitor:
+    """Follows every active hand history file of a folder
+
+    Parameters
+    ----------
+    path : str or Path
+        Folder PokerStars writes the hand histories to (one alias folder)
+    chip_count_start : int, optional
+        Chip count every player starts with, by default 10000
+    active_within : float, optional
+        Files modified less than this many seconds before the start are followed
+        right away, older ones only once they change again, by default 3600
+    watch : bool, optional
+        Use file system notifications if watchdog is installed, by default True.
+        Otherwise (or without watchdog) the folder is scanned on every poll.
+
+    Attributes
+    ----------
+    followers : dict
+        HandHistoryFollower (dict value) of each followed file (dict key), in the
+        order the tables became active
+    last_changed : str or None
+        The followed file with the most recent new lines
+    """
+
+    def __init__(self, path, chip_count_start=10000, active_within=3600, watch=True):
+        self.path = Path(path)
+        self.chip_count_start = chip_count_start
+        self.followers = {}
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._stats = self._scan_stats()
+        threshold = time.time_ns() - int(active_within * 1e9)
+        for filename, (size, mtime_ns) in sorted(
+            self._stats.items(), key=lambda item: item[1][1]
+        ):
+            if mtime_ns >= threshold:
+                self.followers[filename] = self._new_follower(filename)
+        self._changed.update(self.followers)
+        self.last_changed = next(reversed(self.followers), None)
+        self.observer = self._start_observer() if watch else None
+
+    @property
+    def watching(self):
+        """bool : whether changes are reported by the file system"""
+
+        return self.observer is not None
+
+    def _new_follower(self, filename):
+        # The live plot draws the all-in EV line
+        return HandHistoryFollower(
+            filename, chip_count_start=self.chip_count_start, actions=True
+        )
+
+    def _scan_stats(self):
+        """Returns (size, modification time in ns) of each hand history file"""
+
+        stats = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if _is_hand_history(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    def _scan(self):
+        """Polling fallback: the files whose size or modification time changed"""
+
+        stats = self._scan_stats()
+        changed = {
+            filename
+            for filename, stat in stats.items()
+            if self._stats.get(filename) != stat
+        }
+        self._stats = stats
+        return changed
+
+    def _notify(self, path):
+        """Called from the watchdog thread for every changed file"""
+
+        if _is_hand_history(path):
+            with self._lock:
+                self._changed.add(os.path.join(self.path, os.path.basename(path)))
+
+    def _start_observer(self):
+        # Optional, without it the folder is scanned on every poll
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        monitor = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    monitor._notify(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    monitor._notify(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    monitor._notify(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), str(self.path), recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def poll(self):
+        """Parses whatever was appended to any hand history file since the last poll
+
+        Returns
+        -------
+        dict
+            Session (dict value, see hand_history.data_extract()) of each file (dict
+            key) with new complete lines, empty if nothing changed
+        """
+
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        if self.observer is None:
+            changed |= self._scan()
+        sessions = {}
+        for filename in sorted(changed):
+            if not os.path.exists(filename):
+                continue  # deleted or renamed since
+            follower = self.followers.get(filename)
+            if follower is None:
+                follower = self.followers[filename] = self._new_follower(filename)
+            offset = follower.offset
+            session = follower.poll()
+            if follower.offset != offset:
+                sessions[filename] = session
+                self.last_changed = filename
+        return sessions
+
+    def follow(self, filename):
+        """Follows a file even though it is not active, it is parsed on the next poll
+
+        Parameters
+        ----------
+        filename : str or Path
+            Path to the hand history file
+        """
+
+        filename = os.fspath(filename)
+        if filename not in self.followers:
+            self.followers[filename] = self._new_follower(filename)
+            with self._lock:
+                self._changed.add(filename)
+        if self.last_changed is None:
+            self.last_changed = filename
+
+    def sessions(self):
+        """Returns the sessions parsed so far
+
+        Returns
+        -------
+        dict
+            Session (dict value) of each followed file (dict key)
+        """
+
+        return {
+            filename: follower.parser.session
+            for filename, follower in self.followers.items()
+        }
+
+    def close(self):
+        """Stops the file system notifications"""
+
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
@@ -0,0 +1,162 @@
+"""Local stand-ins for the Google Sheets client and the email server, used by the
+tests and benchmark.py
+
+They keep everything in memory, count the API calls made on them and can take a
+fixed latency per call or fail a number of calls, like a busy server would.
+"""
+
+import time
+
+
+class CountingWorksheet:
+    """Worksheet that keeps its cells in memory and counts the API calls made on it,
+    it implements the part of gspread.Worksheet used by save_session()
+
+    Parameters
+    ----------
+    calls : dict
+        Number of calls (dict value) for each method (dict key), shared by all
+        worksheets of a spreadsheet
+    spreadsheet : CountingSpreadsheet
+        The spreadsheet the worksheet belongs to
+    cells : dict, optional
+        Value (dict value) of each cell as (row, col) (dict key), by default empty
+    title : str, optional
+        Name of the worksheet, by default ""
+    """
+
+    def __init__(self, calls, spreadsheet, cells=None, title=""):
+        self.calls = calls
+        self.spreadsheet = spreadsheet
+        self.cells = dict(cells or {})
+        self.title = title
+
+    def _count(self, method):
+        self.spreadsheet._count(method)
+
+    @staticmethod
+    def _cell(a1):
+        letters = a1.rstrip("0123456789")
+        col = 0
+        for letter in letters:
+            col = col * 26 + ord(letter) - ord("A") + 1
+        return int(a1[len(letters) :]), col
+
+    def duplicate(self, insert_sheet_index=None, new_sheet_name=None):
+        self._count("duplicate")
+        worksheet = CountingWorksheet(
+            self.calls, self.spreadsheet, self.cells, new_sheet_name
+        )
+        self.spreadsheet.sheets.append(worksheet)
+        return worksheet
+
+    def batch_get(self, ranges):
+        self._count("batch_get")
+        result = []
+        for whole_row in ranges:
+            row = int(whole_row.split(":")[0])
+            cols = [col for (r, col) in self.cells if r == row]
+            values = [
+                self.cells.get((row, col), "")
+                for col in range(1, max(cols, default=0) + 1)
+            ]
+            result.append([values] if values else [])
+        return result
+
+    def get(self, cell_range):
+        self._count("get")
+        (row1, col), (row2, _) = map(self._cell, cell_range.split(":"))
+        return [
+            [self.cells[(row, col)]] if (row, col) in self.cells else []
+            for row in range(row1, row2 + 1)
+        ]
+
+    def batch_update(self, data, value_input_option=None):
+        self._count("batch_update")
+        for entry in data:
+            row, col = self._cell(entry["range"].split(":")[0])
+            for i, values in enumerate(entry["values"]):
+                for j, value in enumerate(values):
+                    self.cells[(row + i, col + j)] = value
+
+
+class CountingSpreadsheet:
+    """Spreadsheet with an overview sheet of earlier sessions and the sheet of the
+    last session, see CountingWorksheet
+
+    Parameters
+    ----------
+    names : list of str
+        Player names (keys of name_index) in the rows of the session sheet
+    n_sessions : int, optional
+        Number of earlier sessions in the overview, by default 60
+    latency : float, optional
+        Seconds every API call takes, by default 0
+    failures : dict, optional
+        Number of calls (dict value) of a method (dict key) that fail with a
+        ConnectionResetError before the method succeeds, by default none
+    """
+
+    def __init__(self, names, n_sessions=60, latency=0.0, failures=None):
+        self.calls = {}
+        self.latency = latency
+        self.failures = dict(failures or {})
+        overview = {
+            (row, col): f"date {col}"
+            for row in (5, 63, 81)
+            for col in range(1, n_sessions + 2)
+        }
+        last_session = {(9 + i, 1): name for i, name in enumerate(names)}
+        self.sheets = [
+            CountingWorksheet(self.calls, self, overview, "overview"),
+            CountingWorksheet(self.calls, self, last_session, "last session"),
+        ]
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        time.sleep(self.latency)
+        if self.failures.get(method, 0) > 0:
+            self.failures[method] -= 1
+            raise ConnectionResetError(f"fake: {method} failed")
+
+    def worksheets(self):
+        self._count("worksheets")
+        return list(self.sheets)
+
+
+class FlakySMTP:
+    """Stand-in for smtplib.SMTP_SSL that takes latency seconds for every call and
+    fails the first failures connections, see send_email()
+
+    Parameters
+    ----------
+    latency : float, optional
+        Seconds every call takes, by default 0
+    failures : int, optional
+        Number of connections that fail before one succeeds, by default 1
+    """
+
+    def __init__(self, latency=0.0, failures=1):
+        self.latency = latency
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, smtp_server, smtp_port):
+        time.sleep(self.latency)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionResetError("fake: connection reset")
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def login(self, sender, password):
+        time.sleep(self.latency)
+
+    def send_message(self, msg):
+        time.sleep(self.latency)
+        self.sent.append(msg)
@@ -0,0 +1,33 @@
+"""Comparison of parsed sessions, used by the tests"""
+
+
+def session_columns(session):
+    """Returns everything parsed into a session as plain lists and dicts, so two
+    sessions compare with =="""
+
+    return {
+        "hand_count": session.hand_count,
+        "hand_ids": list(session.hand_ids),
+        "rake": list(session.rake),
+        "potsize": list(session.potsize),
+        "family_pots": list(session.family_pots),
+        "ids": dict(session.ids),
+        "players": {
+            name: player_columns(player) for name, player in session.players.items()
+        },
+        "allin_hands": [
+            {column: getattr(record, column) for column in record.__slots__}
+            for record in session.allin_hands
+        ],
+    }
+
+
+def player_columns(player):
+    """Returns the columns and HUD counters of a PlayerStats as lists"""
+
+    columns = {
+        column: list(getattr(player, column))
+        for column in ("chips", "hands") + player.flag_columns
+    }
+    columns["hud"] = [list(counters) for counters in player.hud]
+    return columns
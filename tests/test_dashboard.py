@@ -0,0 +1,124 @@
+"""Tests of the dashboard page and the updates it is sent"""
+
+import http.client
+import json
+import re
+import threading
+import urllib.request
+
+from dashboard import (
+    Dashboard,
+    empty_state,
+    merge_update,
+    render_page,
+    serve,
+    session_state,
+)
+from hand_history import parse_file
+from session_stats import SessionStats
+from synthetic import write_hand_history
+
+
+def test_title_is_escaped():
+    title = "<img src=x onerror=alert(1)> & `${alert(2)}` </script>"
+
+    page = render_page(title)
+
+    assert "<img" not in page
+    assert "</script>" not in page.split("<script>", 1)[1].rsplit("</script>", 1)[0]
+    assert "&lt;img src=x onerror=alert(1)&gt; &amp;" in page
+    # The script gets the title as a JSON string, not as code
+    (literal,) = re.findall(r"^const tableName = (.*);$", page, re.MULTILINE)
+    assert json.loads(literal) == title
+    assert "`${tableName}: hand # " in page
+
+
+def test_title_with_placeholder():
+    page = render_page("{title_json}")
+
+    assert "<title>{title_json}</title>" in page
+    assert 'const tableName = "{title_json}";' in page
+
+
+def test_no_markup_from_names():
+    page = render_page("Poker")
+
+    assert "innerHTML" not in page
+
+
+def as_lists(state):
+    """The session state with the NumPy arrays as lists, like the JSON has them"""
+
+    return json.loads(
+        json.dumps(state, default=lambda values: values.tolist()),
+    )
+
+
+def watch(port, received, ready, last):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("GET", "/events")
+    response = connection.getresponse()
+    version = None
+    for line in response:
+        if line.startswith(b"id: "):
+            version = int(line[4:])
+        elif line.startswith(b"data: "):
+            received.append((version, json.loads(line[6:])))
+            ready.release()
+            if version == last:
+                break
+    connection.close()
+
+
+def test_browsers_get_the_session(tmp_path):
+    source = tmp_path / "source.txt"
+    write_hand_history(source, n_hands=60, n_players=5)
+    data = source.read_bytes()
+    # Cut anywhere, also in the middle of a line
+    cuts = [0, 1000, 4321, 9000, len(data) // 2 + 7, len(data) - 50, len(data)]
+    path = tmp_path / "HH20210513 Test - 50-100 - Play Money No Limit Hold'em.txt"
+    path.touch()
+    dashboard = Dashboard(path)
+    server = serve(dashboard, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    steps = len(cuts) - 1
+    clients, ready = [[], [], []], threading.Semaphore(0)
+    threads = [
+        threading.Thread(
+            target=watch, args=(server.server_address[1], received, ready, steps)
+        )
+        for received in clients
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            ready.acquire(timeout=30)  # the empty session they connected to
+        for start, end in zip(cuts, cuts[1:]):
+            with open(path, "ab") as hand_history:
+                hand_history.write(data[start:end])
+            assert dashboard.poll()
+            assert not dashboard.poll()
+        for thread in threads:
+            thread.join(timeout=30)
+        with urllib.request.urlopen(
+            f"http://127.0.0.1:{server.server_address[1]}/session.json", timeout=30
+        ) as response:
+            snapshot = json.loads(response.read())
+    finally:
+        dashboard.stop()
+        server.shutdown()
+        server.server_close()
+
+    session = parse_file(path, actions=True)
+    expected = as_lists(session_state(session, SessionStats(session)))
+    assert dashboard.polls == steps
+    for received in clients:
+        assert [version for version, _ in received] == list(range(steps + 1))
+        state = empty_state()
+        for _, update in received:
+            merge_update(state, update)
+        assert state == expected
+    merge_update(state, snapshot)
+    assert state == expected
+    assert session.allin_hands
@@ -0,0 +1,93 @@
+"""Tests of the hands recorded by several accounts"""
+
+from pathlib import Path
+
+import numpy as np
+
+import session_cache
+from archive import parse_archive
+from dedup import HandIdSet, scan_hand_ids
+from hand_history import parse_file
+from synthetic import write_hand_history
+
+name = "HH20210513 Test - 50-100 - Play Money No Limit Hold'em.txt"
+marker = b"PokerStars Home Game Hand #"
+
+
+def test_hand_id_set():
+    seen = HandIdSet([5, 3, 3])
+    seen.add([9, 1])
+    seen.add(np.array([3, 12]))
+
+    assert len(seen) == 5
+    assert seen.contains([1, 2, 3, 12, 13]).tolist() == [
+        True,
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert 9 in seen and 10 not in seen
+
+
+def write_archive(tmp_path):
+    """Writes the files of two accounts, the second recorded the last 10 hands of
+    the first one and 20 more"""
+
+    first, second = tmp_path / "Alice" / name, tmp_path / "Bob" / name
+    first.parent.mkdir()
+    second.parent.mkdir()
+    write_hand_history(first, n_hands=30, n_players=4, seed=0)
+    later = tmp_path / "later.txt"
+    write_hand_history(later, n_hands=20, n_players=4, seed=1)
+    data = first.read_bytes()
+    start = data.index(marker)
+    for _ in range(20):
+        start = data.index(marker, start + 1)
+    second.write_bytes(b"\xef\xbb\xbf" + data[start:] + later.read_bytes()[3:])
+    return first, second, later
+
+
+def test_hands_in_two_files_count_once(tmp_path, monkeypatch):
+    first, second, later = write_archive(tmp_path)
+    cache_dir = tmp_path / "cache"
+    parsed = []
+
+    def counted(filename, **kwargs):
+        parsed.append(Path(filename).parent.name)
+        return parse_file(filename, **kwargs)
+
+    monkeypatch.setattr(session_cache, "parse_file", counted)
+
+    archive = parse_archive(tmp_path, workers=1, cache_dir=cache_dir)
+
+    ids = np.concatenate(
+        [session.hand_ids[1:] for session in archive.sessions.values()]
+    )
+    assert archive.hand_count == len(ids) == len(set(ids.tolist())) == 50
+    assert set(ids.tolist()) == set(scan_hand_ids(first)) | set(scan_hand_ids(second))
+    # Each player's totals are the ones of the hands of both nights, counted once
+    alone = [parse_file(path, actions=True) for path in (first, later)]
+    for column in ("showdown_wins", "losses", "wins_no_showdown", "busts"):
+        assert archive.totals(column) == {
+            player: sum(
+                session.players[player].total(column)
+                for session in alone
+                if player in session.players
+            )
+            for player in archive.names
+        }
+    # The second file is parsed again without the hands of the first one, into an
+    # entry of its own next to the complete one
+    assert parsed == ["Alice", "Bob", "Bob"]
+    assert len(list(cache_dir.glob("*-dedup.pkl"))) == 1
+
+    parsed.clear()
+    again = parse_archive(tmp_path, workers=1, cache_dir=cache_dir)
+
+    assert parsed == []
+    assert again.hand_count == 50
+    assert (
+        parse_archive(tmp_path, workers=1, cache_dir=None, dedup=False).hand_count == 60
+    )
+    assert again.totals("losses") == archive.totals("losses")
@@ -0,0 +1,188 @@
+"""Tests of the hand evaluator, the all-in records and the all-in EV"""
+
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+import equity
+from hand_history import data_extract
+from session_stats import SessionStats
+
+
+def brute_force(cards):
+    """Value of the best 5 of 7 cards as a tuple, the slow and obvious way"""
+
+    best = None
+    for five in combinations(cards, 5):
+        ranks = sorted((card >> 2 for card in five), reverse=True)
+        flush = len({card & 3 for card in five}) == 1
+        straight = None
+        if len(set(ranks)) == 5 and ranks[0] - ranks[4] == 4:
+            straight = ranks[0]
+        elif ranks == [12, 3, 2, 1, 0]:
+            straight = 3  # the wheel, five high
+        counts = Counter(ranks)
+        # Ranks by how often they appear, then by rank
+        kickers = sorted(counts, key=lambda rank: (counts[rank], rank), reverse=True)
+        shape = sorted(counts.values(), reverse=True)
+        if straight is not None and flush:
+            value = (equity.STRAIGHT_FLUSH, straight)
+        elif shape[0] == 4:
+            value = (equity.QUADS, *kickers)
+        elif shape[:2] == [3, 2]:
+            value = (equity.FULL_HOUSE, *kickers)
+        elif flush:
+            value = (equity.FLUSH, *ranks)
+        elif straight is not None:
+            value = (equity.STRAIGHT, straight)
+        elif shape[0] == 3:
+            value = (equity.TRIPS, *kickers)
+        elif shape[:2] == [2, 2]:
+            value = (equity.TWO_PAIR, *kickers)
+        elif shape[0] == 2:
+            value = (equity.PAIR, *kickers)
+        else:
+            value = (equity.HIGH_CARD, *ranks)
+        best = value if best is None else max(best, value)
+    return best
+
+
+def test_evaluator_ranks_like_brute_force():
+    rng = np.random.default_rng(1)
+    hands = [rng.permutation(52)[:7] for _ in range(1500)]
+    # Hands random draws rarely give
+    hands += [
+        np.array(equity.parse_cards(text))
+        for text in (
+            "Ah 2d 3c 4s 5h Kd Kc",  # wheel
+            "Ah 2h 3h 4h 5h Kd Kc",  # steel wheel
+            "6h 2h 3h 4h 5h Ah Kc",  # straight flush above the wheel
+            "Th Jh Qh Kh Ah 9h 8h",  # royal flush with seven of a suit
+            "Ks Kd Kc 7s 7d 7c 2h",  # two trips
+            "9s 9d 9c 9h 4s 4d 4c",  # quads and trips
+            "Qs Qd 8c 8h 4s 4d Ac",  # three pairs
+            "2s 4s 6s 8s Ts 3d 5c",  # flush and a straight
+            "2s 3s 4s 5s 7s 6d Kc",  # flush and a straight, not a straight flush
+        )
+    ]
+
+    values = equity.evaluate(np.array(hands))
+    expected = [brute_force(hand.tolist()) for hand in hands]
+
+    order = np.argsort(values, kind="stable")
+    for a, b in zip(order, order[1:]):
+        assert expected[a] <= expected[b]
+        assert (values[a] == values[b]) == (expected[a] == expected[b])
+    assert [value >> 20 for value in values] == [value[0] for value in expected]
+
+
+def test_aces_against_kings():
+    # The kings' flushes are the aces' flushes too, 82.6 % for the aces
+    shares = equity.equity(["As Ah", "Ks Kh"], rng=np.random.default_rng(0))
+
+    assert shares[0] == pytest.approx(0.826, abs=0.01)
+    assert shares.sum() == pytest.approx(1)
+
+
+def test_equity_on_the_turn_is_exact():
+    # One card to come: the kings only win with one of the two other kings
+    shares = equity.equity(["As Ad", "Kh Kc"], "2c 7d 9h Js")
+
+    assert shares[1] == pytest.approx(2 / 44)
+
+
+# Hand 1: Alice moves all-in with aces, Bob folds the small blind and Carol calls
+# all-in with kings and loses. Hand 2 shows the result in the chip counts.
+hand_history = """\
+PokerStars Home Game Hand #2001: {Club}  Hold'em No Limit (50/100) - 2021/05/13 20:00:00 ET
+Table 'Test' 9-max (Play Money) Seat #1 is the button
+Seat 1: Alice (10000 in chips)
+Seat 2: Bob (10000 in chips)
+Seat 3: Carol (10000 in chips)
+Bob: posts small blind 50
+Carol: posts big blind 100
+*** HOLE CARDS ***
+Dealt to Alice [As Ah]
+Alice: raises 9900 to 10000 and is all-in
+Bob: folds
+Carol: calls 9900 and is all-in
+*** FLOP *** [2c 7d 9h]
+*** TURN *** [2c 7d 9h] [Js]
+*** RIVER *** [2c 7d 9h Js] [3s]
+*** SHOW DOWN ***
+Alice: shows [As Ah] (a pair of Aces)
+Carol: shows [Ks Kh] (a pair of Kings)
+Alice collected 20000 from pot
+*** SUMMARY ***
+Total pot 20050 | Rake 50
+Board [2c 7d 9h Js 3s]
+Seat 1: Alice (button) showed [As Ah] and won (20000) with a pair of Aces
+Seat 2: Bob (small blind) folded before Flop
+Seat 3: Carol (big blind) showed [Ks Kh] and lost with a pair of Kings
+
+
+
+PokerStars Home Game Hand #2002: {Club}  Hold'em No Limit (50/100) - 2021/05/13 20:01:00 ET
+Table 'Test' 9-max (Play Money) Seat #2 is the button
+Seat 1: Alice (20000 in chips)
+Seat 2: Bob (9950 in chips)
+Bob: posts small blind 50
+Alice: posts big blind 100
+*** HOLE CARDS ***
+Bob: folds
+Uncalled bet (50) returned to Alice
+Alice collected 100 from pot
+*** SUMMARY ***
+Total pot 100 | Rake 0
+Seat 1: Alice (big blind) collected (100)
+Seat 2: Bob (button) (small blind) folded before Flop
+"""
+
+
+def test_allin_is_recorded():
+    session = data_extract(hand_history.splitlines(True), actions=True)
+
+    (record,) = session.allin_hands
+    assert record.hand == 1
+    assert record.names == ["Bob", "Carol", "Alice"]
+    assert record.cards == [None, "Ks Kh", "As Ah"]
+    assert record.contributions == [50, 10000, 10000]
+    assert record.won == [0, 0, 20000]
+    assert (record.board, record.known, record.rake) == ("2c 7d 9h Js 3s", 0, 50)
+
+    ev = equity.expected_winnings(record)
+    # The pot after rake, shared by the equities at the all-in
+    assert sum(ev) == pytest.approx(20000)
+    assert ev[0] == 0
+    assert ev[2] / 20000 == pytest.approx(0.826, abs=0.01)
+    assert equity.expected_winnings(record) is ev
+
+
+def test_ev_chips():
+    session = data_extract(hand_history.splitlines(True), actions=True)
+    stats = SessionStats(session)
+    (record,) = session.allin_hands
+
+    ev, players = equity.ev_chips(session, stats)
+
+    alice, carol = stats.index["Alice"], stats.index["Carol"]
+    # Up to the all-in the EV is the chip count, then the result is swapped for
+    # what the player was expected to win
+    assert ev[:, :2].tolist() == stats.chips[:, :2].tolist()
+    assert ev[alice, 2] == pytest.approx(record.ev[2])
+    assert ev[carol, 2] == pytest.approx(record.ev[1])
+    assert players[alice] and players[carol]
+
+
+def test_last_hand_waits_for_the_result():
+    lines = hand_history.splitlines(True)
+    session = data_extract(lines[: lines.index("\n")], actions=True)
+    stats = SessionStats(session)
+
+    ev, players = equity.ev_chips(session, stats)
+
+    assert len(session.allin_hands) == 1
+    assert ev.tolist() == stats.chips.tolist()
+    assert not players.any()
@@ -0,0 +1,118 @@
+"""Tests of the spreadsheet upload against the in-memory client of fakes.py"""
+
+import csv
+
+import pytest
+
+from google_sheets import column_to_a1, save_session, upload_session
+from hand_history import parse_file
+from post_session import retry
+from session_stats import SessionStats
+from synthetic import write_hand_history
+from tests.fakes import CountingSpreadsheet
+
+
+def names(n_players):
+    return [f"Player {i}" for i in range(n_players)]
+
+
+@pytest.mark.parametrize(
+    "col, letters",
+    [
+        (1, "A"),
+        (26, "Z"),
+        (27, "AA"),
+        (52, "AZ"),
+        (53, "BA"),
+        (702, "ZZ"),
+        (703, "AAA"),
+    ],
+)
+def test_column_to_a1(col, letters):
+    assert column_to_a1(col) == letters
+
+
+@pytest.mark.parametrize("n_players", [2, 15])
+def test_upload_batches_calls(n_players):
+    spreadsheet = CountingSpreadsheet(names(n_players))
+    results = {name: (1, 10000) for name in names(n_players)}
+
+    upload_session(spreadsheet, results, "2021-05-13")
+
+    # The same handful of calls however many players there are
+    assert spreadsheet.calls == {
+        "worksheets": 1,
+        "duplicate": 1,
+        "batch_get": 1,
+        "batch_update": 2,
+        "get": 1,
+    }
+
+
+@pytest.mark.parametrize("n_sessions, letters", [(24, "Z"), (25, "AA"), (60, "BJ")])
+def test_upload_column_letters(n_sessions, letters):
+    spreadsheet = CountingSpreadsheet(names(3), n_sessions=n_sessions)
+    results = {name: (i + 1, 1000 * i) for i, name in enumerate(names(3))}
+
+    upload_session(spreadsheet, results, "2021-05-13")
+
+    overview, _, session = spreadsheet.sheets
+    col = n_sessions + 2
+    assert column_to_a1(col) == letters
+    for row in (5, 63, 81):
+        assert overview.cells[(row, col)] == "2021-05-13"
+    assert overview.cells[(6, col)] == "='2021-05-13'!G9"
+    assert overview.cells[(64, col)] == f"=SUM($E$6:{letters}6)"
+    assert overview.cells[(82, col)] == f"={letters}6"
+    assert session.title == "2021-05-13"
+    assert [session.cells[(9 + i, 2)] for i in range(3)] == [1, 2, 3]
+    assert [session.cells[(9 + i, 4)] for i in range(3)] == [0, 1000, 2000]
+    assert session.cells[(9, 6)] == f"='date {col - 1}'!H9"
+
+
+def test_upload_retry_reuses_date_sheet():
+    # The session sheet is read after the sheet was added and the overview written
+    spreadsheet = CountingSpreadsheet(names(3), failures={"get": 1})
+    results = {name: (1, 10000) for name in names(3)}
+
+    _, attempts = retry(
+        lambda: upload_session(spreadsheet, results, "2021-05-13"), backoff=0
+    )
+
+    assert attempts == 2
+    assert [sheet.title for sheet in spreadsheet.sheets] == [
+        "overview",
+        "last session",
+        "2021-05-13",
+    ]
+    assert spreadsheet.calls["duplicate"] == 1
+    overview = spreadsheet.sheets[0]
+    assert overview.cells[(5, 62)] == "2021-05-13"
+    assert (5, 63) not in overview.cells
+
+
+def test_save_session(tmp_path, capsys):
+    path = tmp_path / "HH20210513.txt"
+    write_hand_history(path, n_hands=50, n_players=4)
+    session = parse_file(path)
+    name_index = {f"Player {i}": [name] for i, name in enumerate(session.names)}
+    path_email = tmp_path / "email-list.csv"
+    with open(path_email, "w", newline="") as email_file:
+        writer = csv.writer(email_file)
+        writer.writerow(["email list"])
+        for i, name in enumerate(name_index):
+            writer.writerows([[name], [f"player{i}@example.org"]])
+    spreadsheet = CountingSpreadsheet(list(name_index))
+
+    message, recipients = save_session(
+        spreadsheet,
+        SessionStats(session),
+        "2021-05-13",
+        name_index,
+        path_email,
+        ask=lambda prompt: "y",
+    )
+
+    assert sum(spreadsheet.calls.values()) == 6
+    assert recipients == [f"player{i}@example.org" for i in range(4)]
+    assert "(50 hands played" in message
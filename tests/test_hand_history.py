@@ -0,0 +1,80 @@
+"""Tests of the hand history parser on synthetic hand histories"""
+
+import pytest
+
+from hand_history import HandHistoryFollower, data_extract, parse_file
+from synthetic import write_hand_history
+from tests.sessions import session_columns
+
+
+def read_lines(tmp_path, n_hands=5, n_players=3):
+    path = tmp_path / "HH.txt"
+    write_hand_history(path, n_hands=n_hands, n_players=n_players)
+    with open(path, encoding="utf-8-sig") as raw_file:
+        return raw_file.readlines()
+
+
+def test_hand_without_seat_lines(tmp_path):
+    lines = read_lines(tmp_path)
+    # The first hand lost its seat lines, its actions and summary name nobody seated
+    first_seats = [
+        i
+        for i, line in enumerate(lines)
+        if line.startswith("Seat ") and line.rstrip().endswith(" in chips)")
+    ][:3]
+    cut = [line for i, line in enumerate(lines) if i not in first_seats]
+
+    full, session = data_extract(lines), data_extract(cut)
+
+    assert session.hand_count == full.hand_count == 5
+    assert session.names == full.names
+    for name, player in session.players.items():
+        assert list(player.hands[1:]) == list(full.players[name].hands[2:])
+        assert list(player.chips[1:]) == list(full.players[name].chips[2:])
+        assert list(player.losses[1:]) == list(full.players[name].losses[2:])
+
+
+def test_actions_only_add_hud_and_allins(tmp_path):
+    lines = read_lines(tmp_path, n_hands=50, n_players=4)
+
+    full, session = data_extract(lines, actions=True), data_extract(lines)
+
+    assert session.hand_count == full.hand_count == 50
+    assert list(session.hand_ids) == list(full.hand_ids)
+    assert list(session.potsize) == list(full.potsize)
+    for name, player in session.players.items():
+        for column in ("chips", "hands") + player.flag_columns:
+            assert list(getattr(player, column)) == list(
+                getattr(full.players[name], column)
+            )
+        assert not any(any(counters) for counters in player.hud)
+        assert any(any(counters) for counters in full.players[name].hud)
+    assert session.allin_hands == []
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n"])
+@pytest.mark.parametrize("actions", [False, True])
+def test_follower_on_a_growing_file(tmp_path, newline, actions):
+    source = tmp_path / "source.txt"
+    write_hand_history(source, n_hands=80, n_players=5)
+    data = source.read_bytes().replace(b"\n", newline)
+    path = tmp_path / "HH.txt"
+    path.write_bytes(b"")
+    follower = HandHistoryFollower(path, actions=actions)
+    # Written in pieces that end anywhere: in the BOM, in the middle of a line and
+    # between the CR and the LF
+    cuts = [2, 5, 777, data.index(b"\r") + 1 if b"\r" in data else 800]
+    cuts += list(range(1000, len(data), 1237)) + [len(data)]
+
+    start = 0
+    for end in sorted(set(cuts)):
+        with open(path, "ab") as hand_history:
+            hand_history.write(data[start:end])
+        start = end
+        session = follower.poll()
+
+    assert session.hand_count == 80
+    assert len(session.allin_hands) == actions  # one all-in, recorded with actions
+    assert session_columns(session) == session_columns(
+        parse_file(path, actions=actions)
+    )
@@ -0,0 +1,148 @@
+"""Tests of the HUD counters on a hand-written hand history"""
+
+import hud
+from hand_history import data_extract
+
+# Hand 1: Dave opens, Alice calls, Bob 3-bets from the small blind, Dave calls and
+# loses the showdown. Hand 2: Bob limps on the button, Dave checks the option in
+# the big blind and takes the pot with a bet on the flop.
+hand_history = """\
+PokerStars Home Game Hand #1001: {Club}  Hold'em No Limit (50/100) - 2021/05/13 20:00:00 ET
+Table 'Test' 9-max (Play Money) Seat #1 is the button
+Seat 1: Alice (10000 in chips)
+Seat 2: Bob (10000 in chips)
+Seat 3: Carol (10000 in chips)
+Seat 4: Dave (10000 in chips)
+Bob: posts small blind 50
+Carol: posts big blind 100
+*** HOLE CARDS ***
+Dealt to Alice [Ah Kd]
+Dave: raises 200 to 300
+Alice: calls 300
+Bob: raises 600 to 900
+Carol: folds
+Dave: calls 600
+Alice: folds
+*** FLOP *** [2c 7d 9h]
+Bob: bets 500
+Dave: raises 1000 to 1500
+Bob: calls 1000
+*** TURN *** [2c 7d 9h] [Js]
+Bob: checks
+Dave: bets 1000
+Bob: calls 1000
+*** RIVER *** [2c 7d 9h Js] [3s]
+Bob: checks
+Dave: checks
+*** SHOW DOWN ***
+Bob: shows [Qs Qh] (a pair of Queens)
+Dave: shows [Tc Td] (a pair of Tens)
+Bob collected 7200 from pot
+*** SUMMARY ***
+Total pot 7200 | Rake 0
+Board [2c 7d 9h Js 3s]
+Seat 1: Alice (button) folded before Flop
+Seat 2: Bob (small blind) showed [Qs Qh] and won (7200) with a pair of Queens
+Seat 3: Carol (big blind) folded before Flop
+Seat 4: Dave showed [Tc Td] and lost with a pair of Tens
+
+
+
+PokerStars Home Game Hand #1002: {Club}  Hold'em No Limit (50/100) - 2021/05/13 20:01:00 ET
+Table 'Test' 9-max (Play Money) Seat #2 is the button
+Seat 1: Alice (9700 in chips)
+Seat 2: Bob (13800 in chips)
+Seat 3: Carol (9900 in chips)
+Seat 4: Dave (6600 in chips)
+Carol: posts small blind 50
+Dave: posts big blind 100
+*** HOLE CARDS ***
+Dealt to Alice [4h 2d]
+Alice: folds
+Bob: calls 100
+Carol: folds
+Dave: checks
+*** FLOP *** [Kc 8d 5h]
+Dave: bets 200
+Bob: folds
+Uncalled bet (200) returned to Dave
+Dave collected 250 from pot
+*** SUMMARY ***
+Total pot 250 | Rake 0
+Board [Kc 8d 5h]
+Seat 1: Alice folded before Flop (didn't bet)
+Seat 2: Bob (button) folded on the Flop
+Seat 3: Carol (small blind) folded before Flop
+Seat 4: Dave (big blind) collected (250)
+"""
+
+# The counters that are not 0, of each player at each position
+expected = {
+    "Alice": {
+        "button": {"hands": 1, "vpip": 1, "three_bet_chances": 1},
+        "other": {"hands": 1},
+    },
+    "Bob": {
+        "small blind": {
+            "hands": 1,
+            "vpip": 1,
+            "pfr": 1,
+            "three_bet_chances": 1,
+            "three_bets": 1,
+            "postflop_aggressive": 1,
+            "postflop_calls": 2,
+            "saw_flop": 1,
+            "showdowns": 1,
+            "showdown_wins": 1,
+        },
+        "button": {"hands": 1, "vpip": 1, "saw_flop": 1},
+    },
+    "Carol": {"big blind": {"hands": 1}, "small blind": {"hands": 1}},
+    "Dave": {
+        "other": {
+            "hands": 1,
+            "vpip": 1,
+            "pfr": 1,
+            "postflop_aggressive": 2,
+            "saw_flop": 1,
+            "showdowns": 1,
+        },
+        "big blind": {"hands": 1, "postflop_aggressive": 1, "saw_flop": 1},
+    },
+}
+
+
+def test_counters_by_position():
+    session = data_extract(hand_history.splitlines(True), actions=True)
+
+    assert list(session.players) == list(expected)
+    for name, player in session.players.items():
+        counters = {
+            position: {
+                column: count
+                for column, count in zip(hud.counter_columns, player.hud[row])
+                if count
+            }
+            for row, position in enumerate(hud.positions)
+        }
+        assert counters == {
+            position: expected[name].get(position, {}) for position in hud.positions
+        }, name
+
+
+def test_metrics():
+    session = data_extract(hand_history.splitlines(True), actions=True)
+
+    bob = hud.player_hud(session.players["Bob"])
+    assert bob["hands"] == 2
+    assert bob["vpip"] == 1.0
+    assert bob["pfr"] == 0.5
+    assert bob["three_bet"] == 1.0
+    assert bob["af"] == 0.5
+    assert bob["wtsd"] == 0.5
+    assert bob["wsd"] == 1.0
+    dave = hud.player_hud(session.players["Dave"])
+    assert dave["three_bet"] != dave["three_bet"]  # never faced an open raise
+    assert dave["af"] != dave["af"]  # never called after the flop
+    assert (dave["wtsd"], dave["wsd"]) == (0.5, 0.0)
+    assert hud.player_hud(session.players["Alice"], "button")["three_bet"] == 0.0
@@ -0,0 +1,66 @@
+"""Tests of the decimation of long chip trajectories"""
+
+import numpy as np
+
+from lod import LodSeries, minmax_indices
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Hand numbers with gaps, like a player sitting out
+    x = np.cumsum(rng.integers(1, 4, n))
+    return x, 10000 + np.cumsum(rng.normal(0, 300, n))
+
+
+def test_buckets_keep_first_last_min_max():
+    x, y = random_walk(5000)
+
+    kept = minmax_indices(x, y, 64)
+
+    expected = set()
+    for bucket in np.unique(x // 64):
+        (indices,) = np.nonzero(x // 64 == bucket)
+        expected |= {
+            indices[0],
+            indices[-1],
+            indices[np.argmin(y[indices])],
+            indices[np.argmax(y[indices])],
+        }
+    assert kept.tolist() == sorted(expected)
+
+
+def test_growing_series_matches_one_pass():
+    x, y = random_walk(3000)
+    series = LodSeries()
+
+    for end in (1, 2, 100, 1000, 1001, 2500, 3000):
+        series.update(x[:end], y[:end])
+        for level in (0, 3, 6):
+            assert (
+                series.indices(level).tolist()
+                == minmax_indices(x[:end], y[:end], 2**level).tolist()
+            )
+
+
+def test_view_with_fewer_points_than_pixels_is_the_data():
+    x, y = random_walk(500)
+    series = LodSeries()
+    series.update(x, y)
+
+    view_x, view_y = series.view(x[0], x[-1], width_px=800)
+
+    assert view_x is series.x and view_y is series.y
+
+
+def test_view_keeps_peaks_and_busts():
+    x, y = random_walk(100000)
+    series = LodSeries()
+    series.update(x, y)
+    xmin, xmax = x[20000], x[60000]
+
+    view_x, view_y = series.view(xmin, xmax, width_px=500)
+
+    visible = (x >= xmin) & (x <= xmax)
+    assert len(view_x) <= 4 * (500 + 1) + 2  # buckets need not align with the view
+    assert view_x[0] < xmin and view_x[-1] > xmax
+    assert view_y.max() >= y[visible].max() and view_y.min() <= y[visible].min()
@@ -0,0 +1,50 @@
+"""Tests of the parse of a hand history in chunks"""
+
+import pytest
+
+from archive import path_hand_default
+from hand_history import parse_file
+from parallel_parse import merge_sessions, parse_file_parallel, parse_range, split_hands
+from tests.sessions import session_columns
+
+# A bundled session with players joining and leaving, rebuys and all-ins
+path = (
+    path_hand_default
+    / "DukeCroix"
+    / "HH20200625 fullllllll table - 50-100 - Play Money No Limit Hold'em.txt"
+)
+
+
+def test_chunks_start_at_hands():
+    ranges = split_hands(path, 4, min_chunk_bytes=50000)
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    with open(path, "rb") as raw_file:
+        data = raw_file.read()
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[start:].startswith(b"PokerStars Home Game Hand #")
+
+
+@pytest.mark.parametrize("actions", [False, True])
+def test_chunks_merge_into_the_session(actions):
+    session = parse_file_parallel(
+        path, workers=4, min_chunk_bytes=50000, actions=actions
+    )
+
+    assert session_columns(session) == session_columns(
+        parse_file(path, actions=actions)
+    )
+    assert bool(session.allin_hands) == actions
+
+
+def test_merge_at_every_hand():
+    # In this process, a chunk for every hand cuts between every bust and rebuy
+    ranges = split_hands(path, 1000, min_chunk_bytes=1)
+    sessions = [parse_range(path, start, end, actions=True) for start, end in ranges]
+
+    session = merge_sessions(sessions)
+
+    assert len(ranges) > 200
+    assert session_columns(session) == session_columns(parse_file(path, actions=True))
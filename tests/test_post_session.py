@@ -0,0 +1,167 @@
+"""Tests of the post-session pipeline against the local stand-ins of fakes.py"""
+
+import threading
+import time
+
+import pytest
+
+import post_session
+from google_sheets import upload_session
+from post_session import retry, run_pipeline, send_email
+from tests.fakes import CountingSpreadsheet, FlakySMTP
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    """Records the waits between attempts instead of sleeping"""
+
+    waits = []
+    monkeypatch.setattr(post_session.time, "sleep", waits.append)
+    return waits
+
+
+def flaky(failures, error=ConnectionResetError):
+    """Returns a function that fails failures times and then returns "done" """
+
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise error("fake")
+        return "done"
+
+    return func
+
+
+def test_retry_backoff(waits, capsys):
+    assert retry(flaky(3), attempts=4, backoff=0.5) == ("done", 4)
+    assert waits == [0.5, 1.0, 2.0]
+
+
+def test_retry_gives_up(waits, capsys):
+    with pytest.raises(ConnectionResetError):
+        retry(flaky(4), attempts=4, backoff=0.5)
+    assert waits == [0.5, 1.0, 2.0]
+
+
+def test_retry_only_transient_errors(waits):
+    with pytest.raises(ValueError):
+        retry(flaky(1, ValueError), attempts=4)
+    assert waits == []
+
+
+def test_pipeline_retries_network_tasks(tmp_path, capsys):
+    spreadsheet = CountingSpreadsheet(["Michel"], failures={"batch_get": 2})
+    smtp = FlakySMTP(failures=1)
+    path_png = tmp_path / "session.png"
+    tasks = {
+        "png": (lambda: path_png.write_bytes(b"\x89PNG"), ()),
+        "sheets": (
+            lambda: upload_session(spreadsheet, {"Michel": (1, 10000)}, "2021-05-13"),
+            (),
+        ),
+        "email": (
+            lambda: send_email(
+                "sender@example.org",
+                ["player@example.org"],
+                "Overview",
+                "message",
+                "password",
+                path_image=path_png,
+                smtp=smtp,
+            ),
+            ("sheets", "png"),
+        ),
+    }
+
+    results = run_pipeline(tasks, backoff=0.001, main_thread=["png"])
+
+    assert all(result.ok for result in results.values())
+    assert {name: result.attempts for name, result in results.items()} == {
+        "png": 1,
+        "sheets": 3,
+        "email": 2,
+    }
+    # The session sheet of the date was only added once over all attempts
+    assert [sheet.title for sheet in spreadsheet.sheets].count("2021-05-13") == 1
+    (msg,) = smtp.sent
+    (attachment,) = msg.iter_attachments()
+    assert attachment.get_content() == b"\x89PNG"
+
+
+def test_pipeline_waits_for_needed_tasks(capsys):
+    events = []
+
+    def task(name, seconds=0.0):
+        def func():
+            events.append(f"start {name}")
+            time.sleep(seconds)
+            events.append(f"end {name}")
+
+        return func
+
+    tasks = {
+        "png": (task("png", 0.05), ()),
+        "svg": (task("svg"), ("png",)),
+        "sheets": (task("sheets"), ()),
+        "email": (task("email"), ("sheets", "png")),
+    }
+
+    results = run_pipeline(tasks, main_thread=["png", "svg"])
+
+    assert all(result.ok for result in results.values())
+    assert events.index("start email") > events.index("end png")
+    assert events.index("start email") > events.index("end sheets")
+    assert events.index("start svg") > events.index("end png")
+
+
+def test_pipeline_exports_on_calling_thread(capsys):
+    threads = {}
+
+    def task(name):
+        return lambda: threads.setdefault(name, threading.current_thread())
+
+    tasks = {name: (task(name), ()) for name in ("png", "svg", "sheets", "email")}
+
+    run_pipeline(tasks, main_thread=["png", "svg"])
+
+    assert threads["png"] is threads["svg"] is threading.current_thread()
+    assert threads["sheets"] is not threading.current_thread()
+    assert threads["email"] is not threading.current_thread()
+
+
+def test_failed_task_does_not_block_others(capsys):
+    def broken():
+        raise ValueError("fake")
+
+    tasks = {
+        "png": (broken, ()),
+        "svg": (lambda: "svg", ("png",)),
+        "sheets": (lambda: "sheets", ()),
+        "email": (lambda: "email", ("sheets", "png")),
+    }
+
+    results = run_pipeline(tasks, backoff=0.001, main_thread=["png", "svg"])
+
+    assert isinstance(results["png"].error, ValueError)
+    assert results["png"].attempts == 0
+    assert results["sheets"].ok and results["sheets"].value == "sheets"
+    # Tasks that need the failed one are skipped instead of waiting forever
+    for name in ("svg", "email"):
+        assert not results[name].ok
+        assert results[name].attempts == 0
+        assert "png failed" in str(results[name].error)
+
+
+def test_pipeline_takes_the_time_of_the_slowest_task(capsys):
+    latency = 0.2
+    tasks = {
+        name: (lambda: time.sleep(latency), ()) for name in ("sheets", "email", "png")
+    }
+
+    before = time.perf_counter()
+    run_pipeline(tasks, main_thread=["png"])
+    seconds = time.perf_counter() - before
+
+    assert seconds < 2 * latency
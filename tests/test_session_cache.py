@@ -0,0 +1,120 @@
+"""Tests of the on-disk cache of parsed sessions"""
+
+import os
+
+import pytest
+
+import session_cache
+from hand_history import PARSER_VERSION, parse_file
+from synthetic import write_hand_history
+from tests.sessions import session_columns
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Names the files parsed by load_session()"""
+
+    names = []
+
+    def counted(filename, **kwargs):
+        names.append(filename)
+        return parse_file(filename, **kwargs)
+
+    monkeypatch.setattr(session_cache, "parse_file", counted)
+    return names
+
+
+def hand_history(tmp_path):
+    path = tmp_path / "HH20210513 Test - 50-100 - Play Money No Limit Hold'em.txt"
+    write_hand_history(path, n_hands=100, n_players=5)
+    return path
+
+
+def test_hit_returns_the_cached_session(tmp_path, parsed):
+    path = hand_history(tmp_path)
+
+    first = session_cache.load_session(path, cache_dir=tmp_path / "cache")
+    second = session_cache.load_session(path, cache_dir=tmp_path / "cache")
+
+    assert parsed == [path]
+    assert second is not first
+    assert session_columns(second) == session_columns(first)
+    assert session_columns(first) == session_columns(parse_file(path, actions=True))
+
+
+def append_line(path):
+    with open(path, "ab") as hand_history:
+        hand_history.write(b"\n")
+
+
+def touch(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def rewrite_head(path):
+    # Same size and modification time, another table name in the first hand
+    stat = path.stat()
+    path.write_bytes(
+        path.read_bytes().replace(b"Table 'synthetic'", b"Table 'Synthetic'", 1)
+    )
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def new_parser(monkeypatch):
+    monkeypatch.setattr(session_cache, "PARSER_VERSION", PARSER_VERSION + 1)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda path, monkeypatch: append_line(path),
+        lambda path, monkeypatch: touch(path),
+        lambda path, monkeypatch: rewrite_head(path),
+        lambda path, monkeypatch: new_parser(monkeypatch),
+    ],
+    ids=["size", "mtime", "head", "parser version"],
+)
+def test_change_parses_again(tmp_path, parsed, monkeypatch, change):
+    path = hand_history(tmp_path)
+    cache_dir = tmp_path / "cache"
+    session_cache.load_session(path, cache_dir=cache_dir)
+
+    change(path, monkeypatch)
+    session = session_cache.load_session(path, cache_dir=cache_dir)
+    session_cache.load_session(path, cache_dir=cache_dir)
+
+    # Parsed again once, the entry is rewritten for the next time
+    assert parsed == [path, path]
+    assert session_columns(session) == session_columns(parse_file(path, actions=True))
+
+
+def test_entries_by_chip_count_and_skipped_hands(tmp_path, parsed):
+    path = hand_history(tmp_path)
+    cache_dir = tmp_path / "cache"
+    skip = {parse_file(path).hand_ids[1]}
+
+    for _ in range(2):
+        session_cache.load_session(path, cache_dir=cache_dir)
+        other = session_cache.load_session(
+            path, cache_dir=cache_dir, chip_count_start=5000
+        )
+        session = session_cache.load_session(path, cache_dir=cache_dir, skip=skip)
+
+    # The other chip count replaces the complete entry, the skipped hands have their
+    # own entry
+    assert len(parsed) == 5
+    assert other.chip_count_start == 5000
+    assert session.hand_count == 99
+
+
+def test_unreadable_entry_parses_again(tmp_path, parsed):
+    path = hand_history(tmp_path)
+    cache_dir = tmp_path / "cache"
+    session_cache.load_session(path, cache_dir=cache_dir)
+    session_cache.cache_path(path, cache_dir=cache_dir).write_bytes(b"not a pickle")
+
+    session = session_cache.load_session(path, cache_dir=cache_dir)
+
+    assert parsed == [path, path]
+    assert session.hand_count == 100
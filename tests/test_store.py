@@ -0,0 +1,108 @@
+"""Tests of the SQLite store on synthetic hand histories"""
+
+import equity
+import store
+from hand_history import SessionParser
+from synthetic import write_hand_history
+
+
+def hand_history(tmp_path, n_hands=200, n_players=5):
+    path = tmp_path / "HH20210513 Test - 50-100 - Play Money No Limit Hold'em.txt"
+    write_hand_history(path, n_hands=n_hands, n_players=n_players)
+    return path
+
+
+def count_calls(monkeypatch, module, name):
+    calls = []
+    func = getattr(module, name)
+
+    def counted(*args, **kwargs):
+        calls.append(None)
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(module, name, counted)
+    return calls
+
+
+def test_file_is_tokenized_once(tmp_path, monkeypatch):
+    path = hand_history(tmp_path)
+    connection = store.connect(":memory:")
+    tokenized = count_calls(monkeypatch, store, "tokenize")
+
+    # Cache miss: the session comes from the same pass as the rows
+    store.ingest_archive([path], connection, cache_dir=tmp_path / "cache")
+    # Cache hit: only the rows are read
+    store.ingest_archive([path], connection, force=True, cache_dir=tmp_path / "cache")
+
+    assert len(tokenized) == 2
+    assert connection.execute("SELECT count(*) FROM hands").fetchone()[0] == 200
+    assert connection.execute("SELECT count(*) FROM results").fetchone()[0] == 5
+
+
+def test_ev_is_reused_in_memory(tmp_path, monkeypatch):
+    path = hand_history(tmp_path)
+    connection = store.connect(":memory:")
+    store.ingest_archive([path], connection, cache_dir=None)
+    evs = connection.execute(
+        "SELECT ev FROM allins ORDER BY hand_id, player"
+    ).fetchall()
+    assert evs
+    sampled = count_calls(monkeypatch, equity, "runout_values")
+
+    store.ingest_archive([path], connection, force=True, cache_dir=None)
+
+    assert sampled == []
+    assert (
+        connection.execute("SELECT ev FROM allins ORDER BY hand_id, player").fetchall()
+        == evs
+    )
+
+
+def test_results_are_replaced(tmp_path):
+    path = hand_history(tmp_path).resolve()
+    connection = store.connect(":memory:")
+    rows = store.read_file(path, cache_dir=None)
+    store.write_file(connection, path, "key", rows)
+    hands, seats, actions, allins, results, cards = rows
+
+    # A player left the session, e.g. all the player's hands are skipped now
+    store.write_file(
+        connection, path, "key", (hands, seats, actions, allins, results[1:], cards)
+    )
+
+    players = [player for (player,) in connection.execute("SELECT player FROM results")]
+    assert sorted(players) == sorted(result[0] for result in results[1:])
+
+
+def test_rows_of_a_cut_off_file(tmp_path):
+    lines = hand_history(tmp_path, n_hands=20).read_text("utf-8").splitlines(True)
+    # The file starts in the middle of a hand, and a hand misses the seat line of
+    # a player named in its summary
+    start = next(i for i, line in enumerate(lines) if " posts small blind " in line)
+    lines = lines[start:]
+    header = next(i for i, line in enumerate(lines) if "Hand #" in line)
+    del lines[header + 2]
+    parser = SessionParser(actions=True)
+
+    hands, seats, actions = store.hand_rows(lines, parser=parser)
+
+    assert len(hands) == parser.session.hand_count == 19
+    assert [hand[2] for hand in hands] == list(range(1, 20))
+    assert {seat[0] for seat in seats} == {hand[0] for hand in hands}
+    assert {action[0] for action in actions} == {hand[0] for hand in hands}
+
+
+def test_hands_are_numbered_like_the_session(tmp_path):
+    path = hand_history(tmp_path, n_hands=20)
+    lines = path.read_text("utf-8").splitlines(True)
+    hand_ids = [
+        int(line.split("#", 1)[1].split(":", 1)[0])
+        for line in lines
+        if "Hand #" in line
+    ]
+    skip = set(hand_ids[:3] + hand_ids[10:12])
+
+    hands = store.read_file(path, skip=skip, cache_dir=None)[0]
+
+    assert [hand[0] for hand in hands] == [i for i in hand_ids if i not in skip]
+    assert [hand[2] for hand in hands] == list(range(1, 16))